@@ -16,13 +16,16 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
-import os, sys, linecache, pkgconfig, glob, subprocess
+import os, sys, re, gc, json, linecache, pkgconfig, glob, subprocess, pickle
+import multiprocessing, tempfile, time
 
 import cchardet
 
+from collections import defaultdict
+
 from hotdoc_c_extension.clang import cindex
 from ctypes import *
-from fnmatch import fnmatch
+from fnmatch import translate
 
 from hotdoc.core import inclusions
 from hotdoc.core.extension import Extension
@@ -37,6 +40,12 @@ from hotdoc.utils.loggable import (info as core_info, warn, Logger,
     debug as core_debug)
 
 from .c_comment_scanner.c_comment_scanner import extract_comments
+from .profiling import ScanProfile, NullScanProfile
+from .tracing import TraceRecorder, NullTraceRecorder
+from .scan_records import *
+from .extraction_cache import ExtractionCache, NullExtractionCache
+from .snapshot import ScanSnapshot
+from .symbol_packs import SymbolPacks
 
 def ast_node_is_function_pointer (ast_node):
     if ast_node.kind == cindex.TypeKind.POINTER and \
@@ -64,6 +73,8 @@ Logger.register_warning_code('clang-heisenbug', ParsingException,
                              'c-extension')
 Logger.register_warning_code('clang-flags', ParsingException,
                              'c-extension')
+Logger.register_warning_code('clang-timeout', ParsingException,
+                             'c-extension')
 Logger.register_warning_code('bad-c-inclusion', BadInclusionException,
                              'c-extension')
 Logger.register_warning_code('clang-headers-not-found', HotdocException,
@@ -86,15 +97,269 @@ def get_clang_headers():
 
     warn('clang-headers-not-found', CLANG_HEADERS_WARNING)
 
+
+# Name of the in-memory source including all the headers to scan, in
+# umbrella translation unit mode
+UMBRELLA_FILENAME = 'hotdoc-umbrella.c'
+
+
+HEADER_GUARD_RE = re.compile(r'^\s*#\s*ifndef\s+(\w+)', re.MULTILINE)
+
+
+def first_macro_is_header_guard(contents, comments):
+    """
+    Textual approximation of clang_isFileMultipleIncludeGuarded, for
+    files we did not parse with clang.
+    """
+    match = HEADER_GUARD_RE.search(contents)
+    if not match:
+        return False
+
+    for c in comments:
+        if not c[3]:
+            split = c[0].split()
+            return len(split) > 1 and split[1] == match.group(1)
+
+    return False
+
+
+MB = 1024 * 1024
+
+
+def get_resident_memory():
+    """
+    Returns the resident memory of the current process in bytes, or
+    None if we do not know how to obtain it on this platform.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as _:
+            return int(_.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def trim_heap():
+    """
+    Hands the free memory at the top of the heap back to the system,
+    where the C library lets us.
+    """
+    try:
+        CDLL(None).malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def dispose_translation_unit(tu):
+    """
+    Frees the memory libclang holds for @tu right away, rather than
+    whenever the last cursor referencing it gets garbage collected.
+    """
+    cindex.conf.lib.clang_disposeTranslationUnit(tu)
+    # TranslationUnit.__del__ will dispose of NULL, which is a no-op
+    tu.obj = tu._as_parameter_ = None
+
+
+def parse_to_ast_file(filename, args, flags, unsaved_files, ast_path):
+    """
+    Target of the child processes parsing files under a time budget.
+    """
+    index = cindex.Index.create()
+    tu = index.parse(filename, args=args, unsaved_files=unsaved_files,
+                     options=flags)
+    tu.save(ast_path)
+
+
+def type_tokens_to_links(tokens):
+    """
+    Turns the type tokens of a scan record into the tokens of a
+    `QualifiedSymbol`.
+    """
+    return [Link(None, token.name, token.name)
+            if type(token) is TypeLink else token for token in tokens]
+
+
+def materialize_parameters(records):
+    return [ParameterSymbol(argname=record.argname,
+                            type_tokens=type_tokens_to_links(
+                                record.type_tokens))
+            for record in records]
+
+
 def get_clang_libdir():
     return subprocess.check_output(['llvm-config', '--libdir']).strip().decode()
 
+class PathIndex(object):
+    """
+    A set of file paths, matched by identity rather than by spelling.
+
+    Paths are canonicalized with os.path.realpath, and the result is
+    memoized and interned, as the same few spellings are looked up for
+    every token clang hands us.
+    """
+    __canonical_paths = {}
+
+    def __init__(self, paths=None):
+        self.__paths = set()
+        for path in paths or []:
+            self.add(path)
+
+    @classmethod
+    def canonicalize(cls, path):
+        res = cls.__canonical_paths.get(path)
+        if res is None:
+            res = sys.intern(os.path.realpath(path))
+            cls.__canonical_paths[path] = res
+        return res
+
+    def add(self, path):
+        self.__paths.add(self.canonicalize(path))
+
+    def __contains__(self, path):
+        return self.canonicalize(path) in self.__paths
+
+    def __iter__(self):
+        return iter(self.__paths)
+
+    def __len__(self):
+        return len(self.__paths)
+
+
+def translate_glob(pattern):
+    """
+    Translates a shell-style pattern like fnmatch.translate, minus the
+    end anchor and the inline flags, which depend on the python version
+    and cannot be embedded in a larger expression.
+    """
+    res = translate(os.path.normcase(pattern))
+    # python >= 3.6
+    if res.startswith('(?s:') and res.endswith(r')\Z'):
+        return res[4:-3]
+    # python < 3.6
+    if res.endswith(r'\Z(?ms)'):
+        return res[:-7]
+    return res
+
+
+def compile_glob_patterns(patterns):
+    """
+    Compiles shell-style patterns into a single regular expression,
+    or None if there are no patterns to match.
+    """
+    if not patterns:
+        return None
+    return re.compile(r'(?:%s)\Z' % '|'.join('(?:%s)' % translate_glob(p)
+                                              for p in patterns),
+                      re.DOTALL)
+
+
+class FileClassification(object):
+    """
+    How the scanner handles a given file.
+
+    guarded is None until we know whether the file is protected by a
+    header guard, either from clang or from its raw text.
+    """
+    __slots__ = ['full_scan', 'is_header', 'guarded']
+
+    def __init__(self, full_scan, is_header):
+        self.full_scan = full_scan
+        self.is_header = is_header
+        self.guarded = None
+
+
+class FileClassifier(object):
+    """
+    Classifies files once, for a given set of full scan patterns.
+
+    Files are identified by their canonical path, all the spellings
+    of a file share its classification.
+    """
+    def __init__(self, full_scan_patterns):
+        self.__full_scan_re = compile_glob_patterns(full_scan_patterns)
+        self.__classifications = {}
+
+    def classify(self, filename):
+        res = self.__classifications.get(filename)
+        if res is not None:
+            return res
+
+        path = PathIndex.canonicalize(filename)
+        res = self.__classifications.get(path)
+        if res is None:
+            full_scan = self.__full_scan_re is not None and bool(
+                self.__full_scan_re.match(os.path.normcase(path)))
+            res = FileClassification(full_scan, path.endswith('.h'))
+            self.__classifications[path] = res
+        self.__classifications[filename] = res
+        return res
+
+
+DIAGNOSTIC_SEVERITIES = {
+    'note': cindex.Diagnostic.Note,
+    'warning': cindex.Diagnostic.Warning,
+    'error': cindex.Diagnostic.Error,
+}
+
+
+class DiagnosticsCollector(object):
+    """
+    Filters diagnostics by severity, deduplicates them across translation
+    units and caps their number per file, only formatting the ones that
+    end up being displayed.
+    """
+    def __init__(self, min_severity=cindex.Diagnostic.Warning,
+                 max_per_file=20):
+        self.min_severity = min_severity
+        self.max_per_file = max_per_file
+        self.__seen = set()
+        self.__displayed = defaultdict(int)
+        self.__suppressed = defaultdict(int)
+
+    def collect(self, tu):
+        lib = cindex.conf.lib
+        for i in range(lib.clang_getNumDiagnostics(tu)):
+            ptr = lib.clang_getDiagnostic(tu, i)
+            if not ptr:
+                continue
+            diag = cindex.Diagnostic(ptr)
+
+            if lib.clang_getDiagnosticSeverity(diag) < self.min_severity:
+                continue
+
+            location = lib.clang_getDiagnosticLocation(diag)
+            filename = str(location.file)
+
+            key = (filename, location.line, diag.spelling)
+            if key in self.__seen:
+                continue
+            self.__seen.add(key)
+
+            if self.max_per_file and \
+                    self.__displayed[filename] >= self.max_per_file:
+                self.__suppressed[filename] += 1
+                continue
+
+            self.__displayed[filename] += 1
+            warn('clang-diagnostic', 'Clang issue : %s' % diag.format())
+
+    def flush(self):
+        for filename, n_suppressed in sorted(self.__suppressed.items()):
+            warn('clang-diagnostic',
+                 'Clang issue : %d more diagnostics in %s were not '
+                 'displayed' % (n_suppressed, filename))
+        self.__suppressed.clear()
+
+
 class ClangScanner(object):
     def __init__(self, app, project, doc_db):
         if not cindex.Config.loaded:
             # Let's try and find clang ourselves first
-            clang_libdir = get_clang_libdir()
-            if os.path.exists(clang_libdir):
+            # Not finding it is fine when loading a snapshot
+            try:
+                clang_libdir = get_clang_libdir()
+            except (OSError, subprocess.CalledProcessError):
+                clang_libdir = None
+            if clang_libdir and os.path.exists(clang_libdir):
                 cindex.Config.set_library_path(clang_libdir)
             cindex.Config.set_compatibility_check(False)
 
@@ -102,91 +367,443 @@ class ClangScanner(object):
         self.__raw_comment_parser = GtkDocParser(project)
         self.project = project
         self.__doc_db = doc_db
-        self.__all_sources = []
+        self.__all_sources = PathIndex()
+        self.__scanned = PathIndex()
+        self.__gir_skipped = PathIndex()
+        self.__classifiers = {}
+        self.__classifier = None
+        self.comment_names = {}
+        self.symbols = {}
+        self.parsed = PathIndex()
+        self.profile = NullScanProfile()
+        self.tracer = NullTraceRecorder()
+        self.diagnostics = DiagnosticsCollector()
+        self.max_rss = None
+        self.cache = NullExtractionCache()
+        # Set to a ScanSnapshot to record what gets scanned
+        self.snapshot = None
+        self.__args = []
+
+        # Files that took too long to parse, see --c-parse-timeout
+        self.parse_timeout = None
+        self.quarantine = {}
+        self.quarantined = []
+
+        # Headers for which symbols can be created from introspection
+        # data instead, see GIExtension
+        self.gir_headers = set()
+        self.gir_symbols = set()
+        self.gir_skipped = []
+        # Called with the headers left to introspection data after
+        # each scan, lazy scans included
+        self.create_gir_symbols = None
 
     def scan(self, filenames, options, incremental, full_scan,
-             full_scan_patterns, fail_fast=False, all_sources=None):
-        if all_sources is None:
-            self.__all_sources = []
-        else:
-            self.__all_sources = all_sources
+             full_scan_patterns, fail_fast=False, all_sources=None,
+             umbrella=False):
+        self.__all_sources = PathIndex(all_sources or [])
 
+        # Loads libclang, which loading a snapshot does not need
+        self.profile.instrument_library(
+            cindex.conf.lib, [item[0] for item in cindex.functionList])
         index = cindex.Index.create()
         flags = cindex.TranslationUnit.PARSE_INCOMPLETE | cindex.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
 
         info('scanning %d C source files' % len(filenames))
         self.filenames = filenames
+        self.__scanned = PathIndex(filenames)
 
         # FIXME: er maybe don't do that ?
         args = ["-Wno-attributes"]
         args.append ("-isystem%s" % get_clang_headers())
         args.extend (options)
         self.symbols = {}
-        self.parsed = set({})
+        self.parsed = PathIndex()
 
         debug('CFLAGS %s' % ' '.join(args))
+        self.__args = args
 
-        header_guarded = set()
+        self.__classifier = self.__classifiers.get(tuple(full_scan_patterns))
+        if self.__classifier is None:
+            self.__classifier = FileClassifier(full_scan_patterns)
+            self.__classifiers[tuple(full_scan_patterns)] = self.__classifier
 
+        to_scan = []
+        self.quarantined = []
+        self.gir_skipped = []
+        self.__gir_skipped = PathIndex()
         for filename in self.filenames:
             if filename in self.parsed:
                 continue
 
-            do_full_scan = any(fnmatch(filename, p) for p in full_scan_patterns)
-            if do_full_scan:
-                debug('scanning %s' % filename)
-
-                tu = index.parse(filename, args=args, options=flags)
-
-                for diag in tu.diagnostics:
-                    s = diag.format()
-                    warn('clang-diagnostic', 'Clang issue : %s' % str(diag))
-
-                self.__parse_file (filename, tu, full_scan)
-                if (cindex.conf.lib.clang_isFileMultipleIncludeGuarded(tu, tu.get_file(filename))):
-                    header_guarded.add(filename)
+            if self.__classifier.classify(filename).full_scan:
+                if self.__is_quarantined(filename):
+                    debug('%s is quarantined, not parsing it' % filename)
+                    self.quarantined.append(filename)
+                elif filename in self.gir_headers:
+                    self.gir_skipped.append(filename)
+                    self.__gir_skipped.add(filename)
+                else:
+                    to_scan.append(filename)
 
-                for include in tu.get_includes():
-                    fname = os.path.abspath(str(include.include))
-                    if (cindex.conf.lib.clang_isFileMultipleIncludeGuarded(tu, tu.get_file(fname))):
-                        if fname in self.filenames:
-                            header_guarded.add(fname)
-                    self.__parse_file (fname, tu, full_scan)
+        to_scan = self.__load_cached_records(to_scan)
+        self.__parse_files(index, args, flags, to_scan, full_scan, umbrella)
 
         if not full_scan:
             for filename in filenames:
                 with open (filename, 'rb') as f:
-                    skip_next_symbol = filename in header_guarded
+                    classification = self.__classifier.classify(filename)
                     debug('Getting comments in %s' % filename)
                     lines = [unicode_dammit(l) for l in f.readlines()]
-                    cs = extract_comments (''.join(lines))
+                    contents = ''.join(lines)
+                    cs = self.cache.get_comments(filename)
+                    if cs is None:
+                        with self.profile.timed(filename,
+                                                'comment-extraction'):
+                            cs = extract_comments (contents)
+                        self.cache.set_comments(filename, cs)
+                    # Clang did not see this file, try and guess whether
+                    # its first macro is a header guard
+                    if classification.guarded is None:
+                        classification.guarded = \
+                            first_macro_is_header_guard(contents, cs)
+                    skip_next_symbol = classification.guarded
+                    comment_names = self.comment_names[filename] = []
+                    comments = []
+                    macros = []
                     for c in cs:
                         if c[3]:
                             line = lines[c[1] - 1]
 
                             comment = (len(line) - len(line.lstrip(' '))) * ' ' + c[0]
-                            block = self.__raw_comment_parser.parse_comment(comment,
-                                filename, c[1], c[2], self.project.include_paths)
+                            with self.profile.timed(filename, 'comment-parsing'):
+                                block = self.__raw_comment_parser.parse_comment(comment,
+                                    filename, c[1], c[2], self.project.include_paths)
                             if block is not None:
                                 self.app.database.add_comment(block)
+                                comment_names.append(block.name)
+                                comments.append((comment, c[1], c[2]))
                         elif not skip_next_symbol:
-                            if filename.endswith('.h'):
-                                self.__create_macro_from_raw_text(c, filename)
+                            if classification.is_header:
+                                macros.append(
+                                    self.__macro_record_from_raw_text(
+                                        c, filename))
                         else:
                             skip_next_symbol = False
 
+                    self.profile.count('symbols-created', len(macros))
+
+                    # Now that all the comments of the file are known
+                    with self.profile.timed(filename, 'materialization'):
+                        self.materialize(macros)
+
+                    if self.snapshot is not None:
+                        self.snapshot.set_comments(filename, comments)
+                        self.snapshot.add_records(filename, macros)
+
+        # Introspection data does not cover everything documented
+        # in these headers, clang will have to handle them after all
+        fallback = [filename for filename in self.gir_skipped
+                    if self.__needs_clang(filename)]
+        if fallback:
+            debug('%d headers not covered by introspection data' %
+                  len(fallback))
+            fallback_index = PathIndex(fallback)
+            self.gir_skipped = [filename for filename in self.gir_skipped
+                                if filename not in fallback_index]
+            self.__gir_skipped = PathIndex(self.gir_skipped)
+            fallback = self.__load_cached_records(fallback)
+            self.__parse_files(index, args, flags, fallback, full_scan,
+                               umbrella)
+
+        self.diagnostics.flush()
+
+        if self.snapshot is not None:
+            self.snapshot.gir_skipped = list(self.gir_skipped)
+
+        if self.gir_skipped and self.create_gir_symbols is not None:
+            self.create_gir_symbols(self.gir_skipped)
+
         return True
 
+    def load_snapshot(self, snapshot):
+        """
+        Creates the comments and symbols recorded in @snapshot, instead
+        of scanning.
+        """
+        for filename, comments in snapshot.comments.items():
+            comment_names = self.comment_names[filename] = []
+            for comment, lineno, endlineno in comments:
+                block = self.__raw_comment_parser.parse_comment(comment,
+                    filename, lineno, endlineno, self.project.include_paths)
+                if block is not None:
+                    self.app.database.add_comment(block)
+                    comment_names.append(block.name)
+
+        # Function macros need all the comments to be known
+        for filename, records in snapshot.records.items():
+            self.materialize(self.__add_symbols(records))
+
+        self.gir_skipped = list(snapshot.gir_skipped)
+        self.__gir_skipped = PathIndex(self.gir_skipped)
+
+        if self.gir_skipped and self.create_gir_symbols is not None:
+            self.create_gir_symbols(self.gir_skipped)
+
+    def __load_cached_records(self, filenames):
+        if not self.cache.enabled:
+            return filenames
+
+        to_parse = []
+        for filename in filenames:
+            cached = self.cache.get_records(filename, self.__args)
+            if cached is None:
+                to_parse.append(filename)
+                continue
+
+            records, guarded = cached
+            self.parsed.add(filename)
+            self.__classifier.classify(filename).guarded = guarded
+            self.profile.count('cached-files')
+            with self.profile.timed(filename, 'materialization'):
+                self.materialize(self.__add_symbols(records))
+            if self.snapshot is not None:
+                self.snapshot.add_records(filename, records)
+
+        debug('%d files out of %d loaded from the extraction cache' %
+              (len(filenames) - len(to_parse), len(filenames)))
+        return to_parse
+
+    def __parse_files(self, index, args, flags, filenames, full_scan,
+                      umbrella):
+        if umbrella and len(filenames) > 1:
+            debug('scanning %d files in an umbrella translation unit' %
+                  len(filenames))
+            contents = ''.join('#include "%s"\n' % filename
+                               for filename in filenames)
+            out_of_process = self.__over_memory_budget()
+            with self.profile.timed(UMBRELLA_FILENAME, 'parse'), \
+                    self.tracer.span('parse', 'c-scan',
+                                     filename=UMBRELLA_FILENAME):
+                tu = self.__parse_tu(index, UMBRELLA_FILENAME, args, flags,
+                                     [(UMBRELLA_FILENAME,
+                                       contents.encode('utf-8'))],
+                                     out_of_process)
+            if tu is None:
+                warn('clang-timeout',
+                     'Parsing the umbrella translation unit took more than '
+                     '%ss, parsing headers one by one' % self.parse_timeout)
+                self.__parse_files(index, args, flags, filenames, full_scan,
+                                   False)
+                return
+            self.profile.count('translation-units')
+            try:
+                with self.tracer.span('process', 'c-scan',
+                                      filename=UMBRELLA_FILENAME):
+                    self.__process_tu(tu, UMBRELLA_FILENAME, [], full_scan)
+            finally:
+                dispose_translation_unit(tu)
+        else:
+            for filename in filenames:
+                if filename in self.parsed:
+                    continue
+
+                debug('scanning %s' % filename)
+
+                out_of_process = self.__over_memory_budget()
+                start = time.perf_counter()
+                with self.profile.timed(filename, 'parse'), \
+                        self.tracer.span('parse', 'c-scan', filename=filename):
+                    tu = self.__parse_tu(index, filename, args, flags,
+                                         out_of_process=out_of_process)
+                if tu is None:
+                    self.__quarantine_file(filename,
+                                           time.perf_counter() - start)
+                    continue
+                self.profile.count('translation-units')
+                try:
+                    with self.tracer.span('process', 'c-scan',
+                                          filename=filename):
+                        self.__process_tu(tu, filename, [filename], full_scan)
+                finally:
+                    dispose_translation_unit(tu)
+
+    def __parse_tu(self, index, filename, args, flags, unsaved_files=None,
+                   out_of_process=False):
+        if not self.parse_timeout and not out_of_process:
+            return index.parse(filename, args=args,
+                               unsaved_files=unsaved_files, options=flags)
+
+        # The translation unit is parsed in a child process we can kill,
+        # which hands it back to us by saving it as an AST file. The
+        # memory clang needs for parsing goes away with the child.
+        fd, ast_path = tempfile.mkstemp(suffix='.ast')
+        os.close(fd)
+        try:
+            # The child relies on inheriting the libclang we configured
+            proc = multiprocessing.get_context('fork').Process(
+                target=parse_to_ast_file,
+                args=(filename, args, flags, unsaved_files, ast_path))
+            proc.start()
+            proc.join(self.parse_timeout or None)
+
+            if proc.is_alive():
+                proc.terminate()
+                proc.join()
+                return None
+
+            if proc.exitcode == 0:
+                try:
+                    return cindex.TranslationUnit.from_ast_file(ast_path,
+                                                                index)
+                except cindex.TranslationUnitLoadError:
+                    pass
+        finally:
+            os.unlink(ast_path)
+
+        # Clang does not always manage to save translation units with
+        # errors, or to load them back when they were parsed from unsaved
+        # files, the parse was fast enough to simply do it again here
+        debug('Could not load %s from an AST file, parsing it again' %
+              filename)
+        return index.parse(filename, args=args, unsaved_files=unsaved_files,
+                           options=flags)
+
+    def __quarantine_file(self, filename, elapsed):
+        warn('clang-timeout',
+             'Parsing %s took more than %ss, only its comments will be '
+             'extracted from now on' % (filename, self.parse_timeout))
+        # elapsed is how long we waited before giving up, a lower
+        # bound of the time the file needs
+        self.quarantine[filename] = {'timeout': self.parse_timeout,
+                                     'elapsed': elapsed,
+                                     'timestamp': time.time(),
+                                     'mtime': os.path.getmtime(filename)}
+        self.quarantined.append(filename)
+
+    def __is_quarantined(self, filename):
+        entry = self.quarantine.get(filename)
+        if entry is None:
+            return False
+
+        # Give the file another chance if it changed in the meantime
+        if entry['mtime'] != os.path.getmtime(filename):
+            del self.quarantine[filename]
+            return False
+
+        return True
+
+    def __over_memory_budget(self):
+        if not self.max_rss:
+            return False
+
+        rss = get_resident_memory()
+        if rss is None or rss < self.max_rss:
+            return False
+
+        # Parsing is serial, the only way resident memory goes down
+        # before the next parse is if we release what we can ourselves
+        debug('resident memory above watermark (%d MB), collecting' %
+              (rss // MB))
+        gc.collect()
+        linecache.clearcache()
+        trim_heap()
+
+        rss = get_resident_memory()
+        if rss < self.max_rss:
+            return False
+
+        debug('resident memory still above watermark (%d MB), parsing in '
+              'a child process' % (rss // MB))
+        self.profile.count('out-of-process-parses')
+        return True
+
+    def __needs_clang(self, filename):
+        for name in self.comment_names.get(filename, []):
+            if ':' in name or name in self.gir_symbols:
+                continue
+            if self.app.database.get_symbol(name) is None:
+                return True
+        return False
+
     def set_extension(self, extension):
         self.__doc_db = extension
 
+    def declare_symbols(self, filename, names):
+        """
+        Lets the extension we create symbols for know about symbols
+        that will only be created later on, when lazily scanning.
+        """
+        # pylint: disable=protected-access
+        self.__doc_db._created_symbols[filename] |= names
+
+    def __process_tu(self, tu, tu_name, filenames, full_scan):
+        with self.profile.timed(tu_name, 'diagnostics'):
+            self.diagnostics.collect(tu)
+
+        extracted = {}
+        for filename in filenames:
+            records = self.__parse_file (filename, tu, full_scan)
+            if records is not None:
+                extracted[filename] = records
+            self.__classifier.classify(filename).guarded = bool(
+                cindex.conf.lib.clang_isFileMultipleIncludeGuarded(
+                    tu, tu.get_file(filename)))
+
+        includes = list(tu.get_includes())
+        for include in includes:
+            fname = os.path.abspath(str(include.include))
+            if fname in self.__scanned:
+                self.__classifier.classify(fname).guarded = bool(
+                    cindex.conf.lib.clang_isFileMultipleIncludeGuarded(
+                        tu, tu.get_file(fname)))
+            records = self.__parse_file (fname, tu, full_scan)
+            if records is not None:
+                extracted[fname] = records
+
+        if self.cache.enabled:
+            self.__cache_records(extracted, includes)
+
+        if self.snapshot is not None:
+            for filename, records in extracted.items():
+                self.snapshot.add_records(filename, records)
+
+    def __cache_records(self, extracted, includes):
+        graph = defaultdict(set)
+        for include in includes:
+            graph[os.path.abspath(str(include.source))].add(
+                os.path.abspath(str(include.include)))
+
+        for filename, records in extracted.items():
+            # Whatever the file includes, recursively, can change
+            # what clang makes of it
+            seen = set()
+            stack = list(graph[filename])
+            while stack:
+                include = stack.pop()
+                if include not in seen:
+                    seen.add(include)
+                    stack.extend(graph[include])
+            seen.discard(filename)
+
+            # Type references can lead to definitions in other files,
+            # which the key of this file does not account for
+            canonical = PathIndex.canonicalize(filename)
+            records = [record for record in records
+                       if PathIndex.canonicalize(record.filename) ==
+                       canonical]
+
+            self.cache.set_records(
+                filename, self.__args, list(seen), records,
+                self.__classifier.classify(filename).guarded)
+
     def __parse_file (self, filename, tu, full_scan):
-        if filename in self.parsed:
+        if filename in self.parsed or filename in self.__gir_skipped:
             return
 
         self.parsed.add (filename)
 
-        if filename not in self.filenames:
+        if filename not in self.__scanned:
             return
 
         debug('scanning %s' % filename)
@@ -194,14 +811,38 @@ class ClangScanner(object):
         start = tu.get_location (filename, 0)
         end = tu.get_location (filename, int(os.path.getsize(filename)))
         extent = cindex.SourceRange.from_locations (start, end)
-        cursors = self.__get_cursors(tu, extent)
+        with self.profile.timed(filename, 'tokenize'):
+            cursors = self.__get_cursors(tu, extent)
 
         # Happens with empty source files
         if cursors is None:
-            return
+            return []
+
+        records = []
+        with self.profile.timed(filename, 'symbol-creation'):
+            if self.cache.enabled:
+                # Cached records must not depend on what other files
+                # were scanned before this one, deduplicate afterwards
+                self.__create_records (cursors, tu, records, {})
+                created = self.__add_symbols(records)
+            else:
+                self.__create_records (cursors, tu, records, self.symbols)
+                created = records
+        self.profile.count('symbols-created', len(records))
+
+        with self.profile.timed(filename, 'materialization'):
+            self.materialize(created)
 
-        if filename in self.filenames:
-            self.__create_symbols (cursors, tu)
+        return records
+
+    def __add_symbols(self, records):
+        # Like when scanning, the first record for a given name wins
+        res = []
+        for record in records:
+            if record.name not in self.symbols:
+                self.symbols[record.name] = record
+                res.append(record)
+        return res
 
     # That's the fastest way of obtaining our ast nodes for a given filename
     def __get_cursors (self, tu, extent):
@@ -222,9 +863,13 @@ class ClangScanner(object):
 
         return cursors
 
-    def __create_symbols(self, nodes, tu):
+    def __create_records(self, nodes, tu, records, seen):
+        # Keep the null profile out of the loop
+        profiling = self.profile.enabled
         for node in nodes:
             node._tu = tu
+            if profiling:
+                self.profile.count('cursors-visited')
 
             # This is dubious, needed to parse G_DECLARE_FINAL_TYPE
             # investigate further (fortunately this doesn't seem to
@@ -234,28 +879,29 @@ class ClangScanner(object):
                 if not node:
                     continue
 
-                if not str(node.location.file) in self.filenames:
+                if not str(node.location.file) in self.__scanned:
                     continue
 
-            if node.spelling in self.symbols:
+            if node.spelling in seen:
                 continue
 
-            sym = None
+            record = None
             func_dec = self.__getFunctionDeclNode(node)
-            if func_dec and func_dec.spelling not in self.symbols:
-                sym = self.__create_function_symbol(func_dec)
+            if func_dec and func_dec.spelling not in seen:
+                record = self.__function_record(func_dec)
             elif node.kind == cindex.CursorKind.VAR_DECL:
-                sym = self.__create_exported_variable_symbol (node)
+                record = self.__variable_record (node)
             elif node.kind == cindex.CursorKind.TYPEDEF_DECL:
-                sym = self.__create_typedef_symbol (node)
+                record = self.__typedef_record (node)
             elif node.kind == cindex.CursorKind.STRUCT_DECL and node.spelling:
-                sym = self.__create_struct_symbol(node)
+                record = self.__struct_record(node)
             elif node.kind == cindex.CursorKind.ENUM_DECL and node.spelling:
-                sym = self.__create_enum_symbol(node)
+                record = self.__enum_record(node)
 
-            if sym is not None:
-                self.symbols[sym.unique_name] = sym
-            self.__create_symbols(node.get_children(), tu)
+            if record is not None:
+                seen[record.name] = record
+                records.append(record)
+            self.__create_records(node.get_children(), tu, records, seen)
 
     def __getFunctionDeclNode(self, node):
         if not node.location.file:
@@ -282,7 +928,7 @@ class ClangScanner(object):
         if type_.is_volatile_qualified():
             tokens.append ('volatile ')
 
-    def make_c_style_type_name (self, type_):
+    def __type_tokens (self, type_):
         tokens = []
         while (type_.kind == cindex.TypeKind.POINTER):
             self.__apply_qualifiers(type_, tokens)
@@ -291,14 +937,12 @@ class ClangScanner(object):
 
         if type_.kind == cindex.TypeKind.TYPEDEF:
             d = type_.get_declaration ()
-            link = Link (None, d.displayname, d.displayname)
-
-            tokens.append (link)
+            tokens.append (TypeLink(d.displayname))
             self.__apply_qualifiers(type_, tokens)
         elif type_.kind == cindex.TypeKind.UNEXPOSED:
             d = type_.get_declaration()
             if d.spelling:
-                tokens.append(Link(None, d.displayname, d.displayname))
+                tokens.append(TypeLink(d.displayname))
             else:
                 tokens.append('__UNKNOWN__')
             if d.kind == cindex.CursorKind.STRUCT_DECL:
@@ -309,32 +953,31 @@ class ClangScanner(object):
             tokens.append (type_.spelling + ' ')
 
         tokens.reverse()
-        return tokens
+        return tuple(tokens)
+
+    def make_c_style_type_name (self, type_):
+        return type_tokens_to_links(self.__type_tokens(type_))
 
-    def __create_callback_symbol (self, node):
+    def __callback_record (self, node):
         parameters = []
 
-        return_value = None
+        return_tokens = None
 
         for child in node.get_children():
-            if not return_value:
+            if return_tokens is None:
                 t = node.underlying_typedef_type
                 res = t.get_pointee().get_result()
-                type_tokens = self.make_c_style_type_name (res)
-                return_value = [ReturnItemSymbol(type_tokens=type_tokens)]
+                return_tokens = self.__type_tokens (res)
             else:
-                type_tokens = self.make_c_style_type_name (child.type)
-                parameter = ParameterSymbol (argname=child.displayname,
-                        type_tokens=type_tokens)
-                parameters.append (parameter)
+                type_tokens = self.__type_tokens (child.type)
+                parameters.append (ParameterRecord(child.displayname,
+                                                   type_tokens))
 
-        if not return_value:
-            return_value = [ReturnItemSymbol(type_tokens=[])]
+        if return_tokens is None:
+            return_tokens = ()
 
-        sym = self.__doc_db.get_or_create_symbol(CallbackSymbol, parameters=parameters,
-                return_value=return_value, display_name=node.spelling,
-                filename=str(node.location.file), lineno=node.location.line)
-        return sym
+        return CallbackRecord(node.spelling, str(node.location.file),
+                              node.location.line, return_tokens, parameters)
 
     def __parse_public_fields (self, decl):
         tokens = decl.translation_unit.get_tokens(extent=decl.extent)
@@ -420,41 +1063,33 @@ class ClangScanner(object):
                     delimiters.append((False, tok.location.line))
         return had_public
 
-    def __create_struct_symbol (self, node, spelling=None):
+    def __struct_record (self, node, spelling=None):
         spelling = spelling or node.spelling
         raw_text, public_fields = self.__parse_public_fields (node)
-        members = []
+        fields = []
         for field in public_fields:
-            type_tokens = self.make_c_style_type_name (field.type)
+            type_tokens = self.__type_tokens (field.type)
             is_function_pointer = ast_node_is_function_pointer (field.type)
-            qtype = QualifiedSymbol(type_tokens=type_tokens)
             name = '%s.%s' % (spelling, field.spelling)
-            member = self.__doc_db.get_or_create_symbol(FieldSymbol, is_function_pointer=is_function_pointer,
-                    member_name=field.spelling, qtype=qtype, filename=str(node.location.file),
-                    display_name=name, unique_name=name)
-            members.append (member)
+            fields.append (FieldRecord(name, field.spelling, type_tokens,
+                                       is_function_pointer))
 
         if not public_fields:
             raw_text = None
 
         anonymous = not node.spelling
 
-        return self.__doc_db.get_or_create_symbol(StructSymbol, raw_text=raw_text,
-                members=members, anonymous=anonymous,
-                display_name=spelling,
-                filename=str(node.location.file), lineno=node.location.line)
+        return StructRecord(spelling, str(node.location.file),
+                            node.location.line, raw_text, fields, anonymous)
 
-    def __create_enum_symbol (self, node, spelling=None):
+    def __enum_record (self, node, spelling=None):
         spelling = spelling or node.spelling
         members = []
         for member in node.get_children():
-            member_value = member.enum_value
-            # FIXME: this is pretty much a macro symbol ?
-            member = self.__doc_db.get_or_create_symbol(Symbol, display_name=member.spelling,
-                    filename=str(member.location.file),
-                    lineno=member.location.line)
-            member.enum_value = member_value
-            members.append (member)
+            members.append (EnumMemberRecord(member.spelling,
+                                             str(member.location.file),
+                                             member.location.line,
+                                             member.enum_value))
 
         anonymous = not node.spelling
 
@@ -464,42 +1099,38 @@ class ClangScanner(object):
             end)]
         raw_text = '\n'.join(original_lines)
 
-        return self.__doc_db.get_or_create_symbol(EnumSymbol, members=members,
-                anonymous=anonymous, raw_text=raw_text, display_name=spelling,
-                filename=str(node.location.file), lineno=node.location.line)
+        return EnumRecord(spelling, str(node.location.file),
+                          node.location.line, raw_text, members, anonymous)
 
-    def __create_alias_symbol (self, node):
+    def __alias_record (self, node):
         typedef = node.underlying_typedef_type
-        type_tokens = self.make_c_style_type_name(typedef)
-        aliased_type = QualifiedSymbol (type_tokens=type_tokens)
+        aliased_tokens = self.__type_tokens(typedef)
 
-        extra = {}
+        implementation_filename = None
         if typedef.get_declaration().location.file:
             aliased_filename = str(typedef.get_declaration().location.file)
             if aliased_filename in self.__all_sources:
-                extra['implementation_filename'] = aliased_filename
-
-        filename = str(node.location.file)
+                implementation_filename = aliased_filename
 
-        symb = self.__doc_db.get_or_create_symbol(AliasSymbol, aliased_type=aliased_type,
-                display_name=node.spelling, filename=filename,
-                lineno=node.location.line, extra=extra)
+        return AliasRecord(node.spelling, str(node.location.file),
+                           node.location.line, aliased_tokens,
+                           implementation_filename)
 
-    def __create_typedef_symbol (self, node):
+    def __typedef_record (self, node):
         t = node.underlying_typedef_type
         decl = t.get_declaration()
         if ast_node_is_function_pointer (t):
-            sym = self.__create_callback_symbol (node)
+            record = self.__callback_record (node)
         elif not decl.spelling and decl.kind == cindex.CursorKind.STRUCT_DECL: # typedef struct {} foo;
-            sym = self.__create_struct_symbol (decl, spelling=node.spelling)
+            record = self.__struct_record (decl, spelling=node.spelling)
         elif not decl.spelling and decl.kind == cindex.CursorKind.ENUM_DECL: # typedef enum {} bar;
-            sym = self.__create_enum_symbol (decl, spelling=node.spelling)
+            record = self.__enum_record (decl, spelling=node.spelling)
         else:
-            sym = self.__create_alias_symbol (node)
+            record = self.__alias_record (node)
 
-        return sym
+        return record
 
-    def __create_macro_from_raw_text(self, raw, filename):
+    def __macro_record_from_raw_text(self, raw, filename):
         mcontent = raw[0].replace('\t', ' ')
         mcontent = mcontent.split(' ', 1)[1]
         split = mcontent.split('(', 1)
@@ -508,65 +1139,27 @@ class ClangScanner(object):
             args = split[1].split(')', 1)[0].split(',')
             if args:
                 stripped_name = name.strip()
-                return self.__create_function_macro_symbol(stripped_name,
-                    filename, raw[1], raw[0])
+                return FunctionMacroRecord(stripped_name, filename, raw[1],
+                                           raw[0])
 
         name = mcontent.split(' ', 1)[0]
         stripped_name = name.strip()
-        return self.__create_constant_symbol(stripped_name, filename, raw[1], raw[0])
-
-    def __create_function_macro_symbol (self, name, filename, lineno, original_text):
-        comment = self.app.database.get_comment(name)
+        return ConstantRecord(stripped_name, filename, raw[1], raw[0])
 
-        return_value = [None]
-        if comment:
-            return_tag = comment.tags.get ('returns')
-            if return_tag:
-                return_value = [ReturnItemSymbol ()]
+    def __function_record (self, node):
+        return_tokens = self.__type_tokens (node.result_type)
 
         parameters = []
-
-        if comment:
-            for param_name in comment.params:
-                parameter = ParameterSymbol (argname=param_name)
-                parameters.append (parameter)
-
-        sym = self.__doc_db.get_or_create_symbol(FunctionMacroSymbol, return_value=return_value,
-                parameters=parameters, original_text=original_text,
-                display_name=name,
-                filename=filename, lineno=lineno)
-        return sym
-
-    def __create_constant_symbol (self, name, filename, lineno, original_text):
-        return self.__doc_db.get_or_create_symbol(ConstantSymbol,
-                original_text=original_text,
-                display_name=name, filename=filename,
-                lineno=lineno)
-
-    def __create_function_symbol (self, node):
-        parameters = []
-
-        type_tokens = self.make_c_style_type_name (node.result_type)
-        return_value = [ReturnItemSymbol (type_tokens=type_tokens)]
-
         for param in node.get_arguments():
-            type_tokens = self.make_c_style_type_name (param.type)
-            parameter = ParameterSymbol (argname=param.displayname,
-                    type_tokens=type_tokens)
-            parameters.append (parameter)
-
-        sym = self.__doc_db.get_or_create_symbol(FunctionSymbol, parameters=parameters,
-                return_value=return_value, display_name=node.spelling,
-                filename=str(node.location.file), lineno=node.location.line,
-                extent_start=node.extent.start.line,
-                extent_end=node.extent.end.line)
-
-        return sym
+            type_tokens = self.__type_tokens (param.type)
+            parameters.append (ParameterRecord(param.displayname,
+                                               type_tokens))
 
-    def __create_exported_variable_symbol (self, node):
-        l = linecache.getline (str(node.location.file), node.location.line)
-        split = l.split()
+        return FunctionRecord(node.spelling, str(node.location.file),
+                              node.location.line, return_tokens, parameters,
+                              node.extent.start.line, node.extent.end.line)
 
+    def __variable_record (self, node):
         start = node.extent.start.line
         end = node.extent.end.line + 1
         filename = str(node.location.file)
@@ -574,14 +1167,124 @@ class ClangScanner(object):
             end)]
         original_text = '\n'.join(original_lines)
 
-        type_tokens = self.make_c_style_type_name(node.type)
-        type_qs = QualifiedSymbol(type_tokens=type_tokens)
+        type_tokens = self.__type_tokens(node.type)
+
+        return VariableRecord(node.spelling, filename, node.location.line,
+                              original_text, type_tokens)
+
+    def materialize(self, records):
+        """
+        Creates or updates the symbols described by @records in the
+        doc database.
+        """
+        create = self.__doc_db.get_or_create_symbol
+        materializers = self.__materializers
+        for record in records:
+            materializers[type(record)](self, create, record)
+
+    def __materialize_function(self, create, record):
+        return create(FunctionSymbol,
+                parameters=materialize_parameters(record.parameters),
+                return_value=[ReturnItemSymbol(
+                    type_tokens=type_tokens_to_links(record.return_tokens))],
+                display_name=record.name, filename=record.filename,
+                lineno=record.lineno, extent_start=record.extent_start,
+                extent_end=record.extent_end)
+
+    def __materialize_callback(self, create, record):
+        return create(CallbackSymbol,
+                parameters=materialize_parameters(record.parameters),
+                return_value=[ReturnItemSymbol(
+                    type_tokens=type_tokens_to_links(record.return_tokens))],
+                display_name=record.name, filename=record.filename,
+                lineno=record.lineno)
+
+    def __materialize_struct(self, create, record):
+        members = []
+        for field in record.fields:
+            qtype = QualifiedSymbol(
+                type_tokens=type_tokens_to_links(field.type_tokens))
+            members.append(create(FieldSymbol,
+                is_function_pointer=field.is_function_pointer,
+                member_name=field.member_name, qtype=qtype,
+                filename=record.filename, display_name=field.name,
+                unique_name=field.name))
+
+        return create(StructSymbol, raw_text=record.raw_text,
+                members=members, anonymous=record.anonymous,
+                display_name=record.name, filename=record.filename,
+                lineno=record.lineno)
+
+    def __materialize_enum(self, create, record):
+        members = []
+        for member_record in record.members:
+            # FIXME: this is pretty much a macro symbol ?
+            member = create(Symbol, display_name=member_record.name,
+                    filename=member_record.filename,
+                    lineno=member_record.lineno)
+            member.enum_value = member_record.value
+            members.append (member)
+
+        return create(EnumSymbol, members=members,
+                anonymous=record.anonymous, raw_text=record.raw_text,
+                display_name=record.name, filename=record.filename,
+                lineno=record.lineno)
+
+    def __materialize_alias(self, create, record):
+        extra = {}
+        if record.implementation_filename:
+            extra['implementation_filename'] = record.implementation_filename
+
+        aliased_type = QualifiedSymbol(
+            type_tokens=type_tokens_to_links(record.aliased_tokens))
+        return create(AliasSymbol, aliased_type=aliased_type,
+                display_name=record.name, filename=record.filename,
+                lineno=record.lineno, extra=extra)
+
+    def __materialize_variable(self, create, record):
+        type_qs = QualifiedSymbol(
+            type_tokens=type_tokens_to_links(record.type_tokens))
+        return create(ExportedVariableSymbol,
+                original_text=record.original_text,
+                display_name=record.name, filename=record.filename,
+                lineno=record.lineno, type_qs=type_qs)
+
+    def __materialize_function_macro(self, create, record):
+        comment = self.app.database.get_comment(record.name)
+
+        return_value = [None]
+        if comment:
+            return_tag = comment.tags.get ('returns')
+            if return_tag:
+                return_value = [ReturnItemSymbol ()]
+
+        parameters = []
 
-        sym = self.__doc_db.get_or_create_symbol(ExportedVariableSymbol, original_text=original_text,
-                display_name=node.spelling, filename=str(node.location.file),
-                lineno=node.location.line, type_qs=type_qs)
-        return sym
+        if comment:
+            for param_name in comment.params:
+                parameter = ParameterSymbol (argname=param_name)
+                parameters.append (parameter)
 
+        return create(FunctionMacroSymbol, return_value=return_value,
+                parameters=parameters, original_text=record.original_text,
+                display_name=record.name, filename=record.filename,
+                lineno=record.lineno)
+
+    def __materialize_constant(self, create, record):
+        return create(ConstantSymbol, original_text=record.original_text,
+                display_name=record.name, filename=record.filename,
+                lineno=record.lineno)
+
+    __materializers = {
+        FunctionRecord: __materialize_function,
+        CallbackRecord: __materialize_callback,
+        StructRecord: __materialize_struct,
+        EnumRecord: __materialize_enum,
+        AliasRecord: __materialize_alias,
+        VariableRecord: __materialize_variable,
+        FunctionMacroRecord: __materialize_function_macro,
+        ConstantRecord: __materialize_constant,
+    }
 
 def flags_from_config(config):
     flags = []
@@ -610,6 +1313,18 @@ class CExtension(Extension):
         Extension.__init__(self, app, project)
         self.project = project
         self.flags = []
+        self.umbrella = False
+        self.lazy_scan = False
+        self.extraction_cache = True
+        self.profile_report = None
+        self.trace_file = None
+        self.snapshot = None
+        self.snapshot_export = None
+        self.__symbol_packs = SymbolPacks()
+        self.__snapshot_root = None
+        self.tracer = NullTraceRecorder()
+        self.__lazy_index = {}
+        self.__lazy_pending = set()
         if not CExtension.connected:
             inclusions.include_signal.connect(self.__include_file_cb)
             CExtension.connected = True
@@ -667,9 +1382,207 @@ class CExtension(Extension):
     def setup(self):
         super(CExtension, self).setup()
         stale, unlisted = self.get_stale_files(self.sources)
+
+        if self.tracer.enabled:
+            self.project.formatted_signal.connect(self.__write_trace)
+
+        if self.__symbol_packs:
+            self.app.link_resolver.get_link_signal.connect(
+                self.__search_symbol_packs)
+            self.app.link_resolver.resolving_link_signal.connect(
+                self.__resolve_link_from_symbol_packs)
+
+        if self.scanner.parse_timeout:
+            self.__load_quarantine()
+            self.project.formatted_signal.connect(self.__save_quarantine)
+
+        if self.snapshot and self.__load_snapshot():
+            return
+
+        if self.extraction_cache:
+            self.scanner.cache = ExtractionCache()
+            self.scanner.cache.load(self.__get_extraction_cache_path())
+
+        if self.snapshot_export:
+            self.__export_snapshot()
+            return
+
+        if self.lazy_scan:
+            self.__setup_lazy_scan(stale)
+            return
+
+        with self.tracer.span('scan', 'c-scan', n_files=len(stale)):
+            self.scanner.scan(stale, self.flags,
+                              self.app.incremental, False, ['*.h'],
+                              all_sources=self.sources,
+                              umbrella=self.umbrella)
+        self.__save_extraction_cache()
+        self.__write_profile_report()
+
+    def __search_symbol_packs(self, resolver, name):
+        url = self.__symbol_packs.get_url(name)
+        if url:
+            return Link(url, name, name)
+        return None
+
+    def __resolve_link_from_symbol_packs(self, link):
+        if link.ref is None:
+            return self.__symbol_packs.get_url(link.id_)
+        return None
+
+    def __load_snapshot(self):
+        if not os.path.exists(self.snapshot):
+            info('No C snapshot at %s, scanning' % self.snapshot)
+            return False
+
+        snapshot = ScanSnapshot.load(self.snapshot, self.__snapshot_root)
+        if snapshot is None or not snapshot.matches(self.sources):
+            info('C snapshot %s is out of date, scanning' % self.snapshot)
+            return False
+
+        info('Loading C symbols from snapshot %s' % self.snapshot)
+        with self.tracer.span('load-snapshot', 'c-scan'):
+            self.scanner.load_snapshot(snapshot)
+        return True
+
+    def __export_snapshot(self):
+        # Whatever is up to date still has to be in the snapshot
+        self.scanner.snapshot = ScanSnapshot()
+        with self.tracer.span('scan', 'c-scan', n_files=len(self.sources)):
+            self.scanner.scan(self.sources, self.flags,
+                              self.app.incremental, False, ['*.h'],
+                              all_sources=self.sources,
+                              umbrella=self.umbrella)
+        self.__save_extraction_cache()
+        self.__write_profile_report()
+
+        info('Exporting C snapshot to %s' % self.snapshot_export)
+        self.scanner.snapshot.save(self.snapshot_export,
+                                   self.__snapshot_root, self.sources)
+        self.scanner.snapshot = None
+
+    def __get_extraction_cache_path(self):
+        return os.path.join(self.project.get_private_folder(),
+                            '%s-extraction-cache-%s.p' % (
+                                self.extension_name,
+                                self.project.sanitized_name))
+
+    def __save_extraction_cache(self):
+        if self.scanner.cache.enabled:
+            self.scanner.cache.save(self.__get_extraction_cache_path())
+
+    def __get_quarantine_path(self):
+        return os.path.join(self.project.get_private_folder(),
+                            '%s-quarantine-%s.json' % (
+                                self.extension_name,
+                                self.project.sanitized_name))
+
+    def __load_quarantine(self):
+        try:
+            with open(self.__get_quarantine_path(), 'r') as _:
+                quarantine = json.load(_)
+        except (IOError, ValueError):
+            return
+
+        # Files which got less time than this budget may fit in it,
+        # entries saved before parse times were recorded get retried
+        self.scanner.quarantine = {
+            filename: entry for filename, entry in quarantine.items()
+            if os.path.exists(filename) and 'elapsed' in entry and
+            entry['elapsed'] >= self.scanner.parse_timeout}
+
+    def __save_quarantine(self, project):
+        for filename in self.scanner.quarantined:
+            entry = self.scanner.quarantine[filename]
+            info('%s is quarantined since %s, parsing it was given up after '
+                 '%.1fs, only its comments were extracted' % (
+                     filename, time.strftime('%Y-%m-%d %H:%M:%S',
+                                             time.localtime(
+                                                 entry['timestamp'])),
+                     entry['elapsed']))
+
+        with open(self.__get_quarantine_path(), 'w') as _:
+            json.dump(self.scanner.quarantine, _, indent=2)
+
+    def __write_trace(self, project):
+        info('Writing trace events to %s' % self.trace_file)
+        self.tracer.write(self.trace_file)
+
+    def __write_profile_report(self):
+        if self.profile_report:
+            info('Writing scan profile report to %s' % self.profile_report)
+            self.scanner.profile.write_report(self.profile_report)
+
+    def __get_lazy_pending_path(self):
+        return os.path.join(self.project.get_private_folder(),
+                            '%s-lazy-pending-%s.p' % (
+                                self.extension_name,
+                                self.project.sanitized_name))
+
+    def __setup_lazy_scan(self, stale):
+        # Headers that were indexed but never scanned by a previous lazy
+        # run are not up to date, whatever the change tracker thinks
+        pending_path = self.__get_lazy_pending_path()
+        if os.path.exists(pending_path):
+            with open(pending_path, 'rb') as _:
+                pending = pickle.load(_)
+            stale_set = set(stale)
+            stale = list(stale) + [f for f in pending
+                                   if f in self.sources and
+                                   f not in stale_set]
+
+        # Only gather comments and macros here, symbol names documented
+        # in each header are indexed so pages can be generated for them
         self.scanner.scan(stale, self.flags,
-                          self.app.incremental, False, ['*.h'],
+                          self.app.incremental, False, [],
                           all_sources=self.sources)
+        self.__save_extraction_cache()
+
+        for filename in stale:
+            if not filename.endswith('.h'):
+                continue
+            names = set(name for name in
+                        self.scanner.comment_names.get(filename, [])
+                        if ':' not in name)
+            for name in names:
+                self.__lazy_index[name] = filename
+            self.scanner.declare_symbols(filename, names)
+            self.__lazy_pending.add(filename)
+
+        self.__write_profile_report()
+
+        info('indexed %d symbols in %d headers, scanning lazily' %
+             (len(self.__lazy_index), len(self.__lazy_pending)))
+
+        self.project.tree.update_signal.connect_after(
+            self.__lazy_update_tree_cb)
+
+    def __lazy_update_tree_cb(self, tree, unlisted_sym_names):
+        to_scan = set()
+        for page in tree.get_pages().values():
+            if not page.is_stale:
+                continue
+            for name in page.symbol_names:
+                filename = self.__lazy_index.get(name)
+                if filename is not None:
+                    to_scan.add(filename)
+
+        to_scan = [f for f in self.sources if f in to_scan]
+        if to_scan:
+            self.scanner.scan(to_scan, self.flags,
+                              self.app.incremental, True, ['*.h'],
+                              all_sources=self.sources,
+                              umbrella=self.umbrella)
+
+        self.__lazy_pending -= set(to_scan)
+        debug('%d headers left to scan' % len(self.__lazy_pending))
+
+        with open(self.__get_lazy_pending_path(), 'wb') as _:
+            pickle.dump(self.__lazy_pending, _)
+
+        self.__save_extraction_cache()
+
+        self.__write_profile_report()
 
     @staticmethod
     def add_arguments (parser):
@@ -682,9 +1595,92 @@ class CExtension(Extension):
                 dest="pkg_config_packages", help="Packages the library depends upon")
         group.add_argument ("--extra-c-flags", action="store", nargs="+",
                 dest="extra_c_flags", help="Extra C flags (-D, -U, ..)")
+        group.add_argument ("--c-umbrella-translation-unit",
+                action="store_true", dest="c_umbrella_translation_unit",
+                help="Parse all the headers at once, in a single translation "
+                     "unit including all of them. Much faster, but requires "
+                     "all the headers to be includable together")
+        CExtension.add_path_argument(group, "profile-report",
+                help_="Write a JSON report of the time spent scanning each "
+                      "file, and of various counters, to this file")
+        CExtension.add_path_argument(group, "snapshot",
+                help_="Load the symbols and comments of the C sources from "
+                      "this snapshot instead of scanning them, provided "
+                      "the sources did not change since it was exported")
+        CExtension.add_path_argument(group, "snapshot-export",
+                help_="Scan all the C sources, and export a snapshot of "
+                      "the result to this file, for use with --c-snapshot "
+                      "where clang is not available")
+        CExtension.add_paths_argument(group, "symbol-packs",
+                help_="Symbol packs to link to the documentation of "
+                      "dependencies with, see "
+                      "hotdoc_c_extension.symbol_packs")
+        CExtension.add_path_argument(group, "trace-file",
+                help_="Record a timeline of the build, and write it to this "
+                      "file in the Chrome trace event format")
+        group.add_argument ("--c-diagnostics-severity", action="store",
+                dest="c_diagnostics_severity",
+                choices=sorted(DIAGNOSTIC_SEVERITIES),
+                help="Minimum severity of the clang diagnostics to display, "
+                     "default is warning")
+        group.add_argument ("--c-max-diagnostics-per-file", action="store",
+                type=int, dest="c_max_diagnostics_per_file",
+                help="Maximum number of clang diagnostics to display for "
+                     "a given file, 0 for no limit, default is 20")
+        group.add_argument ("--c-scan-max-rss", action="store", type=int,
+                dest="c_scan_max_rss",
+                help="Resident memory watermark, in megabytes. Once it is "
+                     "crossed, memory is reclaimed before parsing a new file, "
+                     "and files are parsed in a child process if that is not "
+                     "enough")
+        group.add_argument ("--c-parse-timeout", action="store", type=float,
+                dest="c_parse_timeout",
+                help="Time budget in seconds for parsing a single file. Files "
+                     "exceeding it are quarantined, and only their comments "
+                     "are extracted until they are modified")
+        group.add_argument ("--c-disable-extraction-cache",
+                action="store_true", dest="c_disable_extraction_cache",
+                help="Do not reuse the symbols and comments extracted from "
+                     "files whose contents, includes and flags did not "
+                     "change since the previous run")
+        group.add_argument ("--c-lazy-scan",
+                action="store_true", dest="c_lazy_scan",
+                help="Only index the comments of the headers at setup "
+                     "time, and only parse the headers whose symbols are "
+                     "listed in pages being built. Useful for quick "
+                     "previews, links to symbols of headers that were not "
+                     "parsed will not be resolved")
 
     def parse_config(self, config):
         super(CExtension, self).parse_config(config)
         self.flags = flags_from_config(config)
         for dir_ in config.get_paths('c_include_directories') or []:
             self.flags.append('-I%s' % dir_)
+        self.umbrella = bool(config.get('c_umbrella_translation_unit'))
+        self.__snapshot_root = config.get_invoke_dir()
+        # Both extensions register a symbol-packs argument, which the
+        # base class would store in the same attribute
+        symbol_packs = config.get_paths('c_symbol_packs')
+        if symbol_packs:
+            self.__symbol_packs = SymbolPacks(symbol_packs)
+        self.lazy_scan = bool(config.get('c_lazy_scan'))
+        self.extraction_cache = \
+            not config.get('c_disable_extraction_cache')
+        severity = config.get('c_diagnostics_severity')
+        if severity:
+            self.scanner.diagnostics.min_severity = \
+                DIAGNOSTIC_SEVERITIES[severity]
+        max_diagnostics = config.get('c_max_diagnostics_per_file')
+        if max_diagnostics is not None:
+            self.scanner.diagnostics.max_per_file = int(max_diagnostics)
+        parse_timeout = config.get('c_parse_timeout')
+        if parse_timeout:
+            self.scanner.parse_timeout = float(parse_timeout)
+        max_rss = config.get('c_scan_max_rss')
+        if max_rss:
+            self.scanner.max_rss = int(max_rss) * MB
+        if self.trace_file:
+            self.tracer = TraceRecorder()
+            self.scanner.tracer = self.tracer
+        if self.profile_report:
+            self.scanner.profile = ScanProfile()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Persistent cache of what the C scanner extracted from each file.
+
+Entries are keyed by content hashes rather than modification times,
+so a file that was merely touched, or checked out again, is not
+parsed again.
+"""
+
+import hashlib
+import os
+import pickle
+
+
+def file_digest(filename):
+    """
+    Returns the hash of the contents of @filename, or None if it
+    cannot be read.
+    """
+    try:
+        with open(filename, 'rb') as _:
+            return hashlib.sha1(_.read()).hexdigest()
+    except IOError:
+        return None
+
+
+class NullExtractionCache(object):
+    enabled = False
+
+    # pylint: disable=unused-argument,no-self-use
+    def get_records(self, filename, flags):
+        return None
+
+    def set_records(self, filename, flags, includes, records, guarded):
+        pass
+
+    def get_comments(self, filename):
+        return None
+
+    def set_comments(self, filename, comments):
+        pass
+
+
+class ExtractionCache(object):
+    """
+    Maps files to the scan records and comment tuples extracted from
+    them, see `hotdoc_c_extension.scan_records`.
+    """
+    enabled = True
+
+    # Bump when the records or the comment scanner change
+    VERSION = 1
+
+    def __init__(self):
+        self.__records = {}
+        self.__comments = {}
+        self.__digests = {}
+
+    def load(self, path):
+        try:
+            with open(path, 'rb') as _:
+                version, self.__records, self.__comments = pickle.load(_)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            return
+
+        if version != ExtractionCache.VERSION:
+            self.__records = {}
+            self.__comments = {}
+
+    def save(self, path):
+        records = {filename: entry for filename, entry in
+                   self.__records.items() if os.path.exists(filename)}
+        comments = {filename: entry for filename, entry in
+                    self.__comments.items() if os.path.exists(filename)}
+        with open(path, 'wb') as _:
+            pickle.dump((ExtractionCache.VERSION, records, comments), _,
+                        pickle.HIGHEST_PROTOCOL)
+
+    def digest(self, filename):
+        """
+        Returns the hash of the contents of @filename, or None if it
+        cannot be read. Files are only hashed once.
+        """
+        try:
+            return self.__digests[filename]
+        except KeyError:
+            pass
+
+        digest = self.__digests[filename] = file_digest(filename)
+        return digest
+
+    def __key(self, filename, flags, includes):
+        key = hashlib.sha1('\0'.join(flags).encode('utf-8'))
+        for path in [filename] + includes:
+            key.update(('\0%s\0%s' % (path, self.digest(path))).encode(
+                'utf-8'))
+        return key.hexdigest()
+
+    def get_records(self, filename, flags):
+        """
+        Returns the records and the header guard status stored for
+        @filename, provided neither it, the files it includes nor
+        @flags changed since, None otherwise.
+        """
+        entry = self.__records.get(filename)
+        if entry is None:
+            return None
+
+        key, includes, records, guarded = entry
+        if key != self.__key(filename, flags, includes):
+            del self.__records[filename]
+            return None
+
+        return records, guarded
+
+    def set_records(self, filename, flags, includes, records, guarded):
+        """
+        Stores the @records extracted from @filename when parsed with
+        @flags, @includes being the files it includes, recursively.
+        """
+        includes = sorted(includes)
+        self.__records[filename] = (self.__key(filename, flags, includes),
+                                    includes, records, guarded)
+
+    def get_comments(self, filename):
+        entry = self.__comments.get(filename)
+        if entry is None or entry[0] != self.digest(filename):
+            return None
+        return entry[1]
+
+    def set_comments(self, filename, comments):
+        self.__comments[filename] = (self.digest(filename), comments)
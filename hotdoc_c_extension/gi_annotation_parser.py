@@ -79,10 +79,23 @@ TYPE_HELP = \
 "Override the parsed C type with given type"
 
 class GIAnnotation (object):
-    def __init__(self, nick, help_text, value=None):
-        self.nick = nick
-        self.help_text = help_text
-        self.value = value
+    """
+    Annotations are immutable and interned, there is a single instance
+    of each distinct annotation, see `GIFormatter.format_annotations`.
+    """
+    __slots__ = ('nick', 'help_text', 'value')
+    __interned = {}
+
+    def __new__(cls, nick, help_text, value=None):
+        key = (nick, help_text, value)
+        annotation = cls.__interned.get(key)
+        if annotation is None:
+            annotation = object.__new__(cls)
+            annotation.nick = nick
+            annotation.help_text = help_text
+            annotation.value = value
+            cls.__interned[key] = annotation
+        return annotation
 
 
 class GIAnnotationParser(object):
@@ -63,6 +63,11 @@ from hotdoc.utils.loggable import warn, Logger
 from .gi_formatter import GIFormatter
 from .gi_annotation_parser import GIAnnotationParser
 from .fundamentals import PY_FUNDAMENTALS, JS_FUNDAMENTALS
+from .symbol_packs import SymbolPacks
+from .gtk_doc_links import GtkDocLinks
+from .gir_cache import (GirIndex, LazyNodes, LazyNamespaces, load_gir_index,
+                        save_gir_index, read_gir_header, parse_gir_nodes,
+                        GirLocator, SKIPPED_TAGS)
 
 
 Logger.register_warning_code('missing-gir-include', BadInclusionException,
@@ -70,6 +75,18 @@ Logger.register_warning_code('missing-gir-include', BadInclusionException,
 
 
 class Flag (object):
+    """
+    Flags are interned, each flag class only ever has one instance,
+    see `GIFormatter._format_flags`.
+    """
+    __interned = {}
+
+    def __new__ (cls):
+        flag = Flag.__interned.get(cls)
+        if flag is None:
+            flag = Flag.__interned[cls] = object.__new__(cls)
+        return flag
+
     def __init__ (self, nick, link):
         self.nick = nick
         self.link = link
@@ -119,6 +136,12 @@ class ConstructOnlyFlag (Flag):
         Flag.__init__ (self, "Construct Only", None)
 
 
+# Nodes we know how to create C symbols for, see --gi-symbols-from-gir
+GIR_SYMBOL_TAGS = ['function', 'method', 'constructor', 'callback', 'record',
+                   'class', 'interface', 'union', 'enumeration', 'bitfield',
+                   'alias']
+
+
 DESCRIPTION=\
 """
 Parse a gir file and add signals, properties, classes
@@ -136,7 +159,8 @@ class GIExtension(Extension):
     argument_prefix = "gi"
 
     __gathered_gtk_doc_links = False
-    __gtkdoc_hrefs = {}
+    __gtkdoc_links = GtkDocLinks()
+    __symbol_packs = SymbolPacks()
 
     def __init__(self, app, project):
         Extension.__init__(self, app, project)
@@ -149,7 +173,14 @@ class GIExtension(Extension):
                       'glib': 'http://www.gtk.org/introspection/glib/1.0'}
 
         self.__parsed_girs = set()
-        self.__node_cache = {}
+        self.__source_girs = {}
+        self.__gir_locator = None
+        self.__gir_roots = {}
+        # Included namespaces are only loaded when one of their nodes
+        # is looked up
+        self.__lazy_namespaces = LazyNamespaces()
+        self.__node_cache = LazyNodes(self.__get_gir_root,
+                                      self.__load_namespaces_for_symbol)
 
         # If generating the index ourselves, we will filter these functions
         # out.
@@ -157,7 +188,10 @@ class GIExtension(Extension):
         # We need to collect all class nodes and build the
         # hierarchy beforehand, because git class nodes do not
         # know about their children
-        self.__class_nodes = {}
+        self.__class_nodes = LazyNodes(self.__get_gir_root,
+                                       self.__load_namespace_for_class)
+        # gi name -> (C type name, gi name of the parent class)
+        self.__class_info = {}
 
         # Only used to reduce debug verbosity
         self.__dropped_symbols = set({})
@@ -167,9 +201,11 @@ class GIExtension(Extension):
         self.__gir_hierarchies = {}
         self.__gir_children_map = defaultdict(dict)
 
+        # Filled from the gir indexes when caching nodes
         self.__c_names = {}
         self.__python_names = {}
         self.__javascript_names = {}
+        self.__non_introspectable = set()
 
         self.__annotation_parser = GIAnnotationParser()
 
@@ -177,8 +213,17 @@ class GIExtension(Extension):
 
         self._fundamentals = {}
 
+        # Translated refs and titles by language, then by link id and
+        # untranslated ref or title
+        self.__link_refs = defaultdict(dict)
+        self.__link_titles = defaultdict(dict)
+        self.__n_link_lookups = 0
+
         self.__gen_index_path = None
 
+        self.symbols_from_gir = False
+        self.__gir_header_nodes = defaultdict(list)
+
         self.c_extension = project.extensions.get('c-extension')
 
     @staticmethod
@@ -191,6 +236,16 @@ class GIExtension(Extension):
                 nargs='*',
                 help="Languages to translate documentation in (c, python,"
                      "javascript), default is to make all languages")
+        group.add_argument ("--gi-symbols-from-gir", action="store_true",
+                dest="gi_symbols_from_gir",
+                help="Create the C symbols of the headers described in the "
+                     "gir files from the introspection data, instead of "
+                     "parsing these headers with clang. Requires gir files "
+                     "with source positions")
+        GIExtension.add_paths_argument(group, "symbol-packs",
+                help_="Symbol packs to link to the documentation of "
+                      "dependencies with, instead of gathering links from "
+                      "the installed gtk-doc books")
 
     def parse_config(self, config):
         super(GIExtension, self).parse_config(config)
@@ -202,13 +257,31 @@ class GIExtension(Extension):
             self.languages.insert (0, 'c')
         if not self.languages:
             self.languages = ['c', 'python', 'javascript']
+        self.symbols_from_gir = bool(config.get('gi_symbols_from_gir'))
+        # Not self.symbol_packs, --c-symbol-packs ends up there too
+        symbol_packs = config.get_paths('gi_symbol_packs')
+        if symbol_packs:
+            GIExtension.__symbol_packs = SymbolPacks(symbol_packs)
         if self.sources:
             self.c_extension.scanner.set_extension(self)
         for gir_file in self.sources:
-            gir_root = etree.parse(gir_file).getroot()
-            self.__cache_nodes(gir_root)
+            self.__parsed_girs.add(gir_file)
+            self.__source_girs.setdefault(os.path.basename(gir_file),
+                                          gir_file)
+        for gir_file in self.sources:
+            index = self.__cache_nodes(gir_file)
+            self.__register_includes(index.includes)
+            if self.symbols_from_gir:
+                self.__index_source_positions(self.__get_gir_root(gir_file))
         self.__create_hierarchies()
 
+        if self.__gir_header_nodes:
+            scanner = self.c_extension.scanner
+            scanner.gir_headers = set(self.__gir_header_nodes)
+            scanner.gir_symbols = self.__node_cache
+            if self.symbols_from_gir:
+                scanner.create_gir_symbols = self.__create_symbols_from_gir
+
     @staticmethod
     def get_dependencies ():
         return [ExtDependency('c-extension', is_upstream=True)]
@@ -224,18 +297,21 @@ class GIExtension(Extension):
         return headers
 
     def setup (self):
-        super(GIExtension, self).setup()
-
-        if not self.__gathered_gtk_doc_links:
+        # Packs replace the gtk-doc books, which are read before the
+        # doc tree gets built
+        if not self.__gathered_gtk_doc_links and not self.__symbol_packs:
             self.__gather_gtk_doc_links()
             self.__gathered_gtk_doc_links = True
 
+        super(GIExtension, self).setup()
+
         if not self.sources:
             return
 
         self.info('Gathering legacy gtk-doc links')
         self.project.tree.resolving_symbol_signal.connect (self.__resolving_symbol)
         self.app.link_resolver.resolving_link_signal.connect(self.__translate_link_ref)
+        self.project.formatted_signal.connect(self.__clear_link_tables)
 
     def format_page(self, page, link_resolver, output):
         link_resolver.get_link_signal.connect(self.search_online_links)
@@ -244,90 +320,83 @@ class GIExtension(Extension):
         for l in self.languages:
             page.meta['extra']['gi-language'] = l
             self.setup_language (l)
-            Extension.format_page (self, page, link_resolver, output)
+            with self.c_extension.tracer.span('format', 'gi', language=l,
+                                              page=page.source_file):
+                Extension.format_page (self, page, link_resolver, output)
 
         self.setup_language(None)
 
         link_resolver.get_link_signal.disconnect(self.search_online_links)
         self.formatter.formatting_symbol_signal.disconnect(self.__formatting_symbol)
 
-    def __find_gir_file(self, gir_name):
-        for source in self.sources:
-            if os.path.basename(source) == gir_name:
-                return source
-
-        xdg_dirs = os.getenv('XDG_DATA_DIRS') or ''
-        xdg_dirs = [p for p in xdg_dirs.split(':') if p]
-        xdg_dirs.append(self.project.datadir)
-        for dir_ in xdg_dirs:
-            gir_file = os.path.join(dir_, 'gir-1.0', gir_name)
-            if os.path.exists(gir_file):
-                return gir_file
-        return None
+    def __parse_gir(self, gir_file):
+        with self.c_extension.tracer.span('gir-parse', 'gi',
+                                          filename=gir_file):
+            return parse_gir_nodes(gir_file)
+
+    def __get_gir_root(self, gir_file):
+        root = self.__gir_roots.get(gir_file)
+        if root is None:
+            root = self.__gir_roots[gir_file] = self.__parse_gir(gir_file)
+        return root
 
-    def __generate_smart_filters(self, id_prefixes, sym_prefixes, node):
+    def __find_gir_file(self, gir_name):
+        source = self.__source_girs.get(gir_name)
+        if source is not None:
+            return source
+
+        if self.__gir_locator is None:
+            xdg_dirs = os.getenv('XDG_DATA_DIRS') or ''
+            xdg_dirs = [p for p in xdg_dirs.split(':') if p]
+            xdg_dirs.append(self.project.datadir)
+            self.__gir_locator = GirLocator(xdg_dirs)
+        return self.__gir_locator.find(gir_name)
+
+    def __generate_smart_filters(self, id_prefixes, sym_prefixes, node,
+                                 smart_filters):
         sym_prefix = node.attrib['{%s}symbol-prefix' % self.__nsmap['c']]
-        self.__smart_filters.add(('%s_IS_%s' % (sym_prefixes, sym_prefix)).upper())
-        self.__smart_filters.add(('%s_TYPE_%s' % (sym_prefixes, sym_prefix)).upper())
-        self.__smart_filters.add(('%s_%s' % (sym_prefixes, sym_prefix)).upper())
-        self.__smart_filters.add(('%s_%s_CLASS' % (sym_prefixes, sym_prefix)).upper())
-        self.__smart_filters.add(('%s_IS_%s_CLASS' % (sym_prefixes, sym_prefix)).upper())
-        self.__smart_filters.add(('%s_%s_GET_CLASS' % (sym_prefixes, sym_prefix)).upper())
-        self.__smart_filters.add(('%s_%s_GET_IFACE' % (sym_prefixes, sym_prefix)).upper())
-
-    def __cache_nodes(self, gir_root):
-        ns_node = gir_root.find('./{%s}namespace' % self.__nsmap['core'])
-        id_prefixes = ns_node.attrib['{%s}identifier-prefixes' % self.__nsmap['c']]
-        sym_prefixes = ns_node.attrib['{%s}symbol-prefixes' % self.__nsmap['c']]
+        smart_filters.add(('%s_IS_%s' % (sym_prefixes, sym_prefix)).upper())
+        smart_filters.add(('%s_TYPE_%s' % (sym_prefixes, sym_prefix)).upper())
+        smart_filters.add(('%s_%s' % (sym_prefixes, sym_prefix)).upper())
+        smart_filters.add(('%s_%s_CLASS' % (sym_prefixes, sym_prefix)).upper())
+        smart_filters.add(('%s_IS_%s_CLASS' % (sym_prefixes, sym_prefix)).upper())
+        smart_filters.add(('%s_%s_GET_CLASS' % (sym_prefixes, sym_prefix)).upper())
+        smart_filters.add(('%s_%s_GET_IFACE' % (sym_prefixes, sym_prefix)).upper())
+
+    def __cache_nodes(self, gir_file, overwrite=True):
+        index = load_gir_index(gir_file)
+        if index is None:
+            index = self.__index_gir(gir_file)
+            save_gir_index(index)
+
+        for name, node_path in index.nodes.items():
+            if self.__node_cache.add(name, gir_file, node_path, overwrite):
+                self.__cache_translations(name, index.translations[name])
+        for gi_name, (node_path, klass_name, parent_name) in \
+                index.classes.items():
+            if not overwrite and gi_name in self.__class_info:
+                continue
+            self.__class_nodes.add(gi_name, gir_file, node_path)
+            self.__class_info[gi_name] = (klass_name, parent_name)
+        self.__get_type_functions |= index.get_type_functions
+        self.__smart_filters |= index.smart_filters
 
-        id_key = '{%s}identifier' % self.__nsmap['c']
-        for node in gir_root.xpath(
-                './/*[@c:identifier]',
-                namespaces=self.__nsmap):
-            self.__node_cache[node.attrib[id_key]] = node
+        return index
 
-        id_type = '{%s}type' % self.__nsmap['c']
-        class_tag = '{%s}class' % self.__nsmap['core']
-        interface_tag = '{%s}interface' % self.__nsmap['core']
-        for node in gir_root.xpath(
-                './/*[not(self::core:type) and not (self::core:array)][@c:type]',
-                namespaces=self.__nsmap):
-            name = node.attrib[id_type]
-            self.__node_cache[name] = node
-            if node.tag in [class_tag, interface_tag]:
-                gi_name = '.'.join(self.__get_gi_name_components(node))
-                self.__class_nodes[gi_name] = node
-                get_type_function = node.attrib.get('{%s}get-type' %
-                    self.__nsmap['glib'])
-                self.__get_type_functions.add(get_type_function)
-                self.__node_cache['%s::%s' % (name, name)] = node
-                self.__generate_smart_filters(id_prefixes, sym_prefixes, node)
-
-        for node in gir_root.xpath(
-                './/core:property',
-                namespaces=self.__nsmap):
-            name = '%s:%s' % (self.__get_klass_name(node.getparent()),
-                              node.attrib['name'])
-            self.__node_cache[name] = node
-
-        for node in gir_root.xpath(
-                './/glib:signal',
-                namespaces=self.__nsmap):
-            name = '%s::%s' % (self.__get_klass_name(node.getparent()),
-                               node.attrib['name'])
-            self.__node_cache[name] = node
-
-        for node in gir_root.xpath(
-                './/core:virtual-method',
-                namespaces=self.__nsmap):
-            name = '%s:::%s' % (self.__get_klass_name(node.getparent()),
-                                node.attrib['name'])
-            self.__node_cache[name] = node
-
-        for inc in gir_root.findall('./core:include',
-                namespaces = self.__nsmap):
-            inc_name = inc.attrib["name"]
-            inc_version = inc.attrib["version"]
+    def __cache_translations(self, name, translations):
+        introspectable, python_name, javascript_name = translations
+        if introspectable:
+            self.__non_introspectable.discard(name)
+        else:
+            self.__non_introspectable.add(name)
+
+        if python_name is not None:
+            self.__python_names[name] = python_name
+            self.__javascript_names[name] = javascript_name
+            self.__c_names[name] = name
+
+    def __register_includes(self, includes):
+        for inc_name, inc_version in includes:
             gir_file = self.__find_gir_file('%s-%s.gir' % (inc_name,
                 inc_version))
             if not gir_file:
@@ -339,13 +408,193 @@ class GIExtension(Extension):
                 continue
 
             self.__parsed_girs.add(gir_file)
-            inc_gir_root = etree.parse(gir_file).getroot()
-            self.__cache_nodes(inc_gir_root)
+            header = read_gir_header(gir_file)
+            if header.namespace is not None:
+                self.__lazy_namespaces.add(header)
+            self.__register_includes(header.includes)
+
+    def __load_namespace(self, namespace):
+        gir_file = self.__lazy_namespaces.pop(namespace)
+        if gir_file is None:
+            return None
+
+        self.debug('Loading included namespace %s' % namespace)
+
+        # Names are resolved the same whatever the lookup order
+        index = self.__cache_nodes(gir_file, overwrite=False)
+        for gi_name in index.classes:
+            if gi_name not in self.__gir_hierarchies:
+                self.__gir_hierarchies[gi_name] = \
+                    self.__create_hierarchy(gi_name)
+        return index
+
+    def __load_namespaces_for_symbol(self, name):
+        loaded = False
+        for namespace in self.__lazy_namespaces.match(name):
+            index = self.__load_namespace(namespace)
+            if index is not None:
+                loaded = True
+                if name in index.nodes:
+                    break
+        return loaded
+
+    def __load_namespace_for_class(self, gi_name):
+        return self.__load_namespace(gi_name.split('.', 1)[0]) is not None
+
+    def __get_class_info(self, gi_name):
+        if gi_name not in self.__class_info:
+            self.__load_namespace_for_class(gi_name)
+        return self.__class_info[gi_name]
+
+    def __index_gir(self, gir_file):
+        core_ns = self.__nsmap['core']
+        c_ns = self.__nsmap['c']
+        id_key = '{%s}identifier' % c_ns
+        id_type = '{%s}type' % c_ns
+        untyped_tags = ('{%s}type' % core_ns, '{%s}array' % core_ns)
+        class_tags = ('{%s}class' % core_ns, '{%s}interface' % core_ns)
+        namespace_tag = '{%s}namespace' % core_ns
+        include_tag = '{%s}include' % core_ns
+        property_tag = '{%s}property' % core_ns
+        signal_tag = '{%s}signal' % self.__nsmap['glib']
+        vmethod_tag = '{%s}virtual-method' % core_ns
+        get_type_key = '{%s}get-type' % self.__nsmap['glib']
+
+        index = GirIndex(gir_file)
+        id_prefixes = sym_prefixes = None
+
+        # Node path -> translations, see GirIndex
+        translations = {}
+
+        # Kept apart to preserve which node wins when names clash
+        identifiers = {}
+        types = {}
+        properties = {}
+        signals = {}
+        vmethods = {}
+
+        # See LazyNodes for what paths are
+        path = []
+        n_children = []
+        skipping = 0
+
+        with self.c_extension.tracer.span('gir-index', 'gi',
+                                          filename=gir_file):
+            for event, node in etree.iterparse(gir_file,
+                                               events=('start', 'end'),
+                                               remove_comments=True,
+                                               remove_pis=True):
+                if event == 'end':
+                    if skipping:
+                        skipping -= 1
+                    else:
+                        n_children.pop()
+                        if n_children:
+                            path.pop()
+
+                    # Only the ancestors of the next nodes are needed
+                    node.clear()
+                    while node.getprevious() is not None:
+                        del node.getparent()[0]
+                    continue
+
+                if skipping or node.tag in SKIPPED_TAGS:
+                    skipping += 1
+                    continue
+
+                if n_children:
+                    path.append(n_children[-1])
+                    n_children[-1] += 1
+                n_children.append(0)
+
+                attrib = node.attrib
+                tag = node.tag
+                node_path = tuple(path)
+
+                if len(path) == 1:
+                    if tag == include_tag:
+                        index.includes.append((attrib["name"],
+                                               attrib["version"]))
+                    elif tag == namespace_tag and id_prefixes is None:
+                        id_prefixes = attrib['{%s}identifier-prefixes' % c_ns]
+                        sym_prefixes = attrib['{%s}symbol-prefixes' % c_ns]
+
+                named = id_key in attrib
+                if named:
+                    identifiers[attrib[id_key]] = node_path
+
+                if id_type in attrib and tag not in untyped_tags:
+                    named = True
+                    name = attrib[id_type]
+                    types[name] = node_path
+                    if tag in class_tags:
+                        gi_name = '.'.join(
+                            self.__get_gi_name_components(node))
+                        parent_name = attrib.get('parent')
+                        if parent_name and not '.' in parent_name:
+                            namespace = node.getparent().attrib['name']
+                            parent_name = '%s.%s' % (namespace, parent_name)
+                        index.classes[gi_name] = (node_path,
+                                                  self.__get_klass_name(node),
+                                                  parent_name)
+                        index.get_type_functions.add(attrib.get(get_type_key))
+                        types['%s::%s' % (name, name)] = node_path
+                        self.__generate_smart_filters(id_prefixes,
+                                                      sym_prefixes, node,
+                                                      index.smart_filters)
+
+                if tag == property_tag:
+                    name = '%s:%s' % (self.__get_klass_name(node.getparent()),
+                                      attrib['name'])
+                    properties[name] = node_path
+                elif tag == signal_tag:
+                    name = '%s::%s' % (
+                        self.__get_klass_name(node.getparent()),
+                        attrib['name'])
+                    signals[name] = node_path
+                elif tag == vmethod_tag:
+                    name = '%s:::%s' % (
+                        self.__get_klass_name(node.getparent()),
+                        attrib['name'])
+                    vmethods[name] = node_path
+                elif not named:
+                    continue
+
+                translations[node_path] = self.__make_translations(node)
+
+        index.nodes = identifiers
+        for names in (types, properties, signals, vmethods):
+            index.nodes.update(names)
+        index.translations = {name: translations[node_path]
+                              for name, node_path in index.nodes.items()}
+
+        return index
 
     def __create_hierarchies(self):
-        for gi_name, klass in self.__class_nodes.items():
-            hierarchy = self.__create_hierarchy (klass)
-            self.__gir_hierarchies[gi_name] = hierarchy
+        for gi_name in list(self.__class_info):
+            if gi_name not in self.__gir_hierarchies:
+                hierarchy = self.__create_hierarchy (gi_name)
+                self.__gir_hierarchies[gi_name] = hierarchy
+
+    def __index_source_positions(self, gir_root):
+        headers = defaultdict(list)
+        for source in self._get_all_sources():
+            headers[os.path.basename(source)].append(source)
+
+        core_ns = self.__nsmap['core']
+        tags = set('{%s}%s' % (core_ns, tag) for tag in GIR_SYMBOL_TAGS)
+
+        for position in gir_root.iter('{%s}source-position' % core_ns):
+            node = position.getparent()
+            if node.tag not in tags:
+                continue
+
+            relpath = position.attrib['filename']
+            for header in headers.get(os.path.basename(relpath), []):
+                if header.endswith(os.sep + relpath) or header == relpath:
+                    lineno = int(position.attrib.get('line', 0))
+                    self.__gir_header_nodes[header].append((node, lineno))
+                    break
 
     def __get_klass_name(self, klass):
         klass_name = klass.attrib.get('{%s}type' % self.__nsmap['c'])
@@ -353,32 +602,27 @@ class GIExtension(Extension):
             klass_name = klass.attrib.get('{%s}type-name' % self.__nsmap['glib'])
         return klass_name
 
-    def __create_hierarchy (self, klass):
-        klaass = klass
+    def __create_hierarchy (self, gi_name):
         hierarchy = []
+        klass_name, parent_name = self.__class_info[gi_name]
         while (True):
-            parent_name = klass.attrib.get('parent')
             if not parent_name:
                 break
 
-            if not '.' in parent_name:
-                namespace = klass.getparent().attrib['name']
-                parent_name = '%s.%s' % (namespace, parent_name)
-            parent_class = self.__class_nodes[parent_name]
+            parent_klass_name, grand_parent_name = \
+                self.__get_class_info(parent_name)
             children = self.__gir_children_map[parent_name]
-            klass_name = self.__get_klass_name (klass)
 
             if not klass_name in children:
                 link = Link(None, klass_name, klass_name)
                 sym = QualifiedSymbol(type_tokens=[link])
                 children[klass_name] = sym
 
-            klass_name = self.__get_klass_name(parent_class)
-            link = Link(None, klass_name, klass_name)
+            link = Link(None, parent_klass_name, parent_klass_name)
             sym = QualifiedSymbol(type_tokens=[link])
             hierarchy.append (sym)
 
-            klass = parent_class
+            klass_name, parent_name = parent_klass_name, grand_parent_name
 
         hierarchy.reverse()
         return hierarchy
@@ -389,83 +633,15 @@ class GIExtension(Extension):
             print("no gtk doc to gather links from in %s" % gtkdoc_dir)
             return
 
-        for node in os.listdir(gtkdoc_dir):
-            dir_ = os.path.join(gtkdoc_dir, node)
-            if os.path.isdir(dir_):
-                if not self.__parse_devhelp_index(dir_):
-                    try:
-                        self.__parse_sgml_index(dir_)
-                    except IOError:
-                        pass
-
-    def __parse_devhelp_index(self, dir_):
-        path = os.path.join(dir_, os.path.basename(dir_) + '.devhelp2')
-        if not os.path.exists(path):
-            return False
-
-        dh_root = etree.parse(path).getroot()
-        online = dh_root.attrib.get('online')
-        name = dh_root.attrib.get('name')
-        if not online:
-            if not name:
-                return False
-            online = 'https://developer.gnome.org/%s/unstable/' % name
-
-        keywords = dh_root.findall('.//{http://www.devhelp.net/book}keyword')
-        for kw in keywords:
-            name = kw.attrib["name"]
-            type_ = kw.attrib['type']
-            link = kw.attrib['link']
-
-            if type_ in ['macro', 'function']:
-                name = name.rstrip(u' ()')
-            elif type_ in ['struct', 'enum']:
-                split = name.split(' ', 1)
-                if len(split) == 2:
-                    name = split[1]
-                else:
-                    name = split[0]
-            elif type_ in ['signal', 'property']:
-                anchor = link.split('#', 1)[1]
-                split = anchor.split('-', 1)
-                if type_ == 'signal':
-                    name = '%s::%s' % (split[0], split[1].lstrip('-'))
-                else:
-                    name = '%s:%s' % (split[0], split[1].lstrip('-'))
-
-            self.__gtkdoc_hrefs[name] = online + link
-
-        self.debug('Gathered %d links from devhelp index %s' % (len(keywords), path))
+        GIExtension.__gtkdoc_links = GtkDocLinks(gtkdoc_dir)
+        GIExtension.__gtkdoc_links.load()
 
-        return True
-
-    def __parse_sgml_index(self, dir_):
-        remote_prefix = ""
-        n_links = 0
-        path = os.path.join(dir_, "index.sgml")
-        with open(path, 'r') as f:
-            for l in f:
-                if l.startswith("<ONLINE"):
-                    remote_prefix = l.split('"')[1]
-                elif not remote_prefix:
-                    break
-                elif l.startswith("<ANCHOR"):
-                    split_line = l.split('"')
-                    filename = split_line[3].split('/', 1)[-1]
-                    title = split_line[1].replace('-', '_')
-
-                    if title.endswith (":CAPS"):
-                        title = title [:-5]
-                    if remote_prefix:
-                        href = '%s/%s' % (remote_prefix, filename)
-                    else:
-                        href = filename
-
-                    self.__gtkdoc_hrefs[title] = href
-                    n_links += 1
-
-        if n_links > 0:
-            self.debug('Gathered %d links from sgml index %s' % (n_links, path))
+    @classmethod
+    def __get_online_href(cls, name):
+        href = cls.__gtkdoc_links.get(name)
+        if href is None and cls.__symbol_packs:
+            href = cls.__symbol_packs.get_url(name)
+        return href
 
     def __add_annotations (self, formatter, symbol):
         if self.language == 'c':
@@ -481,17 +657,11 @@ class GIExtension(Extension):
         if name in self._fundamentals:
             return True
 
-        node = self.__node_cache.get(name)
-
-        if node is None:
+        # Looking the name up loads the namespace defining it
+        if name not in self.__node_cache:
             return False
 
-        if not name in self.__c_names:
-            self.__add_translations(name, node)
-
-        if node.attrib.get('introspectable') == '0':
-            return False
-        return True
+        return name not in self.__non_introspectable
 
     def __formatting_symbol(self, formatter, symbol):
         symbol.language = self.language
@@ -516,7 +686,30 @@ class GIExtension(Extension):
         p = pathlib.Path(ref)
         return str(pathlib.Path(p.parts[0], language, *p.parts[1:]))
 
+    # The link resolver hands out a single link per id, and its ref and
+    # title are settled before formatting starts, so the tables are keyed
+    # on the id alone and emptied once the project is formatted.
+    def __clear_link_tables(self, project):
+        self.__link_refs.clear()
+        self.__link_titles.clear()
+
     def __translate_link_ref(self, link):
+        self.__count_link_lookup()
+
+        # Pages only stay put while formatting
+        if self.language is None:
+            return self.__do_translate_link_ref(link)
+
+        refs = self.__link_refs[self.language]
+        try:
+            return refs[link.id_]
+        except KeyError:
+            pass
+
+        ref = refs[link.id_] = self.__do_translate_link_ref(link)
+        return ref
+
+    def __do_translate_link_ref(self, link):
         page = self.project.tree.get_page_for_symbol(link.id_)
 
         if self.language is None:
@@ -534,18 +727,33 @@ class GIExtension(Extension):
             return self.insert_language(link.ref, self.language)
 
         if link.ref == None:
-            return self.__gtkdoc_hrefs.get(link.id_)
+            return self.__get_online_href(link.id_)
 
         return None
 
     @classmethod
     def search_online_links(cls, resolver, name):
-        href = cls.__gtkdoc_hrefs.get(name)
+        href = cls.__get_online_href(name)
         if href:
             return Link(href, name, name)
         return None
 
     def __translate_link_title(self, link):
+        self.__count_link_lookup()
+
+        if self.language is None:
+            return self.__do_translate_link_title(link)
+
+        titles = self.__link_titles[self.language]
+        try:
+            return titles[link.id_]
+        except KeyError:
+            pass
+
+        title = titles[link.id_] = self.__do_translate_link_title(link)
+        return title
+
+    def __do_translate_link_title(self, link):
         fund = self._fundamentals.get(link.id_)
         if fund:
             return fund._title
@@ -557,11 +765,22 @@ class GIExtension(Extension):
         if translated:
             return translated
 
-        if self.language == 'c' and link.id_ in self.__gtkdoc_hrefs:
+        if self.language == 'c' and self.__get_online_href(link.id_):
             return link.id_
 
         return None
 
+    @property
+    def n_link_lookups(self):
+        """
+        How many link refs and titles were translated so far, lets
+        the formatter tell which fragments depend on the language.
+        """
+        return self.__n_link_lookups
+
+    def __count_link_lookup(self):
+        self.__n_link_lookups += 1
+
     def setup_language (self, language):
         self.language = language
 
@@ -917,6 +1136,21 @@ class GIExtension(Extension):
             parent = parent.getparent()
         return components
 
+    def __make_translations(self, node):
+        id_key = '{%s}identifier' % self.__nsmap['c']
+        id_type = '{%s}type' % self.__nsmap['c']
+
+        introspectable = node.attrib.get('introspectable') != '0'
+        if id_key not in node.attrib and id_type not in node.attrib:
+            return introspectable, None, None
+
+        components = self.__get_gi_name_components(node)
+        gi_name = '.'.join(components)
+        if id_key in node.attrib:
+            components[-1] = 'prototype.%s' % components[-1]
+            return introspectable, gi_name, '.'.join(components)
+        return introspectable, gi_name, gi_name
+
     def __add_translations(self, unique_name, node):
         id_key = '{%s}identifier' % self.__nsmap['c']
         id_type = '{%s}type' % self.__nsmap['c']
@@ -979,14 +1213,12 @@ class GIExtension(Extension):
         klass_name = node.attrib.get('{%s}type-name' %
                 'http://www.gtk.org/introspection/glib/1.0')
 
-        for sig_node in node.findall('./glib:signal',
-                                     namespaces = self.__nsmap):
+        for sig_node in node.findall('{%s}signal' % self.__nsmap['glib']):
             symbols.append(self.__create_signal_symbol(
                 sig_node, klass_name))
             self.debug("Added signal symbol %s" % sig_node.attrib['name'])
 
-        for prop_node in node.findall('./core:property',
-                                     namespaces = self.__nsmap):
+        for prop_node in node.findall('{%s}property' % self.__nsmap['core']):
             symbols.append(self.__create_property_symbol(
                 prop_node, klass_name))
             self.debug("Added property symbol %s" % prop_node.attrib['name'])
@@ -999,8 +1231,7 @@ class GIExtension(Extension):
             class_struct_name = '%s%s' % (components[0], class_struct_name)
             parent_comment = self.app.database.get_comment(class_struct_name)
 
-        vmethods = node.findall('./core:virtual-method',
-                                namespaces = self.__nsmap)
+        vmethods = node.findall('{%s}virtual-method' % self.__nsmap['core'])
 
         for vfunc_node in vmethods:
             sym = self.__create_vfunc_symbol (vfunc_node, klass_name)
@@ -1018,6 +1249,168 @@ class GIExtension(Extension):
 
         return symbols
 
+    def __c_type_tokens_from_gi_node (self, gi_node):
+        for child in gi_node:
+            tag = etree.QName(child.tag).localname
+            if tag == 'varargs':
+                return ['...']
+            if tag in ('type', 'array'):
+                ctype = child.attrib.get('{%s}type' % self.__nsmap['c'])
+                if ctype:
+                    return self.__type_tokens_from_cdecl (ctype)
+                break
+
+        type_tokens, gi_name = self.__type_tokens_and_gi_name_from_gi_node(
+            gi_node)
+        return type_tokens or []
+
+    def __c_parameters_from_gi_node (self, node):
+        parameters = []
+        gi_parameters = node.find('{%s}parameters' % self.__nsmap['core'])
+        if gi_parameters is not None:
+            for gi_param in gi_parameters:
+                if etree.QName(gi_param.tag).localname not in (
+                        'instance-parameter', 'parameter'):
+                    continue
+                type_tokens = self.__c_type_tokens_from_gi_node (gi_param)
+                parameters.append (ParameterSymbol (
+                    argname=gi_param.attrib.get('name'),
+                    type_tokens=type_tokens))
+
+        if node.attrib.get('throws') == '1':
+            parameters.append (ParameterSymbol (argname='error',
+                type_tokens=self.__type_tokens_from_cdecl ('GError**')))
+
+        retval = node.find('{%s}return-value' % self.__nsmap['core'])
+        if retval is not None:
+            type_tokens = self.__c_type_tokens_from_gi_node (retval)
+        else:
+            type_tokens = []
+        return_value = [ReturnItemSymbol (type_tokens=type_tokens)]
+
+        return parameters, return_value
+
+    def __create_function_from_gir (self, node, filename, lineno):
+        type_ = FunctionSymbol
+        name_key = '{%s}identifier' % self.__nsmap['c']
+        if etree.QName(node.tag).localname == 'callback':
+            type_ = CallbackSymbol
+            name_key = '{%s}type' % self.__nsmap['c']
+
+        name = node.attrib.get(name_key)
+        if not name:
+            return None
+
+        parameters, return_value = self.__c_parameters_from_gi_node (node)
+        return self.get_or_create_symbol(type_, parameters=parameters,
+                return_value=return_value, display_name=name,
+                filename=filename, lineno=lineno)
+
+    def __create_struct_from_gir (self, node, name, filename, lineno):
+        members = []
+        lines = []
+        for field in node.findall('{%s}field' % self.__nsmap['core']):
+            if field.attrib.get('private') == '1':
+                continue
+
+            field_name = field.attrib['name']
+            callback = field.find('{%s}callback' % self.__nsmap['core'])
+            if callback is not None:
+                parameters, return_value = \
+                    self.__c_parameters_from_gi_node (callback)
+                type_tokens = return_value[0].input_tokens
+                lines.append ('  %s (*%s) (%s);' % (
+                    self.__cdecl_from_tokens (type_tokens), field_name,
+                    ', '.join('%s %s' % (self.__cdecl_from_tokens (
+                        param.input_tokens), param.argname)
+                        for param in parameters)))
+            else:
+                type_tokens = self.__c_type_tokens_from_gi_node (field)
+                lines.append ('  %s %s;' % (
+                    self.__cdecl_from_tokens (type_tokens), field_name))
+
+            member_name = '%s.%s' % (name, field_name)
+            members.append (self.get_or_create_symbol(FieldSymbol,
+                is_function_pointer=callback is not None,
+                member_name=field_name,
+                qtype=QualifiedSymbol(type_tokens=type_tokens),
+                filename=filename, display_name=member_name,
+                unique_name=member_name))
+
+        raw_text = None
+        if members:
+            raw_text = 'typedef struct {\n%s\n} %s;' % ('\n'.join(lines), name)
+
+        return self.get_or_create_symbol(StructSymbol, raw_text=raw_text,
+                members=members, anonymous=False, display_name=name,
+                filename=filename, lineno=lineno)
+
+    def __create_enum_from_gir (self, node, name, filename, lineno):
+        members = []
+        lines = []
+        for gi_member in node.findall('{%s}member' % self.__nsmap['core']):
+            member_name = gi_member.attrib.get('{%s}identifier' %
+                                               self.__nsmap['c'])
+            if not member_name:
+                continue
+            value = gi_member.attrib.get('value', '0')
+            member = self.get_or_create_symbol(Symbol,
+                    display_name=member_name, filename=filename,
+                    lineno=lineno)
+            member.enum_value = int(value)
+            members.append (member)
+            lines.append ('  %s = %s' % (member_name, value))
+
+        raw_text = 'typedef enum {\n%s\n} %s;' % (',\n'.join(lines), name)
+
+        return self.get_or_create_symbol(EnumSymbol, members=members,
+                anonymous=False, raw_text=raw_text, display_name=name,
+                filename=filename, lineno=lineno)
+
+    def __create_alias_from_gir (self, node, name, filename, lineno):
+        type_tokens = self.__c_type_tokens_from_gi_node (node)
+        return self.get_or_create_symbol(AliasSymbol,
+                aliased_type=QualifiedSymbol(type_tokens=type_tokens),
+                display_name=name, filename=filename, lineno=lineno)
+
+    def __cdecl_from_tokens (self, type_tokens):
+        res = ''
+        for tok in type_tokens:
+            if isinstance(tok, Link):
+                res += tok._title or ''
+            else:
+                res += tok
+        return res.strip()
+
+    def __create_symbol_from_gir (self, node, filename, lineno):
+        tag = etree.QName(node.tag).localname
+
+        if tag in ('function', 'method', 'constructor', 'callback'):
+            return self.__create_function_from_gir (node, filename, lineno)
+
+        name = node.attrib.get('{%s}type' % self.__nsmap['c'])
+        if not name:
+            return None
+
+        if tag in ('record', 'class', 'interface', 'union'):
+            return self.__create_struct_from_gir (node, name, filename,
+                                                  lineno)
+        elif tag in ('enumeration', 'bitfield'):
+            return self.__create_enum_from_gir (node, name, filename, lineno)
+        elif tag == 'alias':
+            return self.__create_alias_from_gir (node, name, filename, lineno)
+
+        return None
+
+    def __create_symbols_from_gir (self, filenames):
+        n_symbols = 0
+        for filename in filenames:
+            for node, lineno in self.__gir_header_nodes.get(filename, []):
+                if self.__create_symbol_from_gir (node, filename, lineno):
+                    n_symbols += 1
+
+        self.info('Created %d symbols from introspection data' % n_symbols)
+
     def __update_symbol(self, symbol):
         node = self.__node_cache.get(symbol.unique_name)
         res = []
@@ -1037,7 +1430,10 @@ class GIExtension(Extension):
         if page.extension_name != self.extension_name:
             return []
 
-        return self.__update_symbol(symbol)
+        with self.c_extension.tracer.span('resolve', 'gi',
+                                          page=page.source_file,
+                                          symbol=symbol.unique_name):
+            return self.__update_symbol(symbol)
 
     def __rename_page_link (self, page_parser, original_name):
         return self.__translated_names.get(original_name)
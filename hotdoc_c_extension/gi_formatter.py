@@ -17,6 +17,7 @@
 # along with this library.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import functools
 from hotdoc.core.formatter import Formatter
 from hotdoc.core.symbols import *
 import lxml.etree
@@ -27,15 +28,30 @@ class GIFormatter(Formatter):
         module_path = os.path.dirname(__file__)
         searchpath = [os.path.join(module_path, "templates")]
         Formatter.__init__(self, gi_extension, searchpath)
-
-    def format_annotations (self, annotations):
+        # Language passes over a page share the fragments which do not
+        # depend on the language
+        self.__format_raw_code = functools.lru_cache(maxsize=1024)(
+            self.__format_raw_code)
+        # Annotations and flags are interned, a handful of combinations
+        # covers most symbols
+        self.__render_annotations = functools.lru_cache(maxsize=1024)(
+            self.__render_annotations)
+        self.__render_flags = functools.lru_cache(maxsize=256)(
+            self.__render_flags)
+
+    def __render_annotations (self, annotations):
         template = self.engine.get_template('gi_annotations.html')
         return template.render ({'annotations': annotations})
 
-    def _format_flags (self, flags):
+    def __render_flags (self, flags):
         template = self.engine.get_template('gi_flags.html')
-        out = template.render ({'flags': flags})
-        return out
+        return template.render ({'flags': flags})
+
+    def format_annotations (self, annotations):
+        return self.__render_annotations (tuple(annotations))
+
+    def _format_flags (self, flags):
+        return self.__render_flags (tuple(flags))
 
     def _format_type_tokens (self, type_tokens):
         if self.extension.language != 'c':
@@ -166,20 +182,35 @@ class GIFormatter(Formatter):
                                 'constant': constant})
         return (out, False)
 
+    def __format_raw_code(self, code):
+        return Formatter._format_raw_code(self, code)
+
+    def _format_raw_code(self, code):
+        return self.__format_raw_code(code)
+
     def _format_comment(self, comment, link_resolver):
-        ast = comment.extension_attrs['gi-extension']['ast']
+        attrs = comment.extension_attrs['gi-extension']
+        ast = attrs['ast']
 
         if not comment.description:
-            out = u''
-        elif ast:
-            out = self._docstring_formatter.ast_to_html(
-                ast, link_resolver)
-        else:
+            return u''
+
+        # Descriptions without links render the same in all languages
+        html = attrs.get('html')
+        if html is not None and ast is not None and html[0] is ast:
+            return html[1]
+
+        if not ast:
             ast = self._docstring_formatter.comment_to_ast(
                 comment, link_resolver)
-            out = self._docstring_formatter.ast_to_html(
-                ast, link_resolver)
-            comment.extension_attrs['gi-extension']['ast'] = ast
+            attrs['ast'] = ast
+
+        n_link_lookups = self.extension.n_link_lookups
+        out = self._docstring_formatter.ast_to_html(ast, link_resolver)
+        if self.extension.n_link_lookups == n_link_lookups:
+            attrs['html'] = (ast, out)
+        else:
+            attrs.pop('html', None)
 
         return out
 
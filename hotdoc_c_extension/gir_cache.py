@@ -0,0 +1,520 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Persistent indexes of gir files, so that they only get parsed when
+one of their nodes is actually needed.
+
+Indexes are shared by all projects, in the user cache directory, and
+are validated against the modification time and size of their gir.
+
+Girs are located with a `GirLocator`, which lists the gir directories
+of the data directories once, and is persisted too.
+
+Included girs are only loaded when one of the names they define is
+looked up, see `LazyNamespaces`.
+
+Parsed girs are kept as trees of `GirNode`, which only hold the
+elements and attributes `GIExtension` reads.
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+from collections import defaultdict
+
+import appdirs
+from lxml import etree
+
+
+CORE_NS = 'http://www.gtk.org/introspection/core/1.0'
+C_NS = 'http://www.gtk.org/introspection/c/1.0'
+GLIB_NS = 'http://www.gtk.org/introspection/glib/1.0'
+
+# Documentation makes up most of a gir, and is not needed to document
+# it in other languages.
+SKIPPED_TAGS = frozenset('{%s}%s' % (CORE_NS, tag) for tag in (
+    'doc', 'doc-deprecated', 'doc-version', 'doc-stability', 'docsection'))
+
+# The only attributes `GIExtension` reads from parsed girs, see
+# `parse_gir_nodes`
+KEPT_ATTRIBUTES = frozenset(
+    ['name', 'version', 'parent', 'direction', 'disguised', 'when',
+     'no-hooks', 'writable', 'construct', 'construct-only', 'introspectable',
+     'throws', 'private', 'value', 'filename', 'line'] +
+    ['{%s}%s' % (C_NS, key) for key in (
+        'identifier', 'type', 'symbol-prefix', 'identifier-prefixes',
+        'symbol-prefixes')] +
+    ['{%s}%s' % (GLIB_NS, key) for key in (
+        'type-name', 'type-struct', 'is-gtype-struct-for', 'get-type')])
+
+
+class GirIndex(object):
+    """
+    What `GIExtension` gathers from a gir file, nodes being
+    referred to by their path in the gir, see `LazyNodes`.
+
+    - nodes: maps symbol names to node paths
+    - classes: maps the gi names of classes and interfaces to their
+      node path, their C type name and the gi name of their parent
+    - get_type_functions, smart_filters: sets of symbol names
+    - includes: (name, version) of the included girs
+    - translations: maps symbol names to whether their node is
+      introspectable, and their python and javascript names, None
+      if they have none
+    """
+    __slots__ = ('path', 'mtime', 'size', 'nodes', 'classes',
+                 'get_type_functions', 'smart_filters', 'includes',
+                 'translations')
+
+    # Bump when the contents of the index change
+    VERSION = 4
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.path = path
+        self.mtime = stat.st_mtime
+        self.size = stat.st_size
+        self.nodes = {}
+        self.classes = {}
+        self.get_type_functions = set()
+        self.smart_filters = set()
+        self.includes = []
+        self.translations = {}
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+
+def get_gir_cache_dir():
+    return os.path.join(appdirs.user_cache_dir("hotdoc", "hotdoc"), 'gir')
+
+
+def _get_index_path(gir_path):
+    digest = hashlib.sha1(os.path.abspath(gir_path).encode('utf-8'))
+    return os.path.join(get_gir_cache_dir(), '%s-%s.p' % (
+        os.path.basename(gir_path), digest.hexdigest()))
+
+
+def load_gir_index(gir_path):
+    """
+    Returns the index of @gir_path saved earlier, or None if there
+    is none or it is out of date.
+    """
+    try:
+        with open(_get_index_path(gir_path), 'rb') as _:
+            version, index = pickle.load(_)
+        stat = os.stat(gir_path)
+    except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+
+    if (version != GirIndex.VERSION or index.mtime != stat.st_mtime or
+            index.size != stat.st_size):
+        return None
+
+    return index
+
+
+def _save(path, data):
+    cache_dir = get_gir_cache_dir()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Other projects may be reading it concurrently
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, 'wb') as _:
+            pickle.dump(data, _, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except (IOError, OSError):
+        pass
+
+
+def save_gir_index(index):
+    _save(_get_index_path(index.path), (GirIndex.VERSION, index))
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class GirLocator(object):
+    """
+    Maps the names of the girs installed in the gir-1.0 directories
+    of @data_dirs to their path, the first directory listing a gir
+    wins.
+
+    The map is built by listing each directory once, and saved in the
+    user cache directory. It is reused as long as the modification
+    times of the directories, which change when girs are added or
+    removed, do not.
+    """
+
+    # Bump when the contents of the saved map change
+    VERSION = 1
+
+    def __init__(self, data_dirs):
+        self.__dirs = [os.path.join(dir_, 'gir-1.0') for dir_ in data_dirs]
+        self.__girs = None
+
+    def __get_path(self):
+        digest = hashlib.sha1('\0'.join(self.__dirs).encode('utf-8'))
+        return os.path.join(get_gir_cache_dir(),
+                            'gir-dirs-%s.p' % digest.hexdigest())
+
+    def __load(self, mtimes):
+        try:
+            with open(self.__get_path(), 'rb') as _:
+                version, saved_mtimes, girs = pickle.load(_)
+        except (IOError, OSError, EOFError, ValueError,
+                pickle.UnpicklingError):
+            return None
+
+        if version != GirLocator.VERSION or saved_mtimes != mtimes:
+            return None
+
+        return girs
+
+    def __scan(self):
+        girs = {}
+        for dir_ in self.__dirs:
+            try:
+                entries = list(os.scandir(dir_))
+            except OSError:
+                continue
+
+            for entry in entries:
+                if entry.name.endswith('.gir') and entry.name not in girs:
+                    girs[entry.name] = entry.path
+        return girs
+
+    def find(self, gir_name):
+        """
+        Returns the path of the gir named @gir_name, or None if it is
+        not installed.
+        """
+        if self.__girs is None:
+            mtimes = [_get_mtime(dir_) for dir_ in self.__dirs]
+            self.__girs = self.__load(mtimes)
+            if self.__girs is None:
+                self.__girs = self.__scan()
+                _save(self.__get_path(),
+                      (GirLocator.VERSION, mtimes, self.__girs))
+
+        return self.__girs.get(gir_name)
+
+
+class GirHeader(object):
+    """
+    What `LazyNamespaces` needs to know about a gir to decide whether
+    to load it.
+
+    - includes: (name, version) of the included girs
+    - namespace: the name of its namespace
+    - names: the C names of everything the namespace defines, types,
+      functions, methods, constants and enumeration members
+    """
+    __slots__ = ('path', 'mtime', 'size', 'includes', 'namespace', 'names')
+
+    # Bump when the contents of the header change
+    VERSION = 2
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.path = path
+        self.mtime = stat.st_mtime
+        self.size = stat.st_size
+        self.includes = []
+        self.namespace = None
+        self.names = set()
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+
+def _get_header_path(gir_path):
+    return _get_index_path(gir_path)[:-len('.p')] + '-header.p'
+
+
+def _parse_gir_header(gir_path):
+    header = GirHeader(gir_path)
+    include_tag = '{%s}include' % CORE_NS
+    namespace_tag = '{%s}namespace' % CORE_NS
+    # These refer to types defined elsewhere
+    reference_tags = ('{%s}type' % CORE_NS, '{%s}array' % CORE_NS)
+    name_keys = ('{%s}type' % C_NS, '{%s}identifier' % C_NS,
+                 '{%s}type-name' % GLIB_NS)
+    depth = 0
+    for event, node in etree.iterparse(gir_path, events=('start', 'end'),
+                                       remove_comments=True,
+                                       remove_pis=True):
+        if event == 'end':
+            depth -= 1
+            # Only the ancestors of the next nodes are needed
+            node.clear()
+            while node.getprevious() is not None:
+                del node.getparent()[0]
+            continue
+
+        depth += 1
+        attrib = node.attrib
+        if depth == 2:
+            if node.tag == include_tag:
+                header.includes.append((attrib['name'], attrib['version']))
+            elif node.tag == namespace_tag and header.namespace is None:
+                header.namespace = attrib['name']
+        elif depth > 2 and node.tag not in reference_tags:
+            for key in name_keys:
+                name = attrib.get(key)
+                if name:
+                    header.names.add(sys.intern(name))
+
+    return header
+
+
+def read_gir_header(gir_path):
+    """
+    Returns the `GirHeader` of @gir_path. Reading it means parsing the
+    whole gir, so headers are saved in the gir cache directory too.
+    """
+    try:
+        with open(_get_header_path(gir_path), 'rb') as _:
+            version, header = pickle.load(_)
+        stat = os.stat(gir_path)
+    except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+        version = header = None
+
+    if (header is None or version != GirHeader.VERSION or
+            header.mtime != stat.st_mtime or header.size != stat.st_size):
+        header = _parse_gir_header(gir_path)
+        _save(_get_header_path(gir_path), (GirHeader.VERSION, header))
+
+    return header
+
+
+class LazyNamespaces(object):
+    """
+    Girs whose namespace was not loaded yet, indexed by the C names
+    they define.
+
+    Names are never matched on their prefix alone: most GNOME libraries
+    share the 'G' and 'g_' prefixes, and a namespace that does not
+    define a name would be loaded for nothing.
+    """
+    def __init__(self):
+        self.__girs = {}
+        self.__names = defaultdict(set)
+
+    def add(self, header):
+        """
+        Registers the namespace of @header, a `GirHeader`.
+        """
+        namespace = header.namespace
+        self.__girs[namespace] = header.path
+        for name in header.names:
+            self.__names[name].add(namespace)
+
+    def pop(self, namespace):
+        """
+        Returns the gir of @namespace if it was not loaded yet, and
+        forgets about it.
+        """
+        return self.__girs.pop(namespace, None)
+
+    def match(self, name):
+        """
+        Returns the namespaces not loaded yet that define the C name
+        @name, or the type it is a member of, such as 'GObject' for
+        'GObject::notify'.
+        """
+        if not self.__girs:
+            return []
+
+        return [namespace for namespace in sorted(self.__names.get(
+                    name.split(':', 1)[0].split('.', 1)[0], ()))
+                if namespace in self.__girs]
+
+
+class GirNode(object):
+    """
+    A compact, read-only stand-in for the lxml element of a gir node,
+    supporting the subset of the lxml API `GIExtension` uses.
+    Children are only looked up by qualified tag names.
+    """
+    __slots__ = ('tag', 'attrib', 'children', 'parent')
+
+    def __init__(self, tag, attrib, parent):
+        self.tag = tag
+        self.attrib = attrib
+        self.children = []
+        self.parent = parent
+
+    def getparent(self):
+        return self.parent
+
+    def get(self, key, default=None):
+        return self.attrib.get(key, default)
+
+    def __iter__(self):
+        return iter(self.children)
+
+    def __len__(self):
+        return len(self.children)
+
+    def __getitem__(self, i):
+        return self.children[i]
+
+    def find(self, tag):
+        for child in self.children:
+            if child.tag == tag:
+                return child
+        return None
+
+    def findall(self, tag):
+        return [child for child in self.children if child.tag == tag]
+
+    def iter(self, tag):
+        if self.tag == tag:
+            yield self
+        for child in self.children:
+            for node in child.iter(tag):
+                yield node
+
+    def __repr__(self):
+        return '<GirNode %s %s>' % (self.tag, self.attrib.get('name'))
+
+
+def parse_gir_nodes(gir_path):
+    """
+    Returns the root `GirNode` of @gir_path, the gir is parsed in a
+    single pass and never fully held in memory. Only the attributes in
+    `KEPT_ATTRIBUTES` are kept.
+    """
+    root = None
+    stack = []
+    skipping = 0
+    for event, elem in etree.iterparse(gir_path, events=('start', 'end'),
+                                       remove_comments=True,
+                                       remove_pis=True):
+        if event == 'start':
+            if skipping or elem.tag in SKIPPED_TAGS:
+                skipping += 1
+                continue
+
+            # Tags, attribute names and most values are shared by a
+            # lot of nodes
+            attrib = {sys.intern(key): sys.intern(value)
+                      for key, value in elem.attrib.items()
+                      if key in KEPT_ATTRIBUTES}
+            parent = stack[-1] if stack else None
+            node = GirNode(sys.intern(elem.tag), attrib, parent)
+            if parent is None:
+                root = node
+            else:
+                parent.children.append(node)
+            stack.append(node)
+            continue
+
+        if skipping:
+            skipping -= 1
+        else:
+            node = stack.pop()
+            node.children = tuple(node.children)
+
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    return root
+
+
+def resolve_node_path(root, path):
+    node = root
+    for i in path:
+        node = node[i]
+    return node
+
+
+class LazyNodes(object):
+    """
+    Maps names to gir nodes, which are only looked up, and their gir
+    parsed with @load_root, when first accessed. Names that are not
+    known are passed to @load_missing, which returns whether it added
+    any node.
+
+    Nodes are referred to by their path, a tuple of the indices of the
+    elements leading to them from the root, comments and elements in
+    `SKIPPED_TAGS` not counting.
+    """
+    def __init__(self, load_root, load_missing=None):
+        self.__load_root = load_root
+        self.__load_missing = load_missing
+        self.__refs = {}
+        self.__nodes = {}
+
+    def add(self, name, gir_path, node_path, overwrite=True):
+        """
+        Returns whether @name was added.
+        """
+        if not overwrite and name in self.__refs:
+            return False
+        self.__refs[name] = (gir_path, node_path)
+        self.__nodes.pop(name, None)
+        return True
+
+    def __contains__(self, name):
+        if name in self.__refs:
+            return True
+
+        # Give lazily loaded namespaces a chance
+        return (self.__load_missing is not None and
+                self.__load_missing(name) and name in self.__refs)
+
+    def __iter__(self):
+        return iter(self.__refs)
+
+    def __len__(self):
+        return len(self.__refs)
+
+    def __getitem__(self, name):
+        try:
+            return self.__nodes[name]
+        except KeyError:
+            pass
+
+        gir_path, node_path = self.__refs[name]
+        root = self.__load_root(gir_path)
+        node = self.__nodes[name] = resolve_node_path(root, node_path)
+        return node
+
+    def get(self, name, default=None):
+        if name not in self:
+            return default
+        return self[name]
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Links to the online documentation of the installed gtk-doc books.
+
+What was gathered from each book is saved in the user cache directory,
+shared by all projects, and validated against the modification times
+of the book indexes.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import pickle
+import tempfile
+
+import appdirs
+
+from .symbol_packs import parse_gtk_doc_book
+
+
+def get_gtk_doc_cache_dir():
+    return os.path.join(appdirs.user_cache_dir("hotdoc", "hotdoc"),
+                        'gtk-doc')
+
+
+def _get_book_path(dir_):
+    digest = hashlib.sha1(os.path.abspath(dir_).encode('utf-8'))
+    return os.path.join(get_gtk_doc_cache_dir(), '%s-%s.p' % (
+        os.path.basename(dir_), digest.hexdigest()))
+
+
+def _get_book_mtimes(dir_):
+    mtimes = []
+    for name in (os.path.basename(dir_) + '.devhelp2', 'index.sgml'):
+        try:
+            mtimes.append(os.stat(os.path.join(dir_, name)).st_mtime)
+        except OSError:
+            mtimes.append(None)
+    return mtimes
+
+
+def _parse_book(dir_):
+    return {name: href for name, href, _ in parse_gtk_doc_book(dir_)}
+
+
+class GtkDocLinks(object):
+    """
+    Maps symbol names to the URL documenting them in the gtk-doc books
+    installed in @gtkdoc_dir, the last book listed wins.
+
+    Books are read by `GtkDocLinks.load`, or on the first lookup. Those
+    which are not in the cache or changed since are parsed in parallel,
+    in freshly spawned processes which do not inherit our memory.
+    """
+
+    # Bump when the contents of the saved books change
+    VERSION = 1
+
+    def __init__(self, gtkdoc_dir=None):
+        self.__gtkdoc_dir = gtkdoc_dir
+        self.__hrefs = None
+
+    def __load_book(self, dir_, mtimes):
+        try:
+            with open(_get_book_path(dir_), 'rb') as _:
+                version, saved_mtimes, hrefs = pickle.load(_)
+        except (IOError, OSError, EOFError, ValueError,
+                pickle.UnpicklingError):
+            return None
+
+        if version != GtkDocLinks.VERSION or saved_mtimes != mtimes:
+            return None
+
+        return hrefs
+
+    def __save_book(self, dir_, mtimes, hrefs):
+        cache_dir = get_gtk_doc_cache_dir()
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Other projects may be reading it concurrently
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+            with os.fdopen(fd, 'wb') as _:
+                pickle.dump((GtkDocLinks.VERSION, mtimes, hrefs), _,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, _get_book_path(dir_))
+        except (IOError, OSError):
+            pass
+
+    def __parse_books(self, dirs):
+        if len(dirs) < 2:
+            return [_parse_book(dir_) for dir_ in dirs]
+
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(min(len(dirs), multiprocessing.cpu_count())) as pool:
+            return pool.map(_parse_book, dirs)
+
+    def load(self):
+        """
+        Reads the books, if they were not read yet.
+        """
+        if self.__hrefs is None:
+            self.__load()
+
+    def __load(self):
+        self.__hrefs = {}
+        if not self.__gtkdoc_dir or not os.path.isdir(self.__gtkdoc_dir):
+            return
+
+        dirs = [os.path.join(self.__gtkdoc_dir, node)
+                for node in os.listdir(self.__gtkdoc_dir)]
+        dirs = [dir_ for dir_ in dirs if os.path.isdir(dir_)]
+
+        books = {}
+        mtimes = {}
+        for dir_ in dirs:
+            mtimes[dir_] = _get_book_mtimes(dir_)
+            books[dir_] = self.__load_book(dir_, mtimes[dir_])
+
+        cold = [dir_ for dir_ in dirs if books[dir_] is None]
+        for dir_, hrefs in zip(cold, self.__parse_books(cold)):
+            books[dir_] = hrefs
+            self.__save_book(dir_, mtimes[dir_], hrefs)
+
+        for dir_ in dirs:
+            self.__hrefs.update(books[dir_])
+
+    def get(self, name):
+        """
+        Returns the URL documenting @name, or None.
+        """
+        self.load()
+        return self.__hrefs.get(name)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Instrumentation of the hot paths of the C scanner.
+
+The scanner always talks to a profile, by default a NullScanProfile
+which does nothing, so that instrumentation costs close to nothing
+when no report was asked for.
+"""
+
+import json
+import time
+
+from collections import defaultdict
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullScanProfile(object):
+    enabled = False
+
+    # pylint: disable=unused-argument,no-self-use
+    def timed(self, filename, phase):
+        return _NULL_TIMER
+
+    def count(self, counter, n=1):
+        pass
+
+    def instrument_library(self, lib, names):
+        pass
+
+
+class _Timer(object):
+    def __init__(self, phases, phase):
+        self.__phases = phases
+        self.__phase = phase
+        self.__start = 0
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.__phases[self.__phase] += time.perf_counter() - self.__start
+        return False
+
+
+class ScanProfile(object):
+    """
+    Per-file phase timers and global counters, see
+    `ScanProfile.write_report` for the output format.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.__files = defaultdict(lambda: defaultdict(float))
+        self.__counters = defaultdict(int)
+        self.__start = time.perf_counter()
+
+    def timed(self, filename, phase):
+        """
+        Returns a context manager adding the time spent in its block
+        to the total of @phase for @filename.
+        """
+        return _Timer(self.__files[filename], phase)
+
+    def count(self, counter, n=1):
+        self.__counters[counter] += n
+
+    def instrument_library(self, lib, names):
+        """
+        Wraps the functions of the ctypes library @lib listed in @names,
+        to count the calls going through the FFI.
+
+        The library is only wrapped once, later profiles take over the
+        counting.
+        """
+        def wrap(func):
+            def wrapper(*args):
+                wrapper.counters['ffi-calls'] += 1
+                return func(*args)
+            wrapper.instrumented = True
+            return wrapper
+
+        for name in names:
+            func = getattr(lib, name, None)
+            if func is None:
+                continue
+            if not getattr(func, 'instrumented', False):
+                func = wrap(func)
+                setattr(lib, name, func)
+            func.counters = self.__counters
+
+    def write_report(self, path):
+        """
+        Writes a JSON object with the following members to @path:
+
+        - 'total': wall-clock seconds elapsed since the creation of
+          the profile
+        - 'phases': seconds spent in each phase, summed over all files
+        - 'counters': the counters
+        - 'files': per-file phase timings, slowest files first
+        """
+        phases = defaultdict(float)
+        for file_phases in self.__files.values():
+            for phase, duration in file_phases.items():
+                phases[phase] += duration
+
+        files = sorted(self.__files.items(),
+                       key=lambda item: sum(item[1].values()),
+                       reverse=True)
+
+        report = {
+            'total': time.perf_counter() - self.__start,
+            'phases': phases,
+            'counters': self.__counters,
+            'files': [dict(file_phases, filename=filename)
+                      for filename, file_phases in files],
+        }
+
+        with open(path, 'w') as _:
+            json.dump(report, _, indent=2)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compact records of what the C scanner extracted from a file.
+
+The records only hold plain data, they do not reference cursors or
+hotdoc symbols, and can thus be pickled and materialized into the
+doc database later on, see `ClangScanner`.
+
+Type tokens are tuples of strings and `TypeLink`, the latter standing
+for the `Link` the materialized symbol will hold.
+"""
+
+
+_PATH_SLOTS = ('filename', 'implementation_filename')
+
+
+class _Record(object):
+    __slots__ = ()
+
+    def __init__(self, *args):
+        for slot, value in zip(self.__slots__, args):
+            setattr(self, slot, value)
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def relocate(self, relocate_path):
+        """
+        Returns a copy of the record, with the file paths it holds, and
+        those of the records it contains, passed through @relocate_path.
+        """
+        values = []
+        for slot in self.__slots__:
+            value = getattr(self, slot)
+            if slot in _PATH_SLOTS and value:
+                value = relocate_path(value)
+            elif type(value) is list:
+                value = [item.relocate(relocate_path)
+                         if isinstance(item, _Record) else item
+                         for item in value]
+            values.append(value)
+        return type(self)(*values)
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            repr(getattr(self, slot)) for slot in self.__slots__))
+
+
+class TypeLink(_Record):
+    __slots__ = ('name',)
+
+
+class ParameterRecord(_Record):
+    __slots__ = ('argname', 'type_tokens')
+
+
+class FunctionRecord(_Record):
+    __slots__ = ('name', 'filename', 'lineno', 'return_tokens', 'parameters',
+                 'extent_start', 'extent_end')
+
+
+class CallbackRecord(_Record):
+    __slots__ = ('name', 'filename', 'lineno', 'return_tokens', 'parameters')
+
+
+class FieldRecord(_Record):
+    __slots__ = ('name', 'member_name', 'type_tokens', 'is_function_pointer')
+
+
+class StructRecord(_Record):
+    __slots__ = ('name', 'filename', 'lineno', 'raw_text', 'fields',
+                 'anonymous')
+
+
+class EnumMemberRecord(_Record):
+    __slots__ = ('name', 'filename', 'lineno', 'value')
+
+
+class EnumRecord(_Record):
+    __slots__ = ('name', 'filename', 'lineno', 'raw_text', 'members',
+                 'anonymous')
+
+
+class AliasRecord(_Record):
+    __slots__ = ('name', 'filename', 'lineno', 'aliased_tokens',
+                 'implementation_filename')
+
+
+class VariableRecord(_Record):
+    __slots__ = ('name', 'filename', 'lineno', 'original_text',
+                 'type_tokens')
+
+
+class FunctionMacroRecord(_Record):
+    __slots__ = ('name', 'filename', 'lineno', 'original_text')
+
+
+class ConstantRecord(_Record):
+    __slots__ = ('name', 'filename', 'lineno', 'original_text')
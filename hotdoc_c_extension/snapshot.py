@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Snapshots of a scanned C API, to document it where clang is not
+available, see `CExtension`.
+
+Paths are stored relative to a root directory, so that snapshots can
+be moved to another checkout of the sources.
+"""
+
+import gzip
+import os
+import pickle
+
+from collections import defaultdict
+
+from .extraction_cache import file_digest
+
+
+class ScanSnapshot(object):
+    """
+    Records, comments and source hashes of a full scan.
+    """
+
+    # Bump when the records or the comment scanner change
+    VERSION = 1
+
+    def __init__(self):
+        self.records = defaultdict(list)
+        self.comments = {}
+        self.gir_skipped = []
+        self.digests = {}
+
+    def add_records(self, filename, records):
+        self.records[filename].extend(records)
+
+    def set_comments(self, filename, comments):
+        """
+        @comments is a list of (text, lineno, endlineno) tuples, the
+        text being ready for the gtk-doc comment parser.
+        """
+        self.comments[filename] = comments
+
+    def matches(self, filenames):
+        """
+        Returns whether the snapshot was made from @filenames, with
+        their current contents.
+        """
+        filenames = [os.path.abspath(filename) for filename in filenames]
+        if set(filenames) != set(self.digests):
+            return False
+
+        for filename in filenames:
+            if file_digest(filename) != self.digests[filename]:
+                return False
+
+        return True
+
+    def save(self, path, root, filenames):
+        """
+        Saves the snapshot of a scan of @filenames to @path, with
+        paths relative to @root.
+        """
+        def relpath(filename):
+            return os.path.relpath(filename, root)
+
+        files = {}
+        for filename in filenames:
+            files[relpath(filename)] = (
+                file_digest(filename),
+                [record.relocate(relpath)
+                 for record in self.records.get(filename, [])],
+                self.comments.get(filename, []))
+
+        with gzip.open(path, 'wb') as _:
+            pickle.dump((ScanSnapshot.VERSION, files,
+                         [relpath(filename) for filename in
+                          self.gir_skipped]),
+                        _, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path, root):
+        """
+        Returns the snapshot saved at @path, with paths made absolute
+        again from @root, or None if it cannot be loaded.
+        """
+        def abspath(filename):
+            return os.path.normpath(os.path.join(root, filename))
+
+        try:
+            with gzip.open(path, 'rb') as _:
+                version, files, gir_skipped = pickle.load(_)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+
+        if version != ScanSnapshot.VERSION:
+            return None
+
+        snapshot = ScanSnapshot()
+        for filename, (digest, records, comments) in files.items():
+            filename = abspath(filename)
+            snapshot.digests[filename] = digest
+            snapshot.records[filename] = [record.relocate(abspath)
+                                          for record in records]
+            snapshot.comments[filename] = comments
+        snapshot.gir_skipped = [abspath(filename)
+                                for filename in gir_skipped]
+
+        return snapshot
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Symbol packs: compact, prebuilt indexes of the symbols documented by
+a dependency, mapping their names to an URL and a type.
+
+Packs are built once from gtk-doc indexes, with:
+
+    python3 -m hotdoc_c_extension.symbol_packs OUTPUT BOOK_DIR [BOOK_DIR ...]
+
+and are memory-mapped and binary searched when looked up, nothing is
+read when they are opened.
+
+The layout is a header (magic and number of entries), a table of
+little-endian 32 bits offsets to the entries, sorted by name, then
+the entries, as nul-terminated UTF-8 name, URL and type.
+"""
+
+import mmap
+import os
+import struct
+import sys
+
+from lxml import etree
+
+
+MAGIC = b'HDSYMPK1'
+_HEADER = struct.Struct('<8sI')
+_OFFSET = struct.Struct('<I')
+
+
+def parse_devhelp_index(path):
+    """
+    Returns the (name, url, type) tuples of the devhelp index at
+    @path, or None if it has no online location.
+    """
+    dh_root = etree.parse(path).getroot()
+    online = dh_root.attrib.get('online')
+    name = dh_root.attrib.get('name')
+    if not online:
+        if not name:
+            return None
+        online = 'https://developer.gnome.org/%s/unstable/' % name
+
+    entries = []
+    keywords = dh_root.findall('.//{http://www.devhelp.net/book}keyword')
+    for kw in keywords:
+        name = kw.attrib["name"]
+        type_ = kw.attrib['type']
+        link = kw.attrib['link']
+
+        if type_ in ['macro', 'function']:
+            name = name.rstrip(u' ()')
+        elif type_ in ['struct', 'enum']:
+            split = name.split(' ', 1)
+            if len(split) == 2:
+                name = split[1]
+            else:
+                name = split[0]
+        elif type_ in ['signal', 'property']:
+            anchor = link.split('#', 1)[1]
+            split = anchor.split('-', 1)
+            if type_ == 'signal':
+                name = '%s::%s' % (split[0], split[1].lstrip('-'))
+            else:
+                name = '%s:%s' % (split[0], split[1].lstrip('-'))
+
+        entries.append((name, online + link, type_))
+
+    return entries
+
+
+def parse_sgml_index(path):
+    """
+    Returns the (name, url, type) tuples of the gtk-doc sgml index at
+    @path, types are not known and left empty.
+    """
+    remote_prefix = ""
+    entries = []
+    with open(path, 'r') as f:
+        for l in f:
+            if l.startswith("<ONLINE"):
+                remote_prefix = l.split('"')[1]
+            elif not remote_prefix:
+                break
+            elif l.startswith("<ANCHOR"):
+                split_line = l.split('"')
+                filename = split_line[3].split('/', 1)[-1]
+                title = split_line[1].replace('-', '_')
+
+                if title.endswith (":CAPS"):
+                    title = title [:-5]
+                if remote_prefix:
+                    href = '%s/%s' % (remote_prefix, filename)
+                else:
+                    href = filename
+
+                entries.append((title, href, ''))
+
+    return entries
+
+
+def parse_gtk_doc_book(dir_):
+    """
+    Returns the (name, url, type) tuples of the gtk-doc book installed
+    in @dir_, from its devhelp index or failing that its sgml index.
+    """
+    path = os.path.join(dir_, os.path.basename(dir_) + '.devhelp2')
+    if os.path.exists(path):
+        entries = parse_devhelp_index(path)
+        if entries is not None:
+            return entries
+
+    try:
+        return parse_sgml_index(os.path.join(dir_, 'index.sgml'))
+    except IOError:
+        return []
+
+
+def write_symbol_pack(path, entries):
+    """
+    Writes the (name, url, type) tuples in @entries to a pack at
+    @path. The last entry wins when names are duplicated.
+
+    Returns the number of names written.
+    """
+    encoded = {}
+    for name, url, type_ in entries:
+        encoded[name.encode('utf-8')] = b'\0'.join(
+            (name.encode('utf-8'), url.encode('utf-8'),
+             (type_ or '').encode('utf-8'), b''))
+
+    names = sorted(encoded)
+    offset = _HEADER.size + _OFFSET.size * len(names)
+    offsets = []
+    for name in names:
+        offsets.append(_OFFSET.pack(offset))
+        offset += len(encoded[name])
+
+    with open(path, 'wb') as _:
+        _.write(_HEADER.pack(MAGIC, len(names)))
+        _.write(b''.join(offsets))
+        for name in names:
+            _.write(encoded[name])
+
+    return len(names)
+
+
+class SymbolPack(object):
+    """
+    A symbol pack, only mapped when first looked up.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.__map = None
+        self.__count = 0
+
+    def __open(self):
+        with open(self.path, 'rb') as _:
+            self.__map = mmap.mmap(_.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.__count = _HEADER.unpack_from(self.__map, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not a symbol pack' % self.path)
+
+    def __entry(self, i):
+        offset = _OFFSET.unpack_from(self.__map,
+                                     _HEADER.size + i * _OFFSET.size)[0]
+        end = self.__map.find(b'\0', offset)
+        return offset, self.__map[offset:end]
+
+    def lookup(self, name):
+        """
+        Returns the (url, type) of @name, or None if the pack does
+        not document it.
+        """
+        if self.__map is None:
+            self.__open()
+
+        key = name.encode('utf-8')
+        low, high = 0, self.__count
+        while low < high:
+            mid = (low + high) // 2
+            offset, entry_name = self.__entry(mid)
+            if entry_name < key:
+                low = mid + 1
+            elif entry_name > key:
+                high = mid
+            else:
+                end = self.__map.find(b'\0', offset + len(key) + 1)
+                url = self.__map[offset + len(key) + 1:end]
+                type_ = self.__map[end + 1:self.__map.find(b'\0', end + 1)]
+                return url.decode('utf-8'), type_.decode('utf-8')
+
+        return None
+
+
+class SymbolPacks(object):
+    """
+    Looks names up in several packs, the first one documenting a
+    name wins. Results are memoized.
+    """
+    def __init__(self, paths=None):
+        self.__packs = [SymbolPack(path) for path in paths or []]
+        self.__results = {}
+
+    def __bool__(self):
+        return bool(self.__packs)
+
+    def lookup(self, name):
+        try:
+            return self.__results[name]
+        except KeyError:
+            pass
+
+        result = None
+        for pack in self.__packs:
+            result = pack.lookup(name)
+            if result is not None:
+                break
+
+        self.__results[name] = result
+        return result
+
+    def get_url(self, name):
+        result = self.lookup(name)
+        if result is None:
+            return None
+        return result[0]
+
+
+def main(args):
+    if len(args) < 2:
+        print('Usage: %s OUTPUT BOOK_DIR [BOOK_DIR ...]' %
+              'python3 -m hotdoc_c_extension.symbol_packs')
+        return 1
+
+    entries = []
+    for dir_ in args[1:]:
+        entries.extend(parse_gtk_doc_book(os.path.abspath(dir_)))
+
+    n_names = write_symbol_pack(args[0], entries)
+    print('Wrote %d symbols to %s' % (n_names, args[0]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
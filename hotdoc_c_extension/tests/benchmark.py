@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks are only run when HOTDOC_C_BENCHMARKS is set in the
+environment, they print their timings rather than enforce them.
+"""
+
+import os
+import sys
+import time
+import unittest
+
+
+def benchmark(cls):
+    return unittest.skipUnless(os.environ.get('HOTDOC_C_BENCHMARKS'),
+                               'set HOTDOC_C_BENCHMARKS to run')(cls)
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    res = func(*args, **kwargs)
+    sys.stderr.write('\n%s: %.3fs ' % (label, time.perf_counter() - start))
+    return res
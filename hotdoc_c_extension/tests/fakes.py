@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Minimal stand-ins for the hotdoc objects the scanner and the gi
+extension talk to.
+"""
+
+from collections import defaultdict
+
+from hotdoc_c_extension.clang import cindex
+from hotdoc_c_extension.c_extension import ClangScanner
+from hotdoc_c_extension.gi_extension import GIExtension
+from hotdoc_c_extension.tracing import NullTraceRecorder
+
+
+class FakeDatabase(object):
+    def __init__(self):
+        self.comments = {}
+
+    def add_comment(self, comment):
+        self.comments[comment.name] = comment
+
+    def get_symbol(self, name):
+        return None
+
+
+class FakeApp(object):
+    def __init__(self):
+        self.database = FakeDatabase()
+
+
+class FakeProject(object):
+    def __init__(self):
+        self.tag_validators = {}
+        self.include_paths = []
+
+
+class FakeDocDb(object):
+    """
+    Records the symbols created by the scanner, by name and in order.
+    """
+    def __init__(self):
+        self.symbols = {}
+        self.created = []
+        self._created_symbols = defaultdict(set)
+
+    def get_or_create_symbol(self, type_, **kwargs):
+        self.symbols[kwargs['display_name']] = (type_, kwargs)
+        self.created.append(kwargs['display_name'])
+        return kwargs
+
+
+def make_scanner(doc_db=None):
+    return ClangScanner(FakeApp(), FakeProject(), doc_db or FakeDocDb())
+
+
+def clang_available():
+    make_scanner()
+    try:
+        cindex.conf.lib
+    except cindex.LibclangError:
+        return False
+    return True
+
+
+class FakeScanner(object):
+    def set_extension(self, extension):
+        pass
+
+
+class FakeCExtension(object):
+    def __init__(self):
+        self.tracer = NullTraceRecorder()
+        self.scanner = FakeScanner()
+        self.sources = []
+
+
+class FakePage(object):
+    extension_name = 'gi-extension'
+
+
+class FakeTree(object):
+    """
+    Symbols whose name starts like the test namespace have a page.
+    """
+    def get_page_for_symbol(self, id_):
+        if id_.startswith('test') or id_.startswith('Test'):
+            return FakePage()
+        return None
+
+
+class FakeGIProject(object):
+    def __init__(self, datadir):
+        self.datadir = datadir
+        self.sanitized_name = 'p'
+        self.extensions = {'c-extension': FakeCExtension()}
+        self.tree = FakeTree()
+
+
+class FakeGIApp(object):
+    def __init__(self, private_folder):
+        self.private_folder = private_folder
+
+
+class FakeGIConfig(object):
+    def __init__(self, gir, languages=None):
+        self.__gir = gir
+        self.__languages = languages
+
+    def get(self, key, default=None):
+        if key == 'languages' and self.__languages:
+            return self.__languages
+        return default
+
+    def get_sources(self, prefix):
+        return [self.__gir]
+
+    def get_index(self, prefix):
+        return None
+
+    def get_paths(self, key):
+        return None
+
+    def get_path(self, key):
+        return None
+
+
+def make_gi_extension(gir, tmp_dir, languages=None):
+    """
+    Returns a `GIExtension` configured to document @gir, which must
+    not include other girs.
+    """
+    extension = GIExtension(FakeGIApp(tmp_dir), FakeGIProject(tmp_dir))
+    extension.parse_config(FakeGIConfig(gir, languages))
+    return extension
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from hotdoc_c_extension.extraction_cache import ExtractionCache
+from hotdoc_c_extension.scan_records import FunctionRecord
+from hotdoc_c_extension.tests.fakes import (make_scanner, clang_available,
+                                            FakeDocDb)
+
+
+class TestExtractionCache(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.header = self.__write('test.h', 'int test_greet (void);\n')
+        self.include = self.__write('include.h', 'typedef int TestInt;\n')
+        self.records = [FunctionRecord('test_greet', self.header, 1, ('int',),
+                                       [], (1, 1), (1, 22))]
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def __write(self, name, contents):
+        path = os.path.join(self.__tmp_dir, name)
+        with open(path, 'w') as _:
+            _.write(contents)
+        return path
+
+    def __make_cache(self):
+        cache = ExtractionCache()
+        cache.set_records(self.header, ['-DFOO'], [self.include],
+                          self.records, True)
+        return cache
+
+    def test_hit(self):
+        records, guarded = self.__make_cache().get_records(self.header,
+                                                           ['-DFOO'])
+        self.assertIs(records, self.records)
+        self.assertTrue(guarded)
+
+    def test_miss(self):
+        self.assertIsNone(self.__make_cache().get_records(self.include,
+                                                          ['-DFOO']))
+
+    def test_flags(self):
+        self.assertIsNone(self.__make_cache().get_records(self.header,
+                                                          ['-DBAR']))
+
+    def test_contents(self):
+        cache = self.__make_cache()
+        self.__write('test.h', 'int test_greet (int n);\n')
+        # Files are only hashed once per cache
+        self.assertIsNotNone(cache.get_records(self.header, ['-DFOO']))
+        cache.save(os.path.join(self.__tmp_dir, 'cache.p'))
+        cache = ExtractionCache()
+        cache.load(os.path.join(self.__tmp_dir, 'cache.p'))
+        self.assertIsNone(cache.get_records(self.header, ['-DFOO']))
+
+    def test_include_contents(self):
+        path = os.path.join(self.__tmp_dir, 'cache.p')
+        self.__make_cache().save(path)
+        self.__write('include.h', 'typedef long TestInt;\n')
+        cache = ExtractionCache()
+        cache.load(path)
+        self.assertIsNone(cache.get_records(self.header, ['-DFOO']))
+
+    def test_touched(self):
+        path = os.path.join(self.__tmp_dir, 'cache.p')
+        self.__make_cache().save(path)
+        os.utime(self.header, (0, 0))
+        cache = ExtractionCache()
+        cache.load(path)
+        records, _ = cache.get_records(self.header, ['-DFOO'])
+        self.assertEqual(repr(records), repr(self.records))
+
+    def test_version(self):
+        path = os.path.join(self.__tmp_dir, 'cache.p')
+        self.__make_cache().save(path)
+        cache = ExtractionCache()
+        try:
+            ExtractionCache.VERSION += 1
+            cache.load(path)
+        finally:
+            ExtractionCache.VERSION -= 1
+        self.assertIsNone(cache.get_records(self.header, ['-DFOO']))
+
+    def test_comments(self):
+        cache = ExtractionCache()
+        self.assertIsNone(cache.get_comments(self.header))
+        cache.set_comments(self.header, [('/** */', 1, 1, True)])
+        self.assertEqual(cache.get_comments(self.header),
+                         [('/** */', 1, 1, True)])
+
+
+BASE = '''
+typedef struct {
+  int n;
+} TestBase;
+
+TestBase *test_base_new (void);
+'''
+
+DERIVED = '''
+#include "base.h"
+
+typedef struct {
+  TestBase parent;
+} TestDerived;
+
+TestBase *test_derived_get_base (TestDerived *derived);
+'''
+
+
+@unittest.skipUnless(clang_available(), 'libclang is not available')
+class TestCachedScan(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.filenames = []
+        # The derived header is scanned first, and references types
+        # defined in the base header
+        for name, contents in (('derived.h', DERIVED), ('base.h', BASE)):
+            filename = os.path.join(self.__tmp_dir, name)
+            with open(filename, 'w') as _:
+                _.write(contents)
+            self.filenames.append(filename)
+        self.cache_path = os.path.join(self.__tmp_dir, 'cache.p')
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def __scan(self, cache=None):
+        doc_db = FakeDocDb()
+        scanner = make_scanner(doc_db)
+        if cache is not None:
+            scanner.cache = cache
+        scanner.scan(self.filenames, [], False, True, ['*.h'])
+        # Each symbol is only created once
+        self.assertEqual(sorted(doc_db.created), sorted(doc_db.symbols))
+        return {name: (type_, kwargs['filename'])
+                for name, (type_, kwargs) in doc_db.symbols.items()}
+
+    def test_same_symbols(self):
+        symbols = self.__scan()
+        self.assertEqual(symbols['TestBase'][1], self.filenames[1])
+
+        cache = ExtractionCache()
+        self.assertEqual(self.__scan(cache), symbols)
+        cache.save(self.cache_path)
+
+        cache = ExtractionCache()
+        cache.load(self.cache_path)
+        self.assertEqual(self.__scan(cache), symbols)
+
+    def test_own_records(self):
+        stored = {}
+
+        class RecordingCache(ExtractionCache):
+            def set_records(self, filename, flags, includes, records,
+                            guarded):
+                stored[filename] = records
+                super().set_records(filename, flags, includes, records,
+                                    guarded)
+
+        self.__scan(RecordingCache())
+        for filename in self.filenames:
+            self.assertTrue(stored[filename])
+            self.assertEqual(set(record.filename
+                                 for record in stored[filename]),
+                             set([filename]))
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+from hotdoc.core.comment import Comment
+from hotdoc.core.formatter import Formatter
+from hotdoc.core.links import Link
+
+from hotdoc_c_extension.gi_annotation_parser import (GIAnnotation,
+                                                     NULLABLE_HELP,
+                                                     TRANSFER_NONE_HELP,
+                                                     TYPE_HELP)
+from hotdoc_c_extension.gi_extension import (RunFirstFlag, RunLastFlag,
+                                             WritableFlag)
+from hotdoc_c_extension.tests.fakes import make_gi_extension
+
+
+GIR = '''<?xml version="1.0"?>
+<repository version="1.2"
+            xmlns="http://www.gtk.org/introspection/core/1.0"
+            xmlns:c="http://www.gtk.org/introspection/c/1.0"
+            xmlns:glib="http://www.gtk.org/introspection/glib/1.0">
+  <namespace name="Test" version="1.0"
+             c:identifier-prefixes="Test" c:symbol-prefixes="test">
+    <class name="Greeter" c:type="TestGreeter"
+           glib:get-type="test_greeter_get_type" c:symbol-prefix="greeter"/>
+  </namespace>
+</repository>
+'''
+
+
+class FakeDocstringFormatter(object):
+    """
+    Turns the words of descriptions starting with '#' into links to
+    the symbol they name, rendered with their title.
+    """
+    def __init__(self):
+        self.n_renders = 0
+
+    def comment_to_ast(self, comment, link_resolver):
+        return [Link('p/t.html', word[1:], word[1:])
+                if word.startswith('#') else word
+                for word in comment.description.split()]
+
+    def ast_to_html(self, ast, link_resolver):
+        self.n_renders += 1
+        return ' '.join(token.title if isinstance(token, Link) else token
+                        for token in ast)
+
+
+class GIFormatterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        patcher = mock.patch(
+            'hotdoc_c_extension.gir_cache.get_gir_cache_dir',
+            return_value=os.path.join(self.tmp_dir, 'cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        gir = os.path.join(self.tmp_dir, 'Test-1.0.gir')
+        with open(gir, 'w') as _:
+            _.write(GIR)
+        self.extension = make_gi_extension(gir, self.tmp_dir)
+        self.formatter = self.extension.formatter
+
+    def tearDown(self):
+        self.extension.setup_language(None)
+        shutil.rmtree(self.tmp_dir)
+
+
+class TestCommentReuse(GIFormatterTestCase):
+    def setUp(self):
+        super(TestCommentReuse, self).setUp()
+        self.docstring_formatter = FakeDocstringFormatter()
+        self.formatter._docstring_formatter = self.docstring_formatter
+
+    def format_comment(self, comment):
+        res = []
+        for language in self.extension.languages:
+            self.extension.setup_language(language)
+            res.append(self.formatter._format_comment(comment, None))
+        return res
+
+    def test_no_links(self):
+        comment = Comment(name='test_wave', description='Waves twice.')
+        self.assertEqual(self.format_comment(comment),
+                         ['Waves twice.'] * 3)
+        self.assertEqual(self.docstring_formatter.n_renders, 1)
+
+    def test_links(self):
+        comment = Comment(name='test_wave', description='Waves #TestGreeter')
+        self.assertEqual(self.format_comment(comment),
+                         ['Waves TestGreeter', 'Waves Test.Greeter',
+                          'Waves Test.Greeter'])
+        self.assertEqual(self.docstring_formatter.n_renders, 3)
+
+        # Still re-rendered once the tables are filled
+        self.assertEqual(self.format_comment(comment)[0],
+                         'Waves TestGreeter')
+        self.assertEqual(self.docstring_formatter.n_renders, 6)
+
+    def test_changed(self):
+        comment = Comment(name='test_wave', description='Waves twice.')
+        self.format_comment(comment)
+        # What updating a comment does
+        comment.description = 'Waves #TestGreeter'
+        comment.extension_attrs['gi-extension']['ast'] = None
+        self.assertEqual(self.format_comment(comment)[1],
+                         'Waves Test.Greeter')
+
+    def test_empty(self):
+        comment = Comment(name='test_wave')
+        self.assertEqual(self.format_comment(comment), [''] * 3)
+        self.assertEqual(self.docstring_formatter.n_renders, 0)
+
+
+class TestRawCode(GIFormatterTestCase):
+    def format_raw_code(self, codes):
+        with mock.patch.object(Formatter, '_format_raw_code',
+                               side_effect=lambda self, code: code.upper(),
+                               autospec=True) as format_raw_code:
+            res = [self.formatter._format_raw_code(code) for code in codes]
+        return res, format_raw_code.call_count
+
+    def test_shared(self):
+        codes = ['int x;', 'int y;']
+        self.assertEqual(self.format_raw_code(codes * 3),
+                         (['INT X;', 'INT Y;'] * 3, 2))
+
+    def test_bounded(self):
+        codes = ['int x%d;' % i for i in range(1025)]
+        self.assertEqual(self.format_raw_code(codes + codes[-1:])[1], 1025)
+        # The first one was evicted by the last one
+        self.assertEqual(self.format_raw_code(codes[:1])[1], 1)
+
+
+class TestAnnotationsAndFlags(GIFormatterTestCase):
+    def render(self, template_name, key, items):
+        # What the formatter did before memoizing, with plain objects
+        plain = [types.SimpleNamespace(**{
+            slot: getattr(item, slot) for slot in (
+                'nick', 'help_text', 'value', 'link') if hasattr(item, slot)})
+            for item in items]
+        template = self.formatter.engine.get_template(template_name)
+        return template.render({key: plain})
+
+    def test_interned(self):
+        self.assertIs(GIAnnotation('nullable', NULLABLE_HELP),
+                      GIAnnotation('nullable', NULLABLE_HELP))
+        self.assertIsNot(GIAnnotation('type', TYPE_HELP, 'gint'),
+                         GIAnnotation('type', TYPE_HELP, 'guint'))
+        self.assertIs(RunLastFlag(), RunLastFlag())
+        self.assertIsNot(RunLastFlag(), RunFirstFlag())
+        self.assertEqual(RunLastFlag().nick, 'Run Last')
+        self.assertIsNone(WritableFlag().link)
+
+    def test_annotations(self):
+        annotations = [GIAnnotation('nullable', NULLABLE_HELP),
+                       GIAnnotation('transfer: none', TRANSFER_NONE_HELP),
+                       GIAnnotation('type', TYPE_HELP, 'gint')]
+        expected = self.render('gi_annotations.html', 'annotations',
+                               annotations)
+        self.assertIn('nullable', expected)
+        for _ in range(2):
+            self.assertEqual(self.formatter.format_annotations(annotations),
+                             expected)
+        self.assertEqual(
+            self.formatter.format_annotations(reversed(annotations)),
+            self.render('gi_annotations.html', 'annotations',
+                        list(reversed(annotations))))
+        self.assertEqual(self.formatter.format_annotations([]),
+                         self.render('gi_annotations.html', 'annotations',
+                                     []))
+
+    def test_flags(self):
+        flags = [RunLastFlag(), WritableFlag()]
+        expected = self.render('gi_flags.html', 'flags', flags)
+        self.assertIn('Run Last', expected)
+        for _ in range(2):
+            self.assertEqual(self.formatter._format_flags(flags), expected)
+        self.assertEqual(self.formatter._format_flags([RunFirstFlag()]),
+                         self.render('gi_flags.html', 'flags',
+                                     [RunFirstFlag()]))
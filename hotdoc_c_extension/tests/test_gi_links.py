@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import contextlib
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from hotdoc.core.links import Link
+
+from hotdoc_c_extension.tests.benchmark import benchmark, timed
+from hotdoc_c_extension.tests.fakes import make_gi_extension
+
+
+GIR = '''<?xml version="1.0"?>
+<repository version="1.2"
+            xmlns="http://www.gtk.org/introspection/core/1.0"
+            xmlns:c="http://www.gtk.org/introspection/c/1.0"
+            xmlns:glib="http://www.gtk.org/introspection/glib/1.0">
+  <namespace name="Test" version="1.0"
+             c:identifier-prefixes="Test" c:symbol-prefixes="test">
+    <class name="Greeter" c:type="TestGreeter"
+           glib:get-type="test_greeter_get_type" c:symbol-prefix="greeter">
+      <method name="greet" c:identifier="test_greeter_greet"
+              introspectable="0"/>
+    </class>
+%s  </namespace>
+</repository>
+'''
+
+FUNCTION = '    <function name="f%d" c:identifier="test_f%d"/>\n'
+
+
+def make_links(n_links, n_functions):
+    links = [Link('p/t.html#greeter', 'TestGreeter', 'TestGreeter'),
+             Link('p/t.html#greet', 'test_greeter_greet',
+                  'test_greeter_greet'),
+             Link(None, 'gint', 'gint')]
+    for i in range(n_links - len(links)):
+        name = 'test_f%d' % (i % n_functions)
+        links.append(Link('p/t.html#%s' % name, name, name))
+    return links
+
+
+class GILinksTestCase(unittest.TestCase):
+    n_functions = 10
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        patcher = mock.patch(
+            'hotdoc_c_extension.gir_cache.get_gir_cache_dir',
+            return_value=os.path.join(self.tmp_dir, 'cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        gir = os.path.join(self.tmp_dir, 'Test-1.0.gir')
+        with open(gir, 'w') as _:
+            _.write(GIR % ''.join(FUNCTION % (i, i)
+                                  for i in range(self.n_functions)))
+
+        self.extension = make_gi_extension(gir, self.tmp_dir)
+        self.translate_ref = self.extension._GIExtension__translate_link_ref
+        self.translate_title = \
+            self.extension._GIExtension__translate_link_title
+
+    def tearDown(self):
+        self.extension.setup_language(None)
+        shutil.rmtree(self.tmp_dir)
+
+    @contextlib.contextmanager
+    def count_translations(self):
+        """
+        Counts the links actually translated rather than looked up in
+        the tables.
+        """
+        extension = self.extension
+        with mock.patch.object(
+                extension, '_GIExtension__do_translate_link_ref',
+                wraps=extension._GIExtension__do_translate_link_ref) as refs, \
+                mock.patch.object(
+                    extension, '_GIExtension__do_translate_link_title',
+                    wraps=extension._GIExtension__do_translate_link_title) \
+                as titles:
+            yield refs, titles
+
+    def translate(self, links):
+        return [(self.translate_ref(link), self.translate_title(link))
+                for link in links]
+
+
+class TestLinkTables(GILinksTestCase):
+    def test_translations(self):
+        links = make_links(5, self.n_functions)
+        expected = {
+            'c': [('p/c/t.html#greeter', 'TestGreeter'),
+                  ('p/c/t.html#greet', 'test_greeter_greet'),
+                  (None, None),
+                  ('p/c/t.html#test_f0', 'test_f0'),
+                  ('p/c/t.html#test_f1', 'test_f1')],
+            'python': [
+                ('p/python/t.html#greeter', 'Test.Greeter'),
+                ('p/c/t.html#greet',
+                 'test_greeter_greet (not introspectable)'),
+                ('https://docs.python.org/2/library/functions.html#int',
+                 'int'),
+                ('p/python/t.html#test_f0', 'Test.f0'),
+                ('p/python/t.html#test_f1', 'Test.f1')],
+        }
+        for language, translations in expected.items():
+            self.extension.setup_language(language)
+            # Once to fill the tables, once from them
+            self.assertEqual(self.translate(links), translations)
+            self.assertEqual(self.translate(links), translations)
+
+    def test_translated_once(self):
+        links = make_links(50, self.n_functions)
+        self.extension.setup_language('python')
+        with self.count_translations() as (refs, titles):
+            self.translate(links)
+            self.translate(links)
+        self.assertEqual(refs.call_count, self.n_functions + 3)
+        self.assertEqual(titles.call_count, self.n_functions + 3)
+
+    def test_no_language(self):
+        links = make_links(5, self.n_functions)
+        self.extension.setup_language('c')
+        self.extension.setup_language(None)
+        with self.count_translations() as (refs, titles):
+            self.assertEqual(self.translate_ref(links[0]),
+                             'p/c/t.html#greeter')
+            self.translate(links)
+        self.assertEqual(refs.call_count, 6)
+        self.assertEqual(titles.call_count, 5)
+
+    def test_keyed_on_id(self):
+        self.extension.setup_language('python')
+        self.translate(make_links(5, self.n_functions))
+        retitled = make_links(5, self.n_functions)
+        for link in retitled:
+            link.title = 'renamed'
+        with self.count_translations() as (refs, titles):
+            self.translate(retitled)
+        self.assertEqual(refs.call_count, 0)
+        self.assertEqual(titles.call_count, 0)
+        self.assertEqual(
+            len(self.extension._GIExtension__link_titles['python']), 5)
+
+    def test_cleared_when_formatted(self):
+        links = make_links(5, self.n_functions)
+        for language in ('c', 'python'):
+            self.extension.setup_language(language)
+            self.translate(links)
+        self.extension._GIExtension__clear_link_tables(None)
+        for language in ('c', 'python'):
+            self.extension.setup_language(language)
+            with self.count_translations() as (refs, titles):
+                self.translate(links)
+            self.assertEqual(refs.call_count, 5)
+            self.assertEqual(titles.call_count, 5)
+
+
+@benchmark
+class BenchmarkLinkTables(GILinksTestCase):
+    n_functions = 10000
+
+    def test_50k_links(self):
+        links = make_links(50000, self.n_functions)
+        do_translate_ref = self.extension._GIExtension__do_translate_link_ref
+        do_translate_title = \
+            self.extension._GIExtension__do_translate_link_title
+
+        def translate_uncached():
+            return [(do_translate_ref(link), do_translate_title(link))
+                    for link in links]
+
+        for language in ('c', 'python', 'javascript'):
+            self.extension.setup_language(language)
+            uncached = timed('%s, uncached' % language, translate_uncached)
+            cold = timed('%s, filling the tables' % language,
+                         self.translate, links)
+            warm = timed('%s, from the tables' % language,
+                         self.translate, links)
+            self.assertEqual(cold, uncached)
+            self.assertEqual(warm, uncached)
@@ -0,0 +1,612 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import gc
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from lxml import etree
+
+from hotdoc_c_extension.c_extension import MB, get_resident_memory
+from hotdoc_c_extension.gir_cache import (GirIndex, GirLocator, LazyNodes,
+                                          CORE_NS,
+                                          C_NS, GLIB_NS, KEPT_ATTRIBUTES,
+                                          LazyNamespaces, load_gir_index,
+                                          save_gir_index, parse_gir_nodes,
+                                          read_gir_header, resolve_node_path)
+from hotdoc_c_extension.tests.benchmark import benchmark
+from hotdoc_c_extension.tests.fakes import make_gi_extension
+
+
+GIR = '''<?xml version="1.0"?>
+<repository version="1.2"
+            xmlns="http://www.gtk.org/introspection/core/1.0"
+            xmlns:c="http://www.gtk.org/introspection/c/1.0"
+            xmlns:glib="http://www.gtk.org/introspection/glib/1.0">
+  <include name="GObject" version="2.0"/>
+  <namespace name="Test" version="1.0"
+             c:identifier-prefixes="Test" c:symbol-prefixes="test">
+    <class name="Greeter" c:type="TestGreeter" parent="GObject.Object"
+           glib:get-type="test_greeter_get_type">
+      <doc xml:space="preserve">A greeter.</doc>
+      <method name="greet" c:identifier="test_greeter_greet">
+        <doc xml:space="preserve">Greets.</doc>
+        <return-value transfer-ownership="none">
+          <type name="none" c:type="void"/>
+        </return-value>
+      </method>
+    </class>
+    <function name="wave" c:identifier="test_wave">
+      <return-value transfer-ownership="none">
+        <type name="gboolean" c:type="gboolean"/>
+      </return-value>
+    </function>
+  </namespace>
+</repository>
+'''
+
+
+def write_gir(dir_, name, contents=GIR):
+    path = os.path.join(dir_, name)
+    with open(path, 'w') as _:
+        _.write(contents)
+    return path
+
+
+class GirCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        patcher = mock.patch(
+            'hotdoc_c_extension.gir_cache.get_gir_cache_dir',
+            return_value=self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.gir = write_gir(self.tmp_dir, 'Test-1.0.gir')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+class TestGirIndex(GirCacheTestCase):
+    def __make_index(self):
+        index = GirIndex(self.gir)
+        index.nodes['test_wave'] = (1, 1)
+        index.includes.append(('GObject', '2.0'))
+        index.translations['test_wave'] = (True, 'Test.wave', 'Test.wave')
+        return index
+
+    def test_roundtrip(self):
+        save_gir_index(self.__make_index())
+        index = load_gir_index(self.gir)
+        self.assertEqual(index.path, self.gir)
+        self.assertEqual(index.nodes, {'test_wave': (1, 1)})
+        self.assertEqual(index.includes, [('GObject', '2.0')])
+        self.assertEqual(index.translations['test_wave'],
+                         (True, 'Test.wave', 'Test.wave'))
+
+    def test_not_saved(self):
+        self.assertIsNone(load_gir_index(self.gir))
+
+    def test_modified(self):
+        save_gir_index(self.__make_index())
+        write_gir(self.tmp_dir, 'Test-1.0.gir', GIR + '\n')
+        self.assertIsNone(load_gir_index(self.gir))
+
+    def test_touched(self):
+        save_gir_index(self.__make_index())
+        stat = os.stat(self.gir)
+        os.utime(self.gir, (stat.st_atime, stat.st_mtime + 10))
+        self.assertIsNone(load_gir_index(self.gir))
+
+    def test_version(self):
+        save_gir_index(self.__make_index())
+        try:
+            GirIndex.VERSION += 1
+            self.assertIsNone(load_gir_index(self.gir))
+        finally:
+            GirIndex.VERSION -= 1
+
+    def test_per_path(self):
+        save_gir_index(self.__make_index())
+        other_dir = os.path.join(self.tmp_dir, 'other')
+        os.mkdir(other_dir)
+        self.assertIsNone(load_gir_index(write_gir(other_dir,
+                                                   'Test-1.0.gir')))
+
+
+class TestLazyNodes(GirCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.loaded = []
+        self.missing = []
+
+    def __load_root(self, gir_path):
+        self.loaded.append(gir_path)
+        return parse_gir_nodes(gir_path)
+
+    def __load_missing(self, name):
+        self.missing.append(name)
+        if name == 'test_greeter_greet':
+            self.nodes.add(name, self.gir, (1, 0, 0))
+            return True
+        return False
+
+    def test_lazy(self):
+        self.nodes = LazyNodes(self.__load_root)
+        self.assertTrue(self.nodes.add('test_wave', self.gir, (1, 1)))
+        self.assertIn('test_wave', self.nodes)
+        self.assertEqual(self.loaded, [])
+
+        node = self.nodes['test_wave']
+        self.assertEqual(node.tag, '{%s}function' % CORE_NS)
+        self.assertEqual(node.get('name'), 'wave')
+        self.assertIs(self.nodes.get('test_wave'), node)
+        self.assertEqual(self.loaded, [self.gir])
+
+    def test_overwrite(self):
+        self.nodes = LazyNodes(self.__load_root)
+        self.nodes.add('test_wave', self.gir, (1, 0))
+        self.assertFalse(self.nodes.add('test_wave', self.gir, (1, 1),
+                                        overwrite=False))
+        self.assertEqual(self.nodes['test_wave'].get('name'), 'Greeter')
+        self.assertTrue(self.nodes.add('test_wave', self.gir, (1, 1)))
+        self.assertEqual(self.nodes['test_wave'].get('name'), 'wave')
+        self.assertEqual(list(self.nodes), ['test_wave'])
+        self.assertEqual(len(self.nodes), 1)
+
+    def test_missing(self):
+        self.nodes = LazyNodes(self.__load_root, self.__load_missing)
+        self.assertNotIn('test_leave', self.nodes)
+        self.assertIsNone(self.nodes.get('test_leave'))
+        self.assertIn('test_greeter_greet', self.nodes)
+        self.assertEqual(self.nodes['test_greeter_greet'].get('name'),
+                         'greet')
+        self.assertEqual(self.missing, ['test_leave', 'test_leave',
+                                        'test_greeter_greet'])
+
+
+
+NAMESPACE_GIR = '''<?xml version="1.0"?>
+<repository version="1.2"
+            xmlns="http://www.gtk.org/introspection/core/1.0"
+            xmlns:c="http://www.gtk.org/introspection/c/1.0">
+  %s
+  <namespace name="%s" version="2.0"
+             c:identifier-prefixes="G" c:symbol-prefixes="g">
+    %s
+  </namespace>
+</repository>
+'''
+
+GLIB = ('',
+        'GLib',
+        '<record name="List" c:type="GList" c:symbol-prefix="list">'
+        '<method name="append" c:identifier="g_list_append">'
+        '<return-value><type name="GLib.List" c:type="GList*"/>'
+        '</return-value></method></record>'
+        '<function name="malloc" c:identifier="g_malloc"/>')
+
+GOBJECT = ('<include name="GLib" version="2.0"/>',
+           'GObject',
+           '<class name="Object" c:type="GObject" c:symbol-prefix="object">'
+           '<method name="ref" c:identifier="g_object_ref"/></class>'
+           '<constant name="TYPE_FLAG_RESERVED_ID_BIT" '
+           'c:type="G_TYPE_FLAG_RESERVED_ID_BIT"/>')
+
+GIO = ('<include name="GObject" version="2.0"/>',
+       'Gio',
+       '<interface name="File" c:type="GFile" c:symbol-prefix="file">'
+       '<function name="new_for_path" c:identifier="g_file_new_for_path">'
+       '<return-value><type name="File" c:type="GFile*"/></return-value>'
+       '</function></interface>'
+       '<class name="FileInfo" c:type="GFileInfo" '
+       'c:symbol-prefix="file_info"/>'
+       '<enumeration name="FileType" c:type="GFileType">'
+       '<member name="regular" c:identifier="G_FILE_TYPE_REGULAR"/>'
+       '</enumeration>')
+
+
+class TestLazyNamespaces(GirCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.namespaces = LazyNamespaces()
+        for contents in (GLIB, GOBJECT, GIO):
+            gir = write_gir(self.tmp_dir, '%s-2.0.gir' % contents[1],
+                            NAMESPACE_GIR % contents)
+            self.namespaces.add(read_gir_header(gir))
+
+    def test_header(self):
+        header = read_gir_header(os.path.join(self.tmp_dir, 'Gio-2.0.gir'))
+        self.assertEqual(header.namespace, 'Gio')
+        self.assertEqual(header.includes, [('GObject', '2.0')])
+        # Not GFile*, a reference to the type
+        self.assertEqual(header.names, set([
+            'GFile', 'g_file_new_for_path', 'GFileInfo', 'GFileType',
+            'G_FILE_TYPE_REGULAR']))
+
+    def test_header_cached(self):
+        gir = os.path.join(self.tmp_dir, 'Gio-2.0.gir')
+        with mock.patch('hotdoc_c_extension.gir_cache._parse_gir_header',
+                        side_effect=AssertionError):
+            self.assertEqual(read_gir_header(gir).namespace, 'Gio')
+
+        write_gir(self.tmp_dir, 'Gio-2.0.gir',
+                  NAMESPACE_GIR % ('', 'Gio', ''))
+        self.assertEqual(read_gir_header(gir).names, set())
+
+    def test_names(self):
+        self.assertEqual(self.namespaces.match('GFile')[0], 'Gio')
+        self.assertEqual(self.namespaces.match('GFile::changed')[0], 'Gio')
+        self.assertEqual(self.namespaces.match('GObject:name')[0], 'GObject')
+        self.assertEqual(self.namespaces.match('g_malloc')[0], 'GLib')
+        self.assertEqual(
+            self.namespaces.match('G_TYPE_FLAG_RESERVED_ID_BIT')[0],
+            'GObject')
+
+    def test_members(self):
+        self.assertEqual(self.namespaces.match('g_object_ref'), ['GObject'])
+        self.assertEqual(self.namespaces.match('g_list_append'), ['GLib'])
+        self.assertEqual(self.namespaces.match('g_file_new_for_path'),
+                         ['Gio'])
+        self.assertEqual(self.namespaces.match('G_FILE_TYPE_REGULAR'),
+                         ['Gio'])
+
+    def test_no_prefix_match(self):
+        # Names starting like the ones of the namespaces
+        for name in ('GstPad', 'GST_PAD_NAME', 'gst_pad_new',
+                     'G_FILE_TYPE_FIFO', 'g_file_info_get_name',
+                     'GObjectClass', 'test_greet'):
+            self.assertEqual(self.namespaces.match(name), [], name)
+
+    def test_pop(self):
+        gir = self.namespaces.pop('Gio')
+        self.assertEqual(gir, os.path.join(self.tmp_dir, 'Gio-2.0.gir'))
+        self.assertIsNone(self.namespaces.pop('Gio'))
+        self.assertNotIn('Gio', self.namespaces.match('g_file_new_for_path'))
+        self.assertEqual(LazyNamespaces().match('g_object_ref'), [])
+
+
+class TestIncludedNamespaces(GirCacheTestCase):
+    def setUp(self):
+        super(TestIncludedNamespaces, self).setUp()
+        gir_dir = os.path.join(self.tmp_dir, 'gir-1.0')
+        os.mkdir(gir_dir)
+        for contents in (GLIB, GOBJECT, GIO):
+            write_gir(gir_dir, '%s-2.0.gir' % contents[1],
+                      NAMESPACE_GIR % contents)
+        gir = write_gir(self.tmp_dir, 'Test-2.0.gir', NAMESPACE_GIR % (
+            '<include name="Gio" version="2.0"/>', 'Test',
+            '<function name="wave" c:identifier="test_wave"/>'))
+
+        patcher = mock.patch.dict(os.environ, {'XDG_DATA_DIRS': ''})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        extension = make_gi_extension(gir, self.tmp_dir)
+        self.nodes = extension._GIExtension__node_cache
+
+        self.loaded = []
+
+        def load_gir_index_spy(gir_path):
+            self.loaded.append(os.path.basename(gir_path))
+            return load_gir_index(gir_path)
+
+        patcher = mock.patch('hotdoc_c_extension.gi_extension.load_gir_index',
+                             side_effect=load_gir_index_spy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prefix_misses(self):
+        for name in ('GstPad', 'GST_PAD_NAME', 'gst_pad_new',
+                     'G_FILE_TYPE_FIFO', 'g_file_info_get_name'):
+            self.assertNotIn(name, self.nodes)
+        self.assertEqual(self.loaded, [])
+
+    def test_defined(self):
+        self.assertIn('test_wave', self.nodes)
+        self.assertIn('G_FILE_TYPE_REGULAR', self.nodes)
+        self.assertEqual(self.loaded, ['Gio-2.0.gir'])
+        self.assertEqual(self.nodes['g_file_new_for_path'].get('name'),
+                         'new_for_path')
+        self.assertIn('g_object_ref', self.nodes)
+        self.assertEqual(self.loaded, ['Gio-2.0.gir', 'GObject-2.0.gir'])
+
+
+class TestGirNodes(GirCacheTestCase):
+    def test_skipped(self):
+        root = parse_gir_nodes(self.gir)
+        namespace = root[1]
+        self.assertEqual(namespace.get('name'), 'Test')
+        greeter = namespace.find('{%s}class' % CORE_NS)
+        self.assertEqual([child.tag for child in greeter],
+                         ['{%s}method' % CORE_NS])
+        self.assertIsNone(greeter.find('{%s}doc' % CORE_NS))
+        self.assertIs(greeter.getparent(), namespace)
+        self.assertEqual(
+            [node.get('name') for node in root.iter('{%s}return-value' %
+                                                   CORE_NS)],
+            [None, None])
+
+    def test_attributes(self):
+        root = parse_gir_nodes(self.gir)
+        greeter = root[1][0]
+        self.assertEqual(greeter.get('{%s}type' % C_NS), 'TestGreeter')
+        self.assertEqual(greeter.get('parent'), 'GObject.Object')
+        return_value = greeter[0][0]
+        self.assertIsNone(return_value.get('transfer-ownership'))
+        self.assertEqual(set(greeter.attrib) - KEPT_ATTRIBUTES, set())
+
+
+# Comments, processing instructions and documentation nodes shift the
+# indices of the nodes after them in the full tree, not in node paths
+INDEXED_GIR = '''<?xml version="1.0"?>
+<?xml-stylesheet href="gir.xsl"?>
+<repository version="1.2"
+            xmlns="http://www.gtk.org/introspection/core/1.0"
+            xmlns:c="http://www.gtk.org/introspection/c/1.0"
+            xmlns:glib="http://www.gtk.org/introspection/glib/1.0">
+  <!-- Generated -->
+  <namespace name="Test" version="1.0"
+             c:identifier-prefixes="Test" c:symbol-prefixes="test">
+    <doc xml:space="preserve">The <code>Test</code> namespace.</doc>
+    <class name="Greeter" c:type="TestGreeter" c:symbol-prefix="greeter"
+           glib:type-name="TestGreeter" glib:get-type="test_greeter_get_type"
+           glib:type-struct="GreeterClass">
+      <doc xml:space="preserve">A greeter.</doc>
+      <source-position filename="test.h" line="10"/>
+      <method name="greet" c:identifier="test_greeter_greet"
+              introspectable="0" deprecated-version="1.2">
+        <doc xml:space="preserve">Greets.</doc>
+        <!-- Tricky -->
+        <return-value transfer-ownership="none">
+          <type name="none" c:type="void"/>
+        </return-value>
+      </method>
+      <property name="count" writable="1" transfer-ownership="none">
+        <type name="gint" c:type="gint"/>
+      </property>
+      <virtual-method name="do_greet"/>
+      <glib:signal name="greeted" when="last"/>
+    </class>
+    <record name="GreeterClass" c:type="TestGreeterClass"
+            glib:is-gtype-struct-for="Greeter">
+      <field name="parent_class">
+        <type name="GObject.ObjectClass" c:type="GObjectClass"/>
+      </field>
+      <union name="data" c:type="TestGreeterData">
+        <field name="n"><type name="gint" c:type="gint"/></field>
+      </union>
+    </record>
+    <function name="wave" c:identifier="test_wave">
+      <return-value transfer-ownership="none">
+        <type name="gboolean" c:type="gboolean"/>
+      </return-value>
+    </function>
+  </namespace>
+</repository>
+'''
+
+
+class TestGirIndexing(GirCacheTestCase):
+    def setUp(self):
+        super(TestGirIndexing, self).setUp()
+        self.gir = write_gir(self.tmp_dir, 'Indexed-1.0.gir', INDEXED_GIR)
+        make_gi_extension(self.gir, self.tmp_dir)
+        self.index = load_gir_index(self.gir)
+        self.root = parse_gir_nodes(self.gir)
+
+    def __resolve(self, name):
+        return resolve_node_path(self.root, self.index.nodes[name])
+
+    def test_nodes(self):
+        self.assertEqual(sorted(self.index.nodes), [
+            'TestGreeter', 'TestGreeter:::do_greet',
+            'TestGreeter::TestGreeter', 'TestGreeter::greeted',
+            'TestGreeter:count',
+            'TestGreeterClass', 'TestGreeterData', 'test_greeter_greet',
+            'test_wave'])
+
+        expected = {
+            'TestGreeter': ('class', 'Greeter'),
+            'TestGreeter::TestGreeter': ('class', 'Greeter'),
+            'TestGreeter:count': ('property', 'count'),
+            'TestGreeter::greeted': ('{%s}signal' % GLIB_NS, 'greeted'),
+            'TestGreeter:::do_greet': ('virtual-method', 'do_greet'),
+            'TestGreeterClass': ('record', 'GreeterClass'),
+            'TestGreeterData': ('union', 'data'),
+            'test_greeter_greet': ('method', 'greet'),
+            'test_wave': ('function', 'wave'),
+        }
+        for name, (tag, gi_name) in expected.items():
+            node = self.__resolve(name)
+            if not tag.startswith('{'):
+                tag = '{%s}%s' % (CORE_NS, tag)
+            self.assertEqual((node.tag, node.get('name')), (tag, gi_name))
+
+    def test_classes(self):
+        node_path, klass_name, parent_name = \
+            self.index.classes['Test.Greeter']
+        self.assertEqual(node_path, self.index.nodes['TestGreeter'])
+        self.assertEqual(klass_name, 'TestGreeter')
+        self.assertIsNone(parent_name)
+        self.assertEqual(self.index.get_type_functions,
+                         set(['test_greeter_get_type']))
+        self.assertEqual(self.index.includes, [])
+
+    def test_translations(self):
+        self.assertEqual(self.index.translations['test_wave'],
+                         (True, 'Test.wave', 'Test.prototype.wave'))
+        self.assertEqual(self.index.translations['test_greeter_greet'],
+                         (False, 'Test.Greeter.greet',
+                          'Test.Greeter.prototype.greet'))
+        self.assertEqual(self.index.translations['TestGreeter'],
+                         (True, 'Test.Greeter', 'Test.Greeter'))
+
+    def test_pruned_attributes(self):
+        greet = self.__resolve('test_greeter_greet')
+        self.assertEqual(greet.get('{%s}identifier' % C_NS),
+                         'test_greeter_greet')
+        self.assertEqual(greet.get('introspectable'), '0')
+        self.assertIsNone(greet.get('deprecated-version'))
+        self.assertEqual(greet.get('deprecated-version', 'none'), 'none')
+        self.assertNotIn('deprecated-version', greet.attrib)
+
+        count = self.__resolve('TestGreeter:count')
+        self.assertEqual(count.get('writable'), '1')
+        self.assertIsNone(count.get('transfer-ownership'))
+        self.assertEqual(count.find('{%s}type' % CORE_NS).get('name'), 'gint')
+
+        greeter = self.__resolve('TestGreeter')
+        self.assertEqual(greeter.get('{%s}type-struct' % GLIB_NS),
+                         'GreeterClass')
+        position = greeter.find('{%s}source-position' % CORE_NS)
+        self.assertEqual((position.get('filename'), position.get('line')),
+                         ('test.h', '10'))
+
+    def test_pruned_children(self):
+        greet = self.__resolve('test_greeter_greet')
+        self.assertEqual([child.tag for child in greet],
+                         ['{%s}return-value' % CORE_NS])
+        self.assertIsNone(greet.find('{%s}doc' % CORE_NS))
+        self.assertIs(greet.getparent(), self.__resolve('TestGreeter'))
+        self.assertEqual(
+            [node.get('{%s}type' % C_NS)
+             for node in self.root.iter('{%s}type' % CORE_NS)],
+            ['void', 'gint', 'GObjectClass', 'gint', 'gboolean'])
+
+
+class TestGirLocator(GirCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data_dirs = []
+        for name in ('first', 'last'):
+            data_dir = os.path.join(self.tmp_dir, name)
+            os.makedirs(os.path.join(data_dir, 'gir-1.0'))
+            self.data_dirs.append(data_dir)
+        self.first = write_gir(os.path.join(self.data_dirs[0], 'gir-1.0'),
+                               'Test-1.0.gir')
+        self.last = write_gir(os.path.join(self.data_dirs[1], 'gir-1.0'),
+                              'Test-1.0.gir')
+        self.other = write_gir(os.path.join(self.data_dirs[1], 'gir-1.0'),
+                               'Other-1.0.gir')
+
+    def test_find(self):
+        locator = GirLocator(self.data_dirs + [
+            os.path.join(self.tmp_dir, 'missing')])
+        self.assertEqual(locator.find('Test-1.0.gir'), self.first)
+        self.assertEqual(locator.find('Other-1.0.gir'), self.other)
+        self.assertIsNone(locator.find('Missing-1.0.gir'))
+
+    def test_persisted(self):
+        GirLocator(self.data_dirs).find('Test-1.0.gir')
+        with mock.patch.object(GirLocator, '_GirLocator__scan',
+                               side_effect=AssertionError):
+            locator = GirLocator(self.data_dirs)
+            self.assertEqual(locator.find('Other-1.0.gir'), self.other)
+
+        # Not shared with other directory lists
+        self.assertEqual(GirLocator(self.data_dirs[1:]).find('Test-1.0.gir'),
+                         self.last)
+
+    def test_added(self):
+        GirLocator(self.data_dirs).find('Test-1.0.gir')
+        gir_dir = os.path.join(self.data_dirs[0], 'gir-1.0')
+        added = write_gir(gir_dir, 'Added-1.0.gir')
+        stat = os.stat(gir_dir)
+        os.utime(gir_dir, (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(GirLocator(self.data_dirs).find('Added-1.0.gir'),
+                         added)
+
+    def test_removed(self):
+        GirLocator(self.data_dirs).find('Test-1.0.gir')
+        os.unlink(self.first)
+        gir_dir = os.path.dirname(self.first)
+        stat = os.stat(gir_dir)
+        os.utime(gir_dir, (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(GirLocator(self.data_dirs).find('Test-1.0.gir'),
+                         self.last)
+
+
+def measure_parse(parse, gir_path, queue):
+    gc.collect()
+    base = get_resident_memory()
+    root = parse(gir_path)
+    gc.collect()
+    queue.put(get_resident_memory() - base)
+    del root
+
+
+def parse_lxml(gir_path):
+    return etree.parse(gir_path)
+
+
+@benchmark
+@unittest.skipUnless(get_resident_memory() is not None,
+                     'resident memory cannot be measured')
+class BenchmarkGirNodes(GirCacheTestCase):
+    N_CLASSES = 2000
+
+    def setUp(self):
+        super().setUp()
+        classes = []
+        for i in range(self.N_CLASSES):
+            methods = []
+            for j in range(10):
+                methods.append(
+                    '<method name="m%d" c:identifier="test_c%d_m%d">'
+                    '<doc xml:space="preserve">Does %d.</doc>'
+                    '<source-position filename="test.h" line="%d"/>'
+                    '<return-value transfer-ownership="none">'
+                    '<type name="gboolean" c:type="gboolean"/>'
+                    '</return-value><parameters>'
+                    '<instance-parameter name="self" '
+                    'transfer-ownership="none">'
+                    '<type name="C%d" c:type="TestC%d*"/>'
+                    '</instance-parameter></parameters></method>' %
+                    (j, i, j, j, j, i, i))
+            classes.append(
+                '<class name="C%d" c:type="TestC%d" parent="GObject.Object" '
+                'glib:type-name="TestC%d" glib:get-type="test_c%d_get_type" '
+                'c:symbol-prefix="c%d"><doc xml:space="preserve">C.</doc>'
+                '%s</class>' % (i, i, i, i, i, ''.join(methods)))
+        self.big_gir = write_gir(self.tmp_dir, 'Big-1.0.gir', GIR.replace(
+            '</namespace>', ''.join(classes) + '</namespace>'))
+
+    def __measure(self, parse):
+        ctx = multiprocessing.get_context('fork')
+        queue = ctx.Queue()
+        proc = ctx.Process(target=measure_parse,
+                           args=(parse, self.big_gir, queue))
+        proc.start()
+        res = queue.get()
+        proc.join()
+        return res
+
+    def test_memory(self):
+        sys.stderr.write('\n%d MB gir' %
+                         (os.path.getsize(self.big_gir) // MB))
+        lxml_rss = self.__measure(parse_lxml)
+        nodes_rss = self.__measure(parse_gir_nodes)
+        sys.stderr.write('\nlxml tree: %d MB, GirNode tree: %d MB ' %
+                         (lxml_rss // MB, nodes_rss // MB))
+        self.assertLess(nodes_rss, lxml_rss)
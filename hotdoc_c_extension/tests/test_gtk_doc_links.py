@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from hotdoc_c_extension.gtk_doc_links import GtkDocLinks, _get_book_path
+
+
+DEVHELP = '''<?xml version="1.0" encoding="utf-8" standalone="no"?>
+<book xmlns="http://www.devhelp.net/book" title="%(name)s"
+      link="index.html" name="%(name)s"
+      online="https://example.com/%(name)s/">
+  <functions>
+    <keyword type="function" name="%(name)s_greet ()"
+             link="%(page)s.html#greet"/>
+  </functions>
+</book>
+'''
+
+
+class TestGtkDocLinks(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.gtkdoc_dir = os.path.join(self.tmp_dir, 'html')
+        os.mkdir(self.gtkdoc_dir)
+        patcher = mock.patch(
+            'hotdoc_c_extension.gtk_doc_links.get_gtk_doc_cache_dir',
+            return_value=os.path.join(self.tmp_dir, 'cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_book(self, name, page='api', mtime=None):
+        dir_ = os.path.join(self.gtkdoc_dir, name)
+        if not os.path.exists(dir_):
+            os.mkdir(dir_)
+        path = os.path.join(dir_, '%s.devhelp2' % name)
+        with open(path, 'w') as _:
+            _.write(DEVHELP % {'name': name, 'page': page})
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return dir_
+
+    def not_parsed(self):
+        return mock.patch('hotdoc_c_extension.gtk_doc_links._parse_book',
+                          side_effect=AssertionError('book parsed'))
+
+    def test_lookup(self):
+        self.write_book('first')
+        self.write_book('second')
+        links = GtkDocLinks(self.gtkdoc_dir)
+        self.assertEqual(links.get('first_greet'),
+                         'https://example.com/first/api.html#greet')
+        self.assertEqual(links.get('second_greet'),
+                         'https://example.com/second/api.html#greet')
+        self.assertIsNone(links.get('third_greet'))
+
+    def test_no_books(self):
+        self.assertIsNone(GtkDocLinks().get('first_greet'))
+        self.assertIsNone(GtkDocLinks(os.path.join(
+            self.tmp_dir, 'missing')).get('first_greet'))
+
+    def test_load(self):
+        self.write_book('first')
+        links = GtkDocLinks(self.gtkdoc_dir)
+        links.load()
+        with self.not_parsed():
+            self.assertEqual(links.get('first_greet'),
+                             'https://example.com/first/api.html#greet')
+
+    def test_persisted(self):
+        self.write_book('first')
+        self.write_book('second')
+        GtkDocLinks(self.gtkdoc_dir).load()
+
+        with self.not_parsed():
+            links = GtkDocLinks(self.gtkdoc_dir)
+            self.assertEqual(links.get('second_greet'),
+                             'https://example.com/second/api.html#greet')
+
+    def test_stale_book(self):
+        self.write_book('first', mtime=1000)
+        dir_ = self.write_book('second', mtime=1000)
+        GtkDocLinks(self.gtkdoc_dir).load()
+
+        self.write_book('second', page='other', mtime=2000)
+        with mock.patch('hotdoc_c_extension.gtk_doc_links._parse_book',
+                        return_value={'second_greet': 'changed'}) as parse:
+            links = GtkDocLinks(self.gtkdoc_dir)
+            self.assertEqual(links.get('second_greet'), 'changed')
+            self.assertEqual(links.get('first_greet'),
+                             'https://example.com/first/api.html#greet')
+        parse.assert_called_once_with(dir_)
+
+        # The new contents were saved
+        with self.not_parsed():
+            self.assertEqual(GtkDocLinks(self.gtkdoc_dir).get('second_greet'),
+                             'changed')
+
+    def test_corrupt(self):
+        dir_ = self.write_book('first')
+        GtkDocLinks(self.gtkdoc_dir).load()
+        with open(_get_book_path(dir_), 'wb') as _:
+            _.write(b'garbage')
+
+        links = GtkDocLinks(self.gtkdoc_dir)
+        self.assertEqual(links.get('first_greet'),
+                         'https://example.com/first/api.html#greet')
+        with self.not_parsed():
+            GtkDocLinks(self.gtkdoc_dir).load()
+
+    def test_version(self):
+        self.write_book('first')
+        GtkDocLinks(self.gtkdoc_dir).load()
+        try:
+            GtkDocLinks.VERSION += 1
+            with mock.patch('hotdoc_c_extension.gtk_doc_links._parse_book',
+                            return_value={}) as parse:
+                GtkDocLinks(self.gtkdoc_dir).load()
+            self.assertEqual(parse.call_count, 1)
+        finally:
+            GtkDocLinks.VERSION -= 1
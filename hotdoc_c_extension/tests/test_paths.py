@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+from hotdoc_c_extension.c_extension import (PathIndex, FileClassifier,
+                                            compile_glob_patterns)
+from hotdoc_c_extension.tests.benchmark import benchmark, timed
+
+
+class TestPathIndex(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.header = os.path.join(self.__tmp_dir, 'test.h')
+        with open(self.header, 'w') as _:
+            _.write('')
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def test_spellings(self):
+        index = PathIndex([self.header])
+        self.assertIn(self.header, index)
+        self.assertIn(os.path.join(self.__tmp_dir, '.', 'test.h'), index)
+        self.assertIn(os.path.join(self.__tmp_dir, 'sub', '..', 'test.h'),
+                      index)
+        self.assertNotIn(os.path.join(self.__tmp_dir, 'other.h'), index)
+
+    def test_symlink(self):
+        link = os.path.join(self.__tmp_dir, 'link.h')
+        os.symlink(self.header, link)
+        index = PathIndex([link])
+        self.assertIn(self.header, index)
+        self.assertEqual(len(index), 1)
+
+    def test_relative(self):
+        cwd = os.getcwd()
+        os.chdir(self.__tmp_dir)
+        try:
+            index = PathIndex(['test.h'])
+        finally:
+            os.chdir(cwd)
+        self.assertIn(self.header, index)
+
+    def test_add(self):
+        index = PathIndex()
+        self.assertEqual(len(index), 0)
+        index.add(self.header)
+        index.add(os.path.join(self.__tmp_dir, '.', 'test.h'))
+        self.assertEqual(len(index), 1)
+        self.assertEqual(list(index), [os.path.realpath(self.header)])
+
+    def test_interned(self):
+        self.assertIs(PathIndex.canonicalize(self.header),
+                      PathIndex.canonicalize(self.header + ''))
+
+
+class TestGlobPatterns(unittest.TestCase):
+    def test_no_patterns(self):
+        self.assertIsNone(compile_glob_patterns([]))
+        self.assertIsNone(compile_glob_patterns(None))
+
+    def test_match(self):
+        regex = compile_glob_patterns(['*.h', '*/private/*.c'])
+        self.assertTrue(regex.match('/src/foo.h'))
+        self.assertTrue(regex.match('/src/private/foo.c'))
+        self.assertFalse(regex.match('/src/foo.c'))
+        self.assertFalse(regex.match('/src/foo.hh'))
+        self.assertFalse(regex.match('/src/foo.h.in'))
+
+    def test_dotall(self):
+        regex = compile_glob_patterns(['*.h'])
+        self.assertTrue(regex.match('/src/fo\no.h'))
+        self.assertFalse(regex.match('/src/foo.h\n'))
+
+    def test_no_inline_flags(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            regex = compile_glob_patterns(['*.h', 'foo?.c', '[ab].c'])
+        self.assertNotIn('(?s', regex.pattern)
+        self.assertNotIn('(?ms)', regex.pattern)
+        self.assertTrue(regex.match('b.c'))
+        self.assertTrue(regex.match('foo1.c'))
+
+
+class TestFileClassifier(unittest.TestCase):
+    def test_classify(self):
+        classifier = FileClassifier(['*.h'])
+        header = classifier.classify('/src/foo.h')
+        self.assertTrue(header.full_scan)
+        self.assertTrue(header.is_header)
+        self.assertIsNone(header.guarded)
+        source = classifier.classify('/src/foo.c')
+        self.assertFalse(source.full_scan)
+        self.assertFalse(source.is_header)
+
+    def test_memoized(self):
+        classifier = FileClassifier([])
+        self.assertFalse(classifier.classify('/src/foo.h').full_scan)
+        self.assertIs(classifier.classify('/src/foo.h'),
+                      classifier.classify('/src/foo.h'))
+
+    def test_spellings(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        header = os.path.join(tmp_dir, 'foo.h')
+        link = os.path.join(tmp_dir, 'link.inc')
+        with open(header, 'w') as _:
+            _.write('')
+        os.symlink(header, link)
+
+        classifier = FileClassifier(['*.h'])
+        res = classifier.classify(link)
+        self.assertTrue(res.full_scan)
+        self.assertTrue(res.is_header)
+        self.assertIs(classifier.classify(header), res)
+        self.assertIs(classifier.classify(
+            os.path.join(tmp_dir, 'sub', '..', 'foo.h')), res)
+
+
+@benchmark
+class BenchmarkPathIndex(unittest.TestCase):
+    N_FILES = 10000
+    N_LOOKUPS = 200000
+
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.filenames = []
+        for i in range(self.N_FILES):
+            dir_ = os.path.join(self.__tmp_dir, 'dir%d' % (i // 100))
+            if not os.path.exists(dir_):
+                os.mkdir(dir_)
+            filename = os.path.join(dir_, 'file%d.h' % i)
+            with open(filename, 'w') as _:
+                _.write('')
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def __lookup(self, container, names):
+        return sum(1 for name in names if name in container)
+
+    def test_lookups(self):
+        names = [self.filenames[(i * 7919) % self.N_FILES]
+                 for i in range(self.N_LOOKUPS)]
+        index = timed('indexing %d files' % self.N_FILES, PathIndex,
+                      self.filenames)
+        n_found = timed('%d lookups, PathIndex' % self.N_LOOKUPS,
+                        self.__lookup, index, names)
+        self.assertEqual(n_found, self.N_LOOKUPS)
+        n_found = timed('%d lookups, list' % (self.N_LOOKUPS // 100),
+                        self.__lookup, self.filenames,
+                        names[:self.N_LOOKUPS // 100])
+        self.assertEqual(n_found, self.N_LOOKUPS // 100)
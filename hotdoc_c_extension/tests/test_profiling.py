@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from hotdoc_c_extension.clang import cindex
+from hotdoc_c_extension.profiling import NullScanProfile, ScanProfile
+from hotdoc_c_extension.tests.fakes import make_scanner, clang_available
+
+
+HEADER = '''
+typedef struct {
+  int a;
+} TestGreeter;
+
+void test_greet (TestGreeter *greeter, int n);
+void test_wave (void);
+'''
+
+
+def write_report(profile, dir_):
+    path = os.path.join(dir_, 'profile.json')
+    profile.write_report(path)
+    with open(path, 'r') as _:
+        return json.load(_)
+
+
+class FakeLibrary(object):
+    def clang_first(self, *args):
+        return args
+
+    def clang_second(self):
+        return None
+
+
+class TestScanProfile(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def test_report(self):
+        profile = ScanProfile()
+        profile.count('translation-units')
+        profile.count('symbols-created', 3)
+        profile.count('symbols-created', 2)
+        with profile.timed('a.h', 'parse'):
+            pass
+        with profile.timed('b.h', 'parse'):
+            pass
+        with profile.timed('b.h', 'tokenize'):
+            pass
+
+        report = write_report(profile, self.__tmp_dir)
+        self.assertEqual(report['counters'],
+                         {'translation-units': 1, 'symbols-created': 5})
+        self.assertEqual(sorted(report['phases']), ['parse', 'tokenize'])
+        self.assertEqual(sorted(f['filename'] for f in report['files']),
+                         ['a.h', 'b.h'])
+        self.assertGreaterEqual(report['total'], 0)
+
+    def test_instrument_library(self):
+        lib = FakeLibrary()
+        first = ScanProfile()
+        first.instrument_library(lib, ['clang_first', 'clang_missing'])
+        self.assertEqual(lib.clang_first(1, 2), (1, 2))
+        lib.clang_second()
+
+        # Wrapped once, counted by the latest profile
+        second = ScanProfile()
+        second.instrument_library(lib, ['clang_first'])
+        lib.clang_first()
+        lib.clang_first()
+
+        self.assertEqual(
+            write_report(first, self.__tmp_dir)['counters'],
+            {'ffi-calls': 1})
+        self.assertEqual(
+            write_report(second, self.__tmp_dir)['counters'],
+            {'ffi-calls': 2})
+
+    def test_null_profile(self):
+        profile = NullScanProfile()
+        self.assertFalse(profile.enabled)
+        profile.count('translation-units')
+        with profile.timed('a.h', 'parse'):
+            pass
+
+
+@unittest.skipUnless(clang_available(), 'libclang is not available')
+class TestScanCounters(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.header = os.path.join(self.__tmp_dir, 'test.h')
+        with open(self.header, 'w') as _:
+            _.write(HEADER)
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def test_counters(self):
+        scanner = make_scanner()
+        scanner.profile = ScanProfile()
+        scanner.scan([self.header], [], False, True, ['*.h'])
+
+        report = write_report(scanner.profile, self.__tmp_dir)
+        counters = report['counters']
+        self.assertEqual(counters['translation-units'], 1)
+        self.assertEqual(counters['symbols-created'], 3)
+        self.assertGreaterEqual(counters['cursors-visited'],
+                                counters['symbols-created'])
+        self.assertGreater(counters['ffi-calls'], 0)
+        self.assertIn('parse', report['phases'])
+        self.assertIn(self.header,
+                      [f['filename'] for f in report['files']])
+
+    def test_null_profile(self):
+        scanner = make_scanner()
+        scanner.scan([self.header], [], False, True, ['*.h'])
+        self.assertIn('test_wave', scanner.symbols)
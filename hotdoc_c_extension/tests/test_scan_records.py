@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from hotdoc_c_extension.scan_records import (
+    TypeLink, ParameterRecord, FunctionRecord, StructRecord, FieldRecord,
+    AliasRecord)
+from hotdoc_c_extension.tests.fakes import (make_scanner, clang_available,
+                                            FakeDocDb)
+
+
+def make_function():
+    return FunctionRecord(
+        'test_greet', '/src/test.h', 12,
+        ('const ', TypeLink('TestGreeter'), ' *'),
+        [ParameterRecord('greeter', (TypeLink('TestGreeter'), ' *')),
+         ParameterRecord('n', ('int',))],
+        (12, 1), (12, 40))
+
+
+class TestScanRecords(unittest.TestCase):
+    def test_pickle(self):
+        record = make_function()
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            copy = pickle.loads(pickle.dumps(record, protocol))
+            self.assertIsInstance(copy, FunctionRecord)
+            self.assertEqual(repr(copy), repr(record))
+            self.assertIsInstance(copy.parameters[0], ParameterRecord)
+            self.assertIsInstance(copy.return_tokens[1], TypeLink)
+
+    def test_pickle_none(self):
+        record = AliasRecord('TestAlias', '/src/test.h', 3, ('int',), None)
+        copy = pickle.loads(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+        self.assertIsNone(copy.implementation_filename)
+
+    def test_relocate(self):
+        struct = StructRecord(
+            'TestStruct', '/src/test.h', 5, 'typedef struct {} TestStruct;',
+            [FieldRecord('TestStruct.n', 'n', ('int',), False)], False)
+        alias = AliasRecord('TestAlias', '/src/test.h', 3, ('int',),
+                            '/src/test.c')
+
+        def relocate(path):
+            return path.replace('/src', '/build/src')
+
+        copy = struct.relocate(relocate)
+        self.assertEqual(copy.filename, '/build/src/test.h')
+        self.assertEqual(struct.filename, '/src/test.h')
+        self.assertIsInstance(copy.fields[0], FieldRecord)
+        self.assertIsNot(copy.fields[0], struct.fields[0])
+        self.assertEqual(repr(copy.fields), repr(struct.fields))
+
+        copy = alias.relocate(relocate)
+        self.assertEqual(copy.implementation_filename, '/build/src/test.c')
+
+    def test_relocate_parameters(self):
+        record = make_function().relocate(lambda path: '/elsewhere/test.h')
+        self.assertEqual(record.filename, '/elsewhere/test.h')
+        self.assertEqual(repr(record.parameters),
+                         repr(make_function().parameters))
+
+
+HEADER = '''
+typedef struct {
+  int n;
+  void (*callback) (int n);
+} TestStruct;
+
+typedef enum {
+  TEST_FIRST,
+  TEST_SECOND = 4,
+} TestEnum;
+
+typedef TestStruct TestAlias;
+
+typedef void (*TestCallback) (TestStruct *s);
+
+const TestStruct *test_greet (TestStruct *s, TestEnum e);
+
+extern int test_variable;
+'''
+
+
+@unittest.skipUnless(clang_available(), 'libclang is not available')
+class TestPickledRecords(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.header = os.path.join(self.__tmp_dir, 'test.h')
+        with open(self.header, 'w') as _:
+            _.write(HEADER)
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def test_materialize(self):
+        doc_db = FakeDocDb()
+        scanner = make_scanner(doc_db)
+        scanner.scan([self.header], [], False, True, ['*.h'])
+        records = list(scanner.symbols.values())
+        self.assertTrue(records)
+
+        copy_db = FakeDocDb()
+        make_scanner(copy_db).materialize(pickle.loads(pickle.dumps(records)))
+
+        symbols = doc_db.symbols
+        copied = copy_db.symbols
+        self.assertEqual(sorted(copied), sorted(symbols))
+        for name, (type_, kwargs) in symbols.items():
+            self.assertIs(copied[name][0], type_)
+            self.assertEqual(sorted(copied[name][1]), sorted(kwargs))
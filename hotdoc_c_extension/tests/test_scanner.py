@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from hotdoc_c_extension.clang import cindex
+from hotdoc_c_extension.c_extension import (DiagnosticsCollector, MB,
+                                            get_resident_memory)
+from hotdoc_c_extension.tests.fakes import make_scanner, clang_available
+
+
+HEADER = '''
+void test_greet (int n);
+'''
+
+
+@unittest.skipUnless(clang_available(), 'libclang is not available')
+class TestGirSymbols(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.header = os.path.join(self.__tmp_dir, 'test.h')
+        with open(self.header, 'w') as _:
+            _.write(HEADER)
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def test_lazy_scan(self):
+        scanner = make_scanner()
+        created = []
+        scanner.gir_headers = set([self.header])
+        scanner.create_gir_symbols = created.extend
+
+        # What CExtension does with --c-lazy-scan: comments first,
+        # then a full scan of the headers pages end up needing
+        scanner.scan([self.header], [], False, False, [])
+        self.assertEqual(created, [])
+        scanner.scan([self.header], [], False, True, ['*.h'])
+
+        self.assertEqual(created, [self.header])
+        self.assertNotIn('test_greet', scanner.symbols)
+
+
+@unittest.skipUnless(clang_available(), 'libclang is not available')
+class TestParseTimeout(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.filenames = []
+        for name in ('first', 'second'):
+            filename = os.path.join(self.__tmp_dir, '%s.h' % name)
+            with open(filename, 'w') as _:
+                _.write('void test_%s (int n);\n' % name)
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def __scan(self, umbrella):
+        scanner = make_scanner()
+        scanner.parse_timeout = 60
+        scanner.scan(self.filenames, [], False, True, ['*.h'],
+                     umbrella=umbrella)
+        self.assertEqual(scanner.quarantined, [])
+        self.assertIn('test_first', scanner.symbols)
+        self.assertIn('test_second', scanner.symbols)
+
+    def test_headers(self):
+        self.__scan(False)
+
+    def test_umbrella(self):
+        self.__scan(True)
+
+    def test_quarantine(self):
+        scanner = make_scanner()
+        scanner.parse_timeout = 0.001
+        before = time.time()
+        scanner.scan(self.filenames[:1], [], False, True, ['*.h'])
+        self.assertEqual(scanner.quarantined, self.filenames[:1])
+        self.assertNotIn('test_first', scanner.symbols)
+
+        entry = scanner.quarantine[self.filenames[0]]
+        self.assertEqual(entry['timeout'], 0.001)
+        self.assertGreaterEqual(entry['elapsed'], 0.001)
+        self.assertGreaterEqual(entry['timestamp'], before)
+        self.assertLessEqual(entry['timestamp'], time.time())
+        self.assertEqual(entry['mtime'],
+                         os.path.getmtime(self.filenames[0]))
+
+        # Not parsed again until it changes
+        scanner.parse_timeout = 60
+        scanner.scan(self.filenames[:1], [], False, True, ['*.h'])
+        self.assertEqual(scanner.quarantined, self.filenames[:1])
+        self.assertNotIn('test_first', scanner.symbols)
+
+    def test_load_error(self):
+        # Falls back to parsing in-process
+        with mock.patch.object(cindex.TranslationUnit, 'from_ast_file',
+                               side_effect=cindex.TranslationUnitLoadError(
+                                   'Error loading')):
+            self.__scan(True)
+
+
+DIAGNOSED = '''
+int test_first (void) {}
+int test_second (void) {}
+int test_third (void) {}
+'''
+
+
+@unittest.skipUnless(clang_available(), 'libclang is not available')
+class TestDiagnostics(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.__tmp_dir, 'test.c')
+        with open(self.source, 'w') as _:
+            _.write(DIAGNOSED)
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def __collect(self, collector, n_tus):
+        index = cindex.Index.create()
+        with mock.patch('hotdoc_c_extension.c_extension.warn') as warn:
+            for _ in range(n_tus):
+                collector.collect(index.parse(self.source))
+            collector.flush()
+        return [call[0][1] for call in warn.call_args_list]
+
+    def test_dedup(self):
+        messages = self.__collect(DiagnosticsCollector(), 2)
+        self.assertEqual(len(messages), 3)
+
+    def test_cap(self):
+        messages = self.__collect(DiagnosticsCollector(max_per_file=2), 1)
+        self.assertEqual(len(messages), 3)
+        self.assertIn('1 more diagnostics', messages[-1])
+
+    def test_duplicates_not_suppressed(self):
+        # Duplicates from other translation units are not counted as
+        # suppressed once the cap is reached
+        messages = self.__collect(DiagnosticsCollector(max_per_file=3), 2)
+        self.assertEqual(len(messages), 3)
+        self.assertNotIn('more diagnostics', messages[-1])
+
+
+def measure_scan_peak(filenames, budget, queue):
+    """
+    Scans @filenames, and reports how much resident memory grew at most
+    while doing so, along with the names of the symbols found.
+    """
+    scanner = make_scanner()
+    base = get_resident_memory()
+    if budget is not None:
+        scanner.max_rss = base + budget
+    peak = [base]
+    done = threading.Event()
+
+    def poll():
+        while not done.is_set():
+            peak[0] = max(peak[0], get_resident_memory())
+            time.sleep(0.001)
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    try:
+        scanner.scan(filenames, [], False, True, ['*.h'])
+    finally:
+        done.set()
+        poller.join()
+    queue.put((peak[0] - base, sorted(scanner.symbols)))
+
+
+@unittest.skipUnless(clang_available(), 'libclang is not available')
+@unittest.skipUnless(get_resident_memory() is not None,
+                     'resident memory cannot be measured')
+class TestMemoryBudget(unittest.TestCase):
+    N_DECLS = 3000
+    N_HEADERS = 10
+
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        # All the headers include a big one, which clang has to parse
+        # again for each translation unit
+        with open(os.path.join(self.__tmp_dir, 'big.h'), 'w') as _:
+            for i in range(self.N_DECLS):
+                _.write('typedef struct { int a; char *b; } Big%d;\n'
+                        'static inline int big_%d (Big%d *s, const char *n) '
+                        '{ int x = 0; for (int k = 0; k < s->a; k++) '
+                        '{ x += n[k] * 3 + (s->b ? s->b[k] : 0); } '
+                        'return x; }\n' % (i, i, i))
+        self.filenames = []
+        for i in range(self.N_HEADERS):
+            filename = os.path.join(self.__tmp_dir, 'test%d.h' % i)
+            with open(filename, 'w') as _:
+                _.write('#include "big.h"\n')
+                for j in range(100):
+                    _.write('int test%d_%d (Big%d *s);\n' % (i, j, j))
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def __measure(self, budget):
+        # Each scan gets a fresh interpreter, for its peak not to depend
+        # on what the tests that ran before left in our heap
+        ctx = multiprocessing.get_context('spawn')
+        queue = ctx.Queue()
+        proc = ctx.Process(target=measure_scan_peak,
+                           args=(self.filenames, budget, queue))
+        proc.start()
+        res = queue.get()
+        proc.join()
+        return res
+
+    def test_peak(self):
+        peak, symbols = self.__measure(None)
+        throttled_peak, throttled_symbols = self.__measure(4 * MB)
+        self.assertEqual(throttled_symbols, symbols)
+        self.assertIn('test0_0', symbols)
+        self.assertLess(throttled_peak, peak)
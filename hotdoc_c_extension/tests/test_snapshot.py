@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from hotdoc_c_extension.snapshot import ScanSnapshot
+from hotdoc_c_extension.scan_records import (FunctionRecord, AliasRecord,
+                                             ParameterRecord, TypeLink)
+from hotdoc_c_extension.tests.fakes import make_scanner, FakeDocDb
+
+
+class TestScanSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.__tmp_dir, 'checkout')
+        self.header = self.__write(self.root, 'test.h',
+                                   'int test_greet (TestInt n);\n')
+        self.path = os.path.join(self.__tmp_dir, 'snapshot.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def __write(self, root, name, contents):
+        os.makedirs(os.path.join(root, 'include'), exist_ok=True)
+        path = os.path.join(root, 'include', name)
+        with open(path, 'w') as _:
+            _.write(contents)
+        return path
+
+    def __make_snapshot(self, header):
+        snapshot = ScanSnapshot()
+        snapshot.add_records(header, [
+            FunctionRecord('test_greet', header, 1, ('int',),
+                           [ParameterRecord('n', (TypeLink('TestInt'),))],
+                           (1, 1), (1, 28)),
+            AliasRecord('TestInt', header, 2, ('int',), None)])
+        snapshot.set_comments(header, [('/**\n * test_greet:\n */', 1, 3)])
+        snapshot.gir_skipped = [header]
+        return snapshot
+
+    def test_relocate(self):
+        self.__make_snapshot(self.header).save(self.path, self.root,
+                                               [self.header])
+
+        # Another checkout of the same sources
+        root = os.path.join(self.__tmp_dir, 'elsewhere')
+        header = self.__write(root, 'test.h', 'int test_greet (TestInt n);\n')
+        snapshot = ScanSnapshot.load(self.path, root)
+
+        self.assertTrue(snapshot.matches([header]))
+        self.assertFalse(snapshot.matches([self.header]))
+        self.assertEqual(list(snapshot.records), [header])
+        records = snapshot.records[header]
+        self.assertEqual([record.filename for record in records],
+                         [header, header])
+        self.assertEqual(records[0].parameters[0].type_tokens[0].name,
+                         'TestInt')
+        self.assertIsNone(records[1].implementation_filename)
+        self.assertEqual(snapshot.comments[header],
+                         [('/**\n * test_greet:\n */', 1, 3)])
+        self.assertEqual(snapshot.gir_skipped, [header])
+
+    def test_modified(self):
+        self.__make_snapshot(self.header).save(self.path, self.root,
+                                               [self.header])
+        self.__write(self.root, 'test.h', 'int test_greet (void);\n')
+        snapshot = ScanSnapshot.load(self.path, self.root)
+        self.assertFalse(snapshot.matches([self.header]))
+
+    def test_version(self):
+        self.__make_snapshot(self.header).save(self.path, self.root,
+                                               [self.header])
+        try:
+            ScanSnapshot.VERSION += 1
+            self.assertIsNone(ScanSnapshot.load(self.path, self.root))
+        finally:
+            ScanSnapshot.VERSION -= 1
+
+    def test_missing(self):
+        self.assertIsNone(ScanSnapshot.load(self.path, self.root))
+
+    def test_load_without_scanning(self):
+        snapshot = self.__make_snapshot(self.header)
+        snapshot.comments = {}
+        doc_db = FakeDocDb()
+        scanner = make_scanner(doc_db)
+        created = []
+        scanner.create_gir_symbols = created.extend
+
+        scanner.load_snapshot(snapshot)
+
+        self.assertEqual(sorted(scanner.symbols), ['TestInt', 'test_greet'])
+        self.assertEqual(sorted(doc_db.created), ['TestInt', 'test_greet'])
+        self.assertEqual(scanner.gir_skipped, [self.header])
+        self.assertEqual(created, [self.header])
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from hotdoc_c_extension.symbol_packs import (write_symbol_pack, SymbolPack,
+                                             SymbolPacks, parse_gtk_doc_book,
+                                             main)
+
+
+DEVHELP = '''<?xml version="1.0" encoding="utf-8" standalone="no"?>
+<book xmlns="http://www.devhelp.net/book" title="Test" link="index.html"
+      name="test" online="https://example.com/test/">
+  <functions>
+    <keyword type="function" name="test_greet ()" link="test.html#test-greet"/>
+    <keyword type="struct" name="struct TestGreeter" link="test.html#TestGreeter"/>
+    <keyword type="signal" name="The TestGreeter::greeted signal" link="test.html#TestGreeter-greeted"/>
+    <keyword type="property" name="The TestGreeter:name property" link="test.html#TestGreeter--name"/>
+  </functions>
+</book>
+'''
+
+
+class TestSymbolPacks(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def __write(self, name, entries):
+        path = os.path.join(self.__tmp_dir, name)
+        write_symbol_pack(path, entries)
+        return path
+
+    def test_lookup(self):
+        entries = [('test_%04d' % i, 'https://example.com/%d' % i,
+                    'function') for i in range(1000)]
+        entries.append((u'test_\xe9', 'https://example.com/e', ''))
+        pack = SymbolPack(self.__write('test.pack', reversed(entries)))
+        for name, url, type_ in entries:
+            self.assertEqual(pack.lookup(name), (url, type_))
+        self.assertIsNone(pack.lookup('test'))
+        self.assertIsNone(pack.lookup('test_0000_'))
+        self.assertIsNone(pack.lookup('zzz'))
+
+    def test_empty(self):
+        pack = SymbolPack(self.__write('empty.pack', []))
+        self.assertIsNone(pack.lookup('test_greet'))
+
+    def test_duplicates(self):
+        path = os.path.join(self.__tmp_dir, 'test.pack')
+        self.assertEqual(write_symbol_pack(path, [
+            ('test_greet', 'https://example.com/first', 'function'),
+            ('test_greet', 'https://example.com/last', 'macro')]), 1)
+        pack = SymbolPack(path)
+        self.assertEqual(pack.lookup('test_greet'),
+                         ('https://example.com/last', 'macro'))
+
+    def test_not_a_pack(self):
+        path = os.path.join(self.__tmp_dir, 'garbage')
+        with open(path, 'wb') as _:
+            _.write(b'0123456789abcdef')
+        with self.assertRaises(ValueError):
+            SymbolPack(path).lookup('test_greet')
+
+    def test_packs(self):
+        first = self.__write('first.pack', [
+            ('test_greet', 'https://example.com/first', 'function')])
+        last = self.__write('last.pack', [
+            ('test_greet', 'https://example.com/last', 'function'),
+            ('test_wave', 'https://example.com/wave', 'function')])
+        packs = SymbolPacks([first, last])
+        self.assertTrue(packs)
+        self.assertFalse(SymbolPacks())
+        self.assertEqual(packs.get_url('test_greet'),
+                         'https://example.com/first')
+        self.assertEqual(packs.get_url('test_wave'),
+                         'https://example.com/wave')
+        self.assertIsNone(packs.get_url('test_leave'))
+
+    def test_devhelp(self):
+        dir_ = os.path.join(self.__tmp_dir, 'test')
+        os.mkdir(dir_)
+        with open(os.path.join(dir_, 'test.devhelp2'), 'w') as _:
+            _.write(DEVHELP)
+        pack = SymbolPack(self.__write('test.pack', parse_gtk_doc_book(dir_)))
+        self.assertEqual(pack.lookup('test_greet'),
+                         ('https://example.com/test/test.html#test-greet',
+                          'function'))
+        self.assertEqual(pack.lookup('TestGreeter')[1], 'struct')
+        self.assertEqual(pack.lookup('TestGreeter::greeted')[1], 'signal')
+        self.assertEqual(pack.lookup('TestGreeter:name')[1], 'property')
+
+    def test_main(self):
+        # Both books document test_greet
+        for name in ('test', 'other'):
+            dir_ = os.path.join(self.__tmp_dir, name)
+            os.mkdir(dir_)
+            with open(os.path.join(dir_, '%s.devhelp2' % name), 'w') as _:
+                _.write(DEVHELP)
+        path = os.path.join(self.__tmp_dir, 'test.pack')
+
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as out:
+            self.assertEqual(main([path,
+                                   os.path.join(self.__tmp_dir, 'test'),
+                                   os.path.join(self.__tmp_dir, 'other')]),
+                             0)
+        self.assertEqual(out.getvalue(),
+                         'Wrote 4 symbols to %s\n' % path)
+        self.assertEqual(SymbolPack(path).lookup('test_greet')[1],
+                         'function')
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from hotdoc_c_extension.tracing import NullTraceRecorder, TraceRecorder
+from hotdoc_c_extension.tests.fakes import make_scanner, clang_available
+
+
+def write_trace(recorder, dir_):
+    path = os.path.join(dir_, 'trace.json')
+    recorder.write(path)
+    with open(path, 'r') as _:
+        return json.load(_)
+
+
+class TestTraceRecorder(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def test_spans(self):
+        recorder = TraceRecorder()
+        with recorder.span('scan', 'c-scan', n_files=2):
+            with recorder.span('parse', 'c-scan', filename='a.h'):
+                pass
+
+        trace = write_trace(recorder, self.__tmp_dir)
+        self.assertEqual(trace['displayTimeUnit'], 'ms')
+        # Complete events are added when their span ends
+        inner, outer = trace['traceEvents']
+        self.assertEqual((outer['name'], outer['cat'], outer['ph']),
+                         ('scan', 'c-scan', 'X'))
+        self.assertEqual(outer['args'], {'n_files': 2})
+        self.assertEqual(inner['args'], {'filename': 'a.h'})
+        self.assertEqual(outer['pid'], os.getpid())
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['ts'] + outer['dur'],
+                                inner['ts'] + inner['dur'])
+
+    def test_no_args(self):
+        recorder = TraceRecorder()
+        with recorder.span('format', 'gi'):
+            pass
+        event, = write_trace(recorder, self.__tmp_dir)['traceEvents']
+        self.assertNotIn('args', event)
+
+    def test_threads(self):
+        recorder = TraceRecorder()
+
+        def run():
+            with recorder.span('format', 'gi'):
+                pass
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        run()
+
+        events = write_trace(recorder, self.__tmp_dir)['traceEvents']
+        self.assertEqual(len(set(event['tid'] for event in events)), 2)
+
+    def test_null_recorder(self):
+        recorder = NullTraceRecorder()
+        self.assertFalse(recorder.enabled)
+        with recorder.span('scan', 'c-scan', n_files=2):
+            pass
+
+
+@unittest.skipUnless(clang_available(), 'libclang is not available')
+class TestScanTrace(unittest.TestCase):
+    def setUp(self):
+        self.__tmp_dir = tempfile.mkdtemp()
+        self.header = os.path.join(self.__tmp_dir, 'test.h')
+        with open(self.header, 'w') as _:
+            _.write('void test_wave (void);\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.__tmp_dir)
+
+    def test_scan_spans(self):
+        scanner = make_scanner()
+        scanner.tracer = TraceRecorder()
+        scanner.scan([self.header], [], False, True, ['*.h'])
+
+        events = write_trace(scanner.tracer, self.__tmp_dir)['traceEvents']
+        self.assertEqual(
+            [(event['name'], event['args']['filename'])
+             for event in events],
+            [('parse', self.header), ('process', self.header)])
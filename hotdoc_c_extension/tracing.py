@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2016 Mathieu Duponchelle <mathieu.duponchelle@opencreed.com>
+# Copyright © 2016 Collabora Ltd
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation; either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Timeline recording for the C and GI extensions, in the Chrome trace
+event format, which chrome://tracing and Perfetto can display.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullTraceRecorder(object):
+    enabled = False
+
+    # pylint: disable=unused-argument,no-self-use
+    def span(self, name, category, **args):
+        return _NULL_SPAN
+
+
+class _Span(object):
+    def __init__(self, recorder, name, category, args):
+        self.__recorder = recorder
+        self.__name = name
+        self.__category = category
+        self.__args = args
+        self.__start = 0
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        # pylint: disable=protected-access
+        self.__recorder._add_complete_event(self.__name, self.__category,
+                                            self.__start, time.perf_counter(),
+                                            self.__args)
+        return False
+
+
+class TraceRecorder(object):
+    """
+    Records spans as "complete" trace events, see `TraceRecorder.span`.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.__events = []
+        self.__origin = time.perf_counter()
+        self.__pid = os.getpid()
+
+    def span(self, name, category, **args):
+        """
+        Returns a context manager recording its block as a span named
+        @name in @category, with @args as extra data.
+        """
+        return _Span(self, name, category, args)
+
+    def _add_complete_event(self, name, category, start, end, args):
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self.__origin) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': self.__pid,
+            'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        self.__events.append(event)
+
+    def write(self, path):
+        with open(path, 'w') as _:
+            json.dump({'traceEvents': self.__events,
+                       'displayTimeUnit': 'ms'}, _)